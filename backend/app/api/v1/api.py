@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, projects, media, annotations
+from app.api.v1.endpoints import auth, projects, media, annotations, uploads, admin
 
 api_router = APIRouter()
 
@@ -7,4 +7,6 @@ api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["认证"])
 api_router.include_router(projects.router, prefix="/projects", tags=["项目管理"])
 api_router.include_router(media.router, prefix="/media", tags=["媒体文件"])
-api_router.include_router(annotations.router, prefix="/annotations", tags=["标注"])
\ No newline at end of file
+api_router.include_router(annotations.router, prefix="/annotations", tags=["标注"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["分片上传"])
+api_router.include_router(admin.router, prefix="/admin", tags=["系统管理"])
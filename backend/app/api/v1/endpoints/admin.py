@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from typing import Any
+
+from app.core.database import User, UserRole
+from app.core.security import get_current_user
+from app.services import job_scheduler
+from app.services.media_cache import cache_stats
+from app.tasks.annotation_tasks import backfill_annotation_bboxes
+
+router = APIRouter()
+
+@router.get("/metrics/media-jobs")
+async def get_media_job_metrics(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """媒体任务调度统计：各成本类别的队列长度、排队等待与运行时间，以及 worker 本地缓存命中"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足，需要管理员权限"
+        )
+    
+    return {
+        "job_classes": await run_in_threadpool(job_scheduler.metrics),
+        "cache": await run_in_threadpool(cache_stats)
+    }
+
+@router.post("/annotations/backfill-bboxes")
+async def backfill_bboxes(
+    current_user: User = Depends(get_current_user)
+) -> Any:
+    """为历史标注补算包围盒（异步执行）"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="权限不足，需要管理员权限"
+        )
+    
+    task = backfill_annotation_bboxes.delay()
+    return {"task_id": task.id}
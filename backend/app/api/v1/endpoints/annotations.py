@@ -1,13 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, update
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from typing import Any, List, Optional
 from datetime import datetime
 
-from app.core.database import get_db, User, Annotation, MediaFile, Label, Project, ProjectUser
+from app.core.database import (
+    get_db, User, Annotation, MediaFile, Label, VideoSegment,
+    annotation_time_range, time_window, annotation_box, region_box
+)
 from app.core.security import get_current_user
+from app.core.permissions import ProjectAccess, get_project_access
+from app.core.config import settings
+from app.core.pagination import paginate
+from app.services.geometry_service import bbox_columns
 from app.schemas.annotation import (
     AnnotationCreate, AnnotationUpdate, AnnotationResponse, 
-    AnnotationList, VideoSegmentCreate, VideoSegmentResponse
+    AnnotationList, VideoSegmentCreate, VideoSegmentResponse,
+    AnnotationBulkOperation, AnnotationBulkRequest, AnnotationBulkResponse, check_time_range
 )
 
 router = APIRouter()
@@ -16,6 +27,7 @@ router = APIRouter()
 async def create_annotation(
     annotation_in: AnnotationCreate,
     current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """创建标注"""
@@ -28,17 +40,11 @@ async def create_annotation(
         )
     
     # 检查用户权限
-    project = db.query(Project).filter(Project.id == media_file.project_id).first()
-    if current_user.role != "admin" and project.owner_id != current_user.id:
-        project_user = db.query(ProjectUser).filter(
-            ProjectUser.project_id == media_file.project_id,
-            ProjectUser.user_id == current_user.id
-        ).first()
-        if not project_user:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="无权标注该文件"
-            )
+    if not access.can_access(media_file.project_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权标注该文件"
+        )
     
     # 检查标签是否存在
     if annotation_in.label_id:
@@ -58,7 +64,8 @@ async def create_annotation(
         data=annotation_in.data,
         start_time=annotation_in.start_time,
         end_time=annotation_in.end_time,
-        confidence=annotation_in.confidence
+        confidence=annotation_in.confidence,
+        **bbox_columns(annotation_in.annotation_type, annotation_in.data)
     )
     
     db.add(db_annotation)
@@ -67,18 +74,205 @@ async def create_annotation(
     
     return db_annotation
 
+UPDATABLE_FIELDS = {"label_id", "annotation_type", "data", "start_time", "end_time", "confidence"}
+
+def _time_range_error(start_time: Optional[float], end_time: Optional[float]) -> Optional[str]:
+    try:
+        check_time_range(start_time, end_time)
+    except ValueError as e:
+        return str(e)
+    return None
+
+def _apply_bulk(db: Session, access: ProjectAccess, operations: List[AnnotationBulkOperation]) -> List[dict]:
+    """校验所有操作，合法的操作在一个事务中批量执行，返回每个操作的结果"""
+    current_user = access.user
+    results = [
+        {"index": index, "op": operation.op, "success": False, "id": operation.id, "error": None}
+        for index, operation in enumerate(operations)
+    ]
+    
+    # 涉及的媒体文件、标签和已有标注各查询一次
+    media_ids = {operation.media_file_id for operation in operations
+                 if operation.op == "create" and operation.media_file_id is not None}
+    label_ids = {operation.label_id for operation in operations
+                 if operation.op != "delete" and operation.label_id}
+    annotation_ids = {operation.id for operation in operations
+                      if operation.op != "create" and operation.id is not None}
+    
+    media_projects = dict(
+        db.query(MediaFile.id, MediaFile.project_id).filter(MediaFile.id.in_(media_ids)).all()
+    ) if media_ids else {}
+    existing_labels = {
+        label_id for (label_id,) in db.query(Label.id).filter(Label.id.in_(label_ids)).all()
+    } if label_ids else set()
+    annotators, annotation_types, annotation_times = {}, {}, {}
+    if annotation_ids:
+        for annotation_id, annotator_id, annotation_type, start_time, end_time in db.query(
+            Annotation.id, Annotation.annotator_id, Annotation.annotation_type,
+            Annotation.start_time, Annotation.end_time
+        ).filter(Annotation.id.in_(annotation_ids)).all():
+            annotators[annotation_id] = annotator_id
+            annotation_types[annotation_id] = annotation_type
+            annotation_times[annotation_id] = (start_time, end_time)
+    
+    creates, create_indexes = [], []
+    updates, update_indexes = [], []
+    delete_ids, delete_indexes = [], []
+    retyped = {}
+    touched = set()
+    now = datetime.utcnow()
+    
+    for index, operation in enumerate(operations):
+        result = results[index]
+        if operation.label_id and operation.op != "delete" and operation.label_id not in existing_labels:
+            result["error"] = "标签不存在"
+            continue
+        
+        if operation.op == "create":
+            time_error = _time_range_error(operation.start_time, operation.end_time)
+            if operation.media_file_id is None or operation.annotation_type is None or operation.data is None:
+                result["error"] = "创建标注需要 media_file_id、annotation_type 和 data"
+            elif operation.media_file_id not in media_projects:
+                result["error"] = "媒体文件不存在"
+            elif not access.can_access(media_projects[operation.media_file_id]):
+                result["error"] = "无权标注该文件"
+            elif time_error:
+                result["error"] = time_error
+            else:
+                creates.append({
+                    "media_file_id": operation.media_file_id,
+                    "annotator_id": current_user.id,
+                    "label_id": operation.label_id,
+                    "annotation_type": operation.annotation_type.value,
+                    "data": operation.data,
+                    "start_time": operation.start_time,
+                    "end_time": operation.end_time,
+                    "confidence": operation.confidence if "confidence" in operation.model_fields_set else 1.0,
+                    "status": "pending",
+                    **bbox_columns(operation.annotation_type, operation.data)
+                })
+                create_indexes.append(index)
+            continue
+        
+        # update/delete：只能修改自己的标注
+        if operation.id is None:
+            result["error"] = "缺少标注 ID"
+        elif operation.id not in annotators:
+            result["error"] = "标注不存在"
+        elif current_user.role != "admin" and annotators[operation.id] != current_user.id:
+            result["error"] = "无权修改该标注" if operation.op == "update" else "无权删除该标注"
+        elif operation.id in touched:
+            result["error"] = "同一标注在请求中重复操作"
+        elif operation.op == "update":
+            fields = operation.dict(exclude_unset=True, include=UPDATABLE_FIELDS)
+            if any(field in fields and fields[field] is None for field in ("annotation_type", "data")):
+                result["error"] = "标注类型和数据不能为空"
+                continue
+            # 只修改一端时间时与原有的另一端比较
+            start_time, end_time = annotation_times[operation.id]
+            error = _time_range_error(fields.get("start_time", start_time), fields.get("end_time", end_time))
+            if error:
+                result["error"] = error
+                continue
+            if fields.get("annotation_type") is not None:
+                fields["annotation_type"] = fields["annotation_type"].value
+            # 坐标或类型变化时重新计算包围盒；只改类型时需要读取原有数据
+            if "data" in fields:
+                fields.update(bbox_columns(fields.get("annotation_type", annotation_types[operation.id]), fields["data"]))
+            elif "annotation_type" in fields:
+                retyped[operation.id] = fields
+            updates.append({"id": operation.id, **fields, "updated_at": now})
+            update_indexes.append(index)
+            touched.add(operation.id)
+        else:
+            delete_ids.append(operation.id)
+            delete_indexes.append(index)
+            touched.add(operation.id)
+    
+    if retyped:
+        for annotation_id, data in db.query(Annotation.id, Annotation.data).filter(
+            Annotation.id.in_(list(retyped))
+        ).all():
+            retyped[annotation_id].update(bbox_columns(retyped[annotation_id]["annotation_type"], data))
+    
+    try:
+        if delete_ids:
+            # 片段保留，只解除与被删除标注的关联
+            db.query(VideoSegment).filter(VideoSegment.annotation_id.in_(delete_ids)).update(
+                {VideoSegment.annotation_id: None}, synchronize_session=False
+            )
+            db.query(Annotation).filter(Annotation.id.in_(delete_ids)).delete(synchronize_session=False)
+        if updates:
+            # 按主键批量更新（字段集合相同的条目合并为一次 executemany）
+            db.execute(update(Annotation), updates)
+        created_ids = []
+        if creates:
+            created_ids = db.execute(
+                insert(Annotation).returning(Annotation.id, sort_by_parameter_order=True), creates
+            ).scalars().all()
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        for index in create_indexes + update_indexes + delete_indexes:
+            results[index]["error"] = f"批量写入失败: {str(e)}"
+        return results
+    
+    for index, annotation_id in zip(create_indexes, created_ids):
+        results[index]["id"] = annotation_id
+    for index in create_indexes + update_indexes + delete_indexes:
+        results[index]["success"] = True
+    return results
+
+@router.post("/bulk", response_model=AnnotationBulkResponse)
+async def bulk_annotations(
+    bulk_in: AnnotationBulkRequest,
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """批量创建/更新/删除标注
+
+    权限和标签按涉及的媒体文件、标签各查询一次，合法的操作在一个事务中批量写入；
+    不合法的操作不影响其他操作，在对应条目中返回错误。
+    """
+    if not bulk_in.operations or len(bulk_in.operations) > settings.ANNOTATION_BULK_MAX_OPERATIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"操作数量需在 1~{settings.ANNOTATION_BULK_MAX_OPERATIONS} 之间"
+        )
+    
+    results = await run_in_threadpool(_apply_bulk, db, access, bulk_in.operations)
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
 @router.get("/", response_model=List[AnnotationList])
 async def get_annotations(
+    response: Response,
     media_file_id: Optional[int] = Query(None),
     project_id: Optional[int] = Query(None),
     annotation_type: Optional[str] = Query(None),
     status_filter: Optional[str] = Query(None),
-    skip: int = Query(0, ge=0),
+    t0: Optional[float] = Query(None, ge=0),
+    t1: Optional[float] = Query(None, ge=0),
+    x0: Optional[float] = Query(None),
+    y0: Optional[float] = Query(None),
+    x1: Optional[float] = Query(None),
+    y1: Optional[float] = Query(None),
+    min_area: Optional[float] = Query(None, ge=0),
+    cursor: Optional[str] = Query(None),
     limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
-    """获取标注列表"""
+    """获取标注列表（按 id 升序；还有下一页时响应头 X-Next-Cursor 返回下一页的 cursor）
+
+    t0/t1 只返回与时间窗口 [t0, t1] 重叠的标注，没有时间的标注视为覆盖整个媒体，只有一端时间的视为该时间点；
+    x0/y0/x1/y1 只返回包围盒与该区域相交的标注，min_area 只返回包围盒面积不小于该值的标注。
+    """
     query = db.query(Annotation)
     
     # 根据媒体文件过滤
@@ -91,39 +285,18 @@ async def get_annotations(
                 detail="媒体文件不存在"
             )
         
-        if current_user.role != "admin" and media_file.uploaded_by != current_user.id:
-            project_user = db.query(ProjectUser).filter(
-                ProjectUser.project_id == media_file.project_id,
-                ProjectUser.user_id == current_user.id
-            ).first()
-            if not project_user:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="无权访问该文件"
-                )
+        if media_file.uploaded_by != current_user.id and not access.can_access(media_file.project_id):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="无权访问该文件"
+            )
         
         query = query.filter(Annotation.media_file_id == media_file_id)
     
     # 根据项目过滤
     if project_id:
         # 检查项目权限
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="项目不存在"
-            )
-        
-        if current_user.role != "admin" and project.owner_id != current_user.id:
-            project_user = db.query(ProjectUser).filter(
-                ProjectUser.project_id == project_id,
-                ProjectUser.user_id == current_user.id
-            ).first()
-            if not project_user:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="无权访问该项目"
-                )
+        access.require(project_id)
         
         # 获取项目下的媒体文件ID
         media_file_ids = db.query(MediaFile.id).filter(MediaFile.project_id == project_id).subquery()
@@ -137,6 +310,27 @@ async def get_annotations(
     if status_filter:
         query = query.filter(Annotation.status == status_filter)
     
+    # 根据时间窗口过滤（GiST 索引）
+    if t0 is not None or t1 is not None:
+        if t0 is not None and t1 is not None and t1 < t0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="时间窗口无效"
+            )
+        query = query.filter(annotation_time_range().op("&&")(time_window(t0, t1)))
+    
+    # 根据区域和面积过滤（包围盒由写入时从标注数据计算）
+    region = (x0, y0, x1, y1)
+    if any(value is not None for value in region):
+        if any(value is None for value in region) or x1 < x0 or y1 < y0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="区域无效，需要同时提供 x0、y0、x1、y1"
+            )
+        query = query.filter(annotation_box().op("&&")(region_box(x0, y0, x1, y1)))
+    if min_area is not None:
+        query = query.filter(Annotation.area >= min_area)
+    
     # 如果不是管理员，只能看到自己的标注或已审核的标注
     if current_user.role != "admin":
         query = query.filter(
@@ -144,13 +338,13 @@ async def get_annotations(
             (Annotation.status.in_(["approved", "rejected"]))
         )
     
-    annotations = query.offset(skip).limit(limit).all()
-    return annotations
+    return paginate(query, Annotation.id, cursor, limit, response)
 
 @router.get("/{annotation_id}", response_model=AnnotationResponse)
 async def get_annotation(
     annotation_id: int,
     current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """获取标注详情"""
@@ -164,12 +358,8 @@ async def get_annotation(
     # 检查权限
     if current_user.role != "admin" and annotation.annotator_id != current_user.id:
         # 检查是否是审阅员
-        media_file = db.query(MediaFile).filter(MediaFile.id == annotation.media_file_id).first()
-        project_user = db.query(ProjectUser).filter(
-            ProjectUser.project_id == media_file.project_id,
-            ProjectUser.user_id == current_user.id
-        ).first()
-        if not project_user or project_user.role not in ["reviewer", "project_manager"]:
+        project_id = db.query(MediaFile.project_id).filter(MediaFile.id == annotation.media_file_id).scalar()
+        if not access.has_role(project_id, ["reviewer", "project_manager"]):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="无权访问该标注"
@@ -200,8 +390,19 @@ async def update_annotation(
         )
     
     # 更新标注
-    for field, value in annotation_in.dict(exclude_unset=True).items():
+    fields = annotation_in.dict(exclude_unset=True)
+    try:
+        check_time_range(fields.get("start_time", annotation.start_time), fields.get("end_time", annotation.end_time))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    for field, value in fields.items():
         setattr(annotation, field, value)
+    if "data" in fields or "annotation_type" in fields:
+        for field, value in bbox_columns(annotation.annotation_type, annotation.data).items():
+            setattr(annotation, field, value)
     
     annotation.updated_at = datetime.utcnow()
     db.commit()
@@ -241,6 +442,7 @@ async def review_annotation(
     status: str,
     comment: Optional[str] = None,
     current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """审阅标注"""
@@ -252,13 +454,8 @@ async def review_annotation(
         )
     
     # 检查权限
-    media_file = db.query(MediaFile).filter(MediaFile.id == annotation.media_file_id).first()
-    project_user = db.query(ProjectUser).filter(
-        ProjectUser.project_id == media_file.project_id,
-        ProjectUser.user_id == current_user.id
-    ).first()
-    
-    if current_user.role != "admin" and (not project_user or project_user.role not in ["reviewer", "project_manager"]):
+    project_id = db.query(MediaFile.project_id).filter(MediaFile.id == annotation.media_file_id).scalar()
+    if not access.has_role(project_id, ["reviewer", "project_manager"]):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权审阅该标注"
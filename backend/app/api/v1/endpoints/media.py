@@ -1,58 +1,107 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 from typing import Any, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from celery import group
 import os
 import uuid
 from datetime import datetime
+from urllib.parse import urlsplit
 
-from app.core.database import get_db, User, MediaFile, Project, ProjectUser, MediaType
+from app.core.database import get_db, User, MediaFile, Project, MediaType, resolve_media_type
 from app.core.security import get_current_user
+from app.core.permissions import ProjectAccess, get_project_access
 from app.core.config import settings
-from app.schemas.media import MediaFileCreate, MediaFileResponse, MediaFileList
+from app.core.pagination import paginate
+from app.schemas.media import (
+    MediaFileCreate, MediaFileResponse, MediaFileList,
+    MediaBatchRegister, MediaBatchResponse, WaveformPeaksResponse,
+    VideoSegmentBatchCreate, SegmentTaskResponse
+)
 from app.services.minio_service import MinioService
-from app.services.media_service import MediaService
+from app.services.blob_service import BlobService, HashingReader
+from app.services.artifact_service import ArtifactStore, frames_params, spectrogram_params, waveform_params
+from app.services.hls_service import content_type_for
+from app.services.waveform_service import HEADER_READ_SIZE, parse_header, select_level
+from app.services.frame_service import (
+    INDEX_HEADER_SIZE, INDEX_RECORD_SIZE, index_key, pack_key,
+    parse_index_header, parse_index_record, record_offset
+)
+from app.tasks.media_tasks import ingest_signature, create_video_segments, gc_derived_artifacts
+from app.services import job_scheduler
 
 router = APIRouter()
 
+def _storage_response(minio_service: MinioService, object_name: str, headers: dict,
+                      accel_prefix: Optional[str] = None) -> Response:
+    """把对象字节的传输交给 nginx 或对象存储，API 进程本身不读取内容
+
+    accel 模式返回 X-Accel-Redirect，由 nginx 内部 location 携带客户端的 Range/If-Range
+    请求头回源 MinIO；redirect 模式返回短期有效的预签名URL。accel_prefix 可指定其他内部 location。
+    """
+    if settings.MEDIA_STREAM_MODE == "redirect":
+        url = minio_service.get_file_url(
+            object_name, expires=settings.MEDIA_STREAM_URL_EXPIRES, public=True
+        )
+        if not url:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="生成访问地址失败"
+            )
+        return RedirectResponse(url=url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers=headers)
+
+    url = minio_service.get_file_url(object_name, expires=settings.MEDIA_STREAM_URL_EXPIRES)
+    if not url:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="生成访问地址失败"
+        )
+    parts = urlsplit(url)
+    headers = dict(headers)
+    headers["X-Accel-Redirect"] = f"{accel_prefix or settings.MEDIA_ACCEL_PREFIX}{parts.path}?{parts.query}"
+    headers["X-Accel-Buffering"] = "no"
+    return Response(status_code=status.HTTP_200_OK, headers=headers)
+
+def _get_readable_media_file(media_id: int, access: ProjectAccess, db: Session) -> MediaFile:
+    """获取当前用户有权访问的媒体文件"""
+    media_file = db.query(MediaFile).filter(MediaFile.id == media_id).first()
+    if not media_file:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="媒体文件不存在"
+        )
+    
+    # 检查权限
+    if not access.can_access(media_file.project_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问该文件"
+        )
+    
+    return media_file
+
 @router.post("/upload", response_model=MediaFileResponse)
 async def upload_media_file(
     file: UploadFile = File(...),
     project_id: int = Query(...),
     current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """上传媒体文件"""
     # 检查项目权限
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="项目不存在"
-        )
-    
-    # 检查用户是否有权限上传到该项目
-    if current_user.role != "admin" and project.owner_id != current_user.id:
-        project_user = db.query(ProjectUser).filter(
-            ProjectUser.project_id == project_id,
-            ProjectUser.user_id == current_user.id
-        ).first()
-        if not project_user:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="无权上传文件到该项目"
-            )
+    access.require_upload(project_id)
     
     # 检查文件类型
-    file_extension = os.path.splitext(file.filename)[1].lower()
-    if file_extension in settings.ALLOWED_VIDEO_EXTENSIONS:
-        media_type = MediaType.VIDEO
-    elif file_extension in settings.ALLOWED_AUDIO_EXTENSIONS:
-        media_type = MediaType.AUDIO
-    else:
+    media_type = resolve_media_type(file.filename)
+    if media_type is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的文件类型"
         )
+    file_extension = os.path.splitext(file.filename)[1].lower()
     
     # 检查文件大小
     if file.size > settings.MAX_FILE_SIZE:
@@ -68,124 +117,286 @@ async def upload_media_file(
     minio_service = MinioService()
     file_path = f"projects/{project_id}/{unique_filename}"
     
+    # 上传的同时计算内容哈希，用于去重
+    reader = HashingReader(file.file)
     try:
-        minio_service.upload_file(file.file, file_path, file.content_type)
+        # 直接以分片方式流式转存 UploadFile 的临时文件，避免整文件读入内存
+        await file.seek(0)
+        await run_in_threadpool(
+            minio_service.upload_file, reader, file_path, file.content_type
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"文件上传失败: {str(e)}"
         )
     
-    # 获取媒体文件信息
-    media_service = MediaService()
-    try:
-        duration, metadata = media_service.get_media_info(file_path)
-    except Exception as e:
-        # 如果获取信息失败，设置默认值
-        duration = 0
-        metadata = {}
-    
     # 保存到数据库
     db_media_file = MediaFile(
         filename=unique_filename,
         original_filename=file.filename,
         file_path=file_path,
-        file_size=file.size,
-        duration=duration,
+        file_size=reader.size,
         media_type=media_type.value,
         project_id=project_id,
         uploaded_by=current_user.id,
-        metadata=metadata
+        media_metadata={},
+        processing_status="pending"
     )
     
     db.add(db_media_file)
+    # 相同内容已存在时复用已有对象，删除刚上传的副本
+    duplicate_path = BlobService(db).attach(db_media_file, reader.hexdigest())
     db.commit()
     db.refresh(db_media_file)
     
+    if duplicate_path:
+        await run_in_threadpool(minio_service.delete_file, duplicate_path)
+    
+    # 媒体信息和派生结果由 worker 中的入库流水线生成；重复内容直接复用已有结果，不再获取源文件
+    ingest_signature(db, db_media_file).apply_async()
+    
     return db_media_file
 
+def _save_batch(
+    db: Session,
+    project_id: int,
+    current_user: User,
+    entries: List[dict],
+    results: List[dict],
+    minio_service: MinioService
+) -> List[dict]:
+    """在一个事务中写入所有成功条目，并以一个 Celery group 排队处理"""
+    blob_service = BlobService(db)
+    saved = []
+    duplicate_paths = []
+    for entry in entries:
+        db_media_file = MediaFile(
+            filename=os.path.basename(entry["file_path"]),
+            original_filename=entry["filename"],
+            file_path=entry["file_path"],
+            file_size=entry["size"],
+            media_type=entry["media_type"].value,
+            project_id=project_id,
+            uploaded_by=current_user.id,
+            media_metadata={},
+            processing_status="pending"
+        )
+        db.add(db_media_file)
+        if entry.get("content_hash"):
+            duplicate_path = blob_service.attach(db_media_file, entry["content_hash"])
+            if duplicate_path:
+                duplicate_paths.append(duplicate_path)
+        saved.append((entry, db_media_file))
+    db.commit()
+    
+    for path in duplicate_paths:
+        minio_service.delete_file(path)
+    
+    signatures = []
+    for entry, db_media_file in saved:
+        db.refresh(db_media_file)
+        results[entry["index"]].update(success=True, media_file=db_media_file)
+        signatures.append(ingest_signature(db, db_media_file))
+    
+    if signatures:
+        group(signatures).apply_async()
+    
+    return results
+
+def _batch_response(project_id: int, results: List[dict]) -> dict:
+    succeeded = sum(1 for result in results if result["success"])
+    return {
+        "project_id": project_id,
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results
+    }
+
+@router.post("/batch-upload", response_model=MediaBatchResponse)
+async def batch_upload_media_files(
+    files: List[UploadFile] = File(...),
+    project_id: int = Query(...),
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """批量上传媒体文件（逐个文件返回成功或失败）"""
+    if len(files) > settings.MEDIA_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多上传 {settings.MEDIA_BATCH_MAX_FILES} 个文件"
+        )
+    
+    # 权限只检查一次
+    access.require_upload(project_id)
+    
+    results = [
+        {"index": index, "filename": file.filename, "success": False, "media_file": None, "error": None}
+        for index, file in enumerate(files)
+    ]
+    jobs = []
+    for index, file in enumerate(files):
+        media_type = resolve_media_type(file.filename)
+        if media_type is None:
+            results[index]["error"] = "不支持的文件类型"
+        elif file.size is not None and file.size > settings.MAX_FILE_SIZE:
+            results[index]["error"] = "文件大小超过限制"
+        else:
+            file_extension = os.path.splitext(file.filename)[1].lower()
+            jobs.append({
+                "index": index,
+                "file": file,
+                "filename": file.filename,
+                "media_type": media_type,
+                "file_path": f"projects/{project_id}/{uuid.uuid4()}{file_extension}"
+            })
+    
+    minio_service = MinioService()
+    
+    def upload(job: dict) -> dict:
+        reader = HashingReader(job["file"].file)
+        try:
+            job["file"].file.seek(0)
+            minio_service.upload_file(reader, job["file_path"], job["file"].content_type)
+        except Exception as e:
+            job["error"] = f"文件上传失败: {str(e)}"
+            return job
+        job["size"] = reader.size
+        job["content_hash"] = reader.hexdigest()
+        return job
+    
+    def upload_all() -> List[dict]:
+        # 有界线程池并发写入存储
+        with ThreadPoolExecutor(max_workers=settings.MEDIA_BATCH_UPLOAD_WORKERS) as executor:
+            return list(executor.map(upload, jobs))
+    
+    entries = []
+    for job in await run_in_threadpool(upload_all):
+        if job.get("error"):
+            results[job["index"]]["error"] = job["error"]
+        else:
+            entries.append(job)
+    
+    _save_batch(db, project_id, current_user, entries, results, minio_service)
+    return _batch_response(project_id, results)
+
+@router.post("/batch-register", response_model=MediaBatchResponse)
+async def batch_register_media_files(
+    batch_in: MediaBatchRegister,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """批量登记已暂存到对象存储的媒体文件"""
+    if len(batch_in.items) > settings.MEDIA_BATCH_MAX_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"单次最多登记 {settings.MEDIA_BATCH_MAX_FILES} 个文件"
+        )
+    
+    project_id = batch_in.project_id
+    access.require_upload(project_id)
+    
+    results = [
+        {"index": index, "filename": item.original_filename, "success": False, "media_file": None, "error": None}
+        for index, item in enumerate(batch_in.items)
+    ]
+    prefix = f"projects/{project_id}/"
+    # 已被其他媒体文件、内容对象或上传会话使用的对象不能再登记，否则删除新记录时会删除共享对象
+    referenced = BlobService(db).referenced_paths(item.file_path for item in batch_in.items)
+    seen = set()
+    jobs = []
+    for index, item in enumerate(batch_in.items):
+        media_type = resolve_media_type(item.file_path)
+        if not item.file_path.startswith(prefix) or ".." in item.file_path:
+            results[index]["error"] = "对象不属于该项目"
+        elif item.file_path in referenced or item.file_path in seen:
+            results[index]["error"] = "对象已被使用"
+        elif media_type is None:
+            results[index]["error"] = "不支持的文件类型"
+        else:
+            jobs.append({
+                "index": index,
+                "filename": item.original_filename,
+                "media_type": media_type,
+                "file_path": item.file_path
+            })
+            seen.add(item.file_path)
+    
+    minio_service = MinioService()
+    
+    def check(job: dict) -> dict:
+        stat = minio_service.stat_file(job["file_path"])
+        if stat is None:
+            job["error"] = "对象不存在"
+        elif stat.size > settings.MAX_UPLOAD_SIZE:
+            job["error"] = "文件大小超过限制"
+        else:
+            job["size"] = stat.size
+        return job
+    
+    def check_all() -> List[dict]:
+        with ThreadPoolExecutor(max_workers=settings.MEDIA_BATCH_UPLOAD_WORKERS) as executor:
+            return list(executor.map(check, jobs))
+    
+    entries = []
+    for job in await run_in_threadpool(check_all):
+        if job.get("error"):
+            results[job["index"]]["error"] = job["error"]
+        else:
+            entries.append(job)
+    
+    # 已暂存对象的内容哈希由 入库流水线计算
+    _save_batch(db, project_id, current_user, entries, results, minio_service)
+    return _batch_response(project_id, results)
+
 @router.get("/", response_model=List[MediaFileList])
 async def get_media_files(
+    response: Response,
     project_id: Optional[int] = Query(None),
     media_type: Optional[str] = Query(None),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
-    """获取媒体文件列表"""
+    """获取媒体文件列表（按 id 升序；还有下一页时响应头 X-Next-Cursor 返回下一页的 cursor）"""
     query = db.query(MediaFile)
     
     # 根据项目过滤
     if project_id:
         # 检查项目权限
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="项目不存在"
-            )
-        
-        if current_user.role != "admin" and project.owner_id != current_user.id:
-            project_user = db.query(ProjectUser).filter(
-                ProjectUser.project_id == project_id,
-                ProjectUser.user_id == current_user.id
-            ).first()
-            if not project_user:
-                raise HTTPException(
-                    status_code=status.HTTP_403_FORBIDDEN,
-                    detail="无权访问该项目"
-                )
+        access.require(project_id)
         
         query = query.filter(MediaFile.project_id == project_id)
     else:
         # 获取用户有权限的项目
-        if current_user.role != "admin":
-            project_ids = db.query(ProjectUser.project_id).filter(
-                ProjectUser.user_id == current_user.id
-            ).subquery()
-            query = query.filter(MediaFile.project_id.in_(project_ids))
+        if not access.is_admin:
+            query = query.filter(MediaFile.project_id.in_(access.project_ids()))
     
     # 根据媒体类型过滤
     if media_type:
         query = query.filter(MediaFile.media_type == media_type)
     
-    media_files = query.offset(skip).limit(limit).all()
-    return media_files
+    return paginate(query, MediaFile.id, cursor, limit, response)
 
 @router.get("/{media_id}", response_model=MediaFileResponse)
 async def get_media_file(
     media_id: int,
     current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """获取媒体文件详情"""
-    media_file = db.query(MediaFile).filter(MediaFile.id == media_id).first()
-    if not media_file:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="媒体文件不存在"
-        )
-    
-    # 检查权限
-    project = db.query(Project).filter(Project.id == media_file.project_id).first()
-    if current_user.role != "admin" and project.owner_id != current_user.id:
-        project_user = db.query(ProjectUser).filter(
-            ProjectUser.project_id == media_file.project_id,
-            ProjectUser.user_id == current_user.id
-        ).first()
-        if not project_user:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="无权访问该文件"
-            )
+    media_file = _get_readable_media_file(media_id, access, db)
     
     return media_file
 
 @router.delete("/{media_id}")
 async def delete_media_file(
     media_id: int,
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """删除媒体文件"""
@@ -198,22 +409,329 @@ async def delete_media_file(
     
     # 检查权限
     project = db.query(Project).filter(Project.id == media_file.project_id).first()
-    if current_user.role != "admin" and project.owner_id != current_user.id:
+    if not access.is_owner(project):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权删除该文件"
         )
     
-    # 从MinIO删除文件
-    minio_service = MinioService()
-    try:
-        minio_service.delete_file(media_file.file_path)
-    except Exception as e:
-        # 记录错误但不阻止删除数据库记录
-        print(f"删除MinIO文件失败: {str(e)}")
+    # 释放内容引用，最后一个引用删除时才删除存储对象及其派生结果
+    object_name = BlobService(db).release(media_file)
     
     # 删除数据库记录
     db.delete(media_file)
     db.commit()
     
-    return {"message": "文件删除成功"}
\ No newline at end of file
+    # 从MinIO删除文件
+    if object_name:
+        minio_service = MinioService()
+        try:
+            minio_service.delete_file(object_name)
+        except Exception as e:
+            # 记录错误但不影响删除结果
+            print(f"删除MinIO文件失败: {str(e)}")
+        gc_derived_artifacts.delay(object_name)
+    
+    return {"message": "文件删除成功"}
+
+@router.get("/{media_id}/stream")
+async def stream_media_file(
+    media_id: int,
+    request: Request,
+    rendition: str = Query("auto", pattern="^(auto|original|hls)$"),
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """播放媒体文件（支持 Range/If-Range 断点与拖动）
+
+    rendition=auto 时已生成 HLS 档位则跳转到主播放列表，否则返回原始文件；
+    rendition=original 始终返回原始文件，rendition=hls 要求档位已生成。
+    """
+    media_file = _get_readable_media_file(media_id, access, db)
+    
+    if rendition != "original" and media_file.hls_playlist:
+        return RedirectResponse(
+            url=str(request.url_for("get_media_hls", media_id=media_id, path="master.m3u8")),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT
+        )
+    if rendition == "hls":
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="HLS 档位尚未生成"
+        )
+    
+    minio_service = MinioService()
+    stat = await run_in_threadpool(minio_service.stat_file, media_file.file_path)
+    if stat is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="媒体文件不存在"
+        )
+    
+    # 强 ETag 与 MinIO 返回的 ETag 一致，If-Range 由 MinIO 按同一 ETag 判断
+    etag = f'"{stat.etag}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+        "Content-Type": stat.content_type or "application/octet-stream",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return _storage_response(minio_service, media_file.file_path, headers)
+
+@router.get("/{media_id}/waveform", response_model=WaveformPeaksResponse)
+async def get_media_waveform(
+    media_id: int,
+    t0: float = Query(0, ge=0),
+    t1: Optional[float] = Query(None, gt=0),
+    width: int = Query(1000, ge=1, le=20000),
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取 [t0, t1] 时间窗口内的波形峰值，按 width 自动选择合适的缩放层级"""
+    media_file = _get_readable_media_file(media_id, access, db)
+    
+    waveform = ArtifactStore(db).lookup(media_file, "waveform", waveform_params())
+    if not waveform:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="波形数据尚未生成"
+        )
+    object_key = waveform["object_key"]
+    
+    minio_service = MinioService()
+    try:
+        header = parse_header(await run_in_threadpool(minio_service.read_range, object_key, 0, HEADER_READ_SIZE))
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="波形数据尚未生成"
+        )
+    
+    sample_rate = header["sample_rate"]
+    if t1 is None:
+        t1 = header["levels"][0]["count"] * header["base_samples_per_peak"] / sample_rate
+    if t1 <= t0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="时间窗口无效"
+        )
+    
+    level_index = select_level(header, t0, t1, width)
+    level = header["levels"][level_index]
+    peak_duration = level["samples_per_peak"] / sample_rate
+    start_index = min(int(t0 / peak_duration), level["count"])
+    end_index = min(int(t1 / peak_duration) + 1, level["count"])
+    
+    peaks = []
+    if end_index > start_index:
+        # 只读取窗口对应的字节范围（每个峰值 2 字节）
+        data = await run_in_threadpool(
+            minio_service.read_range, object_key,
+            level["offset"] + start_index * 2, (end_index - start_index) * 2
+        )
+        peaks = [value - 256 if value > 127 else value for value in data]
+    
+    return {
+        "media_file_id": media_id,
+        "level": level_index,
+        "sample_rate": sample_rate,
+        "samples_per_peak": level["samples_per_peak"],
+        "start_index": start_index,
+        "start_time": start_index * peak_duration,
+        "peak_duration": peak_duration,
+        "peaks": peaks
+    }
+
+@router.get("/{media_id}/spectrogram")
+async def get_media_spectrogram(
+    media_id: int,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取频谱图瓦片清单（层级、每列时长、瓦片数）"""
+    media_file = _get_readable_media_file(media_id, access, db)
+    
+    manifest = ArtifactStore(db).lookup(media_file, "spectrogram", spectrogram_params())
+    if not manifest:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="频谱图尚未生成"
+        )
+    return manifest
+
+@router.get("/{media_id}/spectrogram/{level}/{x}")
+async def get_media_spectrogram_tile(
+    media_id: int,
+    level: int,
+    x: int,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取单个频谱图瓦片（PNG）"""
+    media_file = _get_readable_media_file(media_id, access, db)
+    if level < 0 or x < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="瓦片坐标无效"
+        )
+    
+    manifest = ArtifactStore(db).lookup(media_file, "spectrogram", spectrogram_params())
+    if not manifest:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="频谱图尚未生成"
+        )
+    prefix = manifest["prefix"]
+    
+    # 瓦片内容不可变：浏览器长期缓存，nginx 通过带缓存的内部 location 回源
+    headers = {
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Type": "image/png",
+    }
+    return _storage_response(
+        MinioService(), f"{prefix}/{level}/{x}.png", headers,
+        accel_prefix=settings.MEDIA_ACCEL_CACHED_PREFIX
+    )
+
+@router.get("/{media_id}/frames/{index}")
+async def get_media_frame(
+    media_id: int,
+    index: int,
+    fps: int = Query(1, ge=1),
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """按序号获取单个视频帧（JPEG）
+
+    帧包格式先按定长记录读取索引，再对帧包做一次字节范围读取；单帧文件格式直接交给存储返回。
+    """
+    media_file = _get_readable_media_file(media_id, access, db)
+    if index < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="帧序号无效"
+        )
+    
+    artifact_store = ArtifactStore(db)
+    headers = {"Cache-Control": "private, max-age=31536000, immutable"}
+    minio_service = MinioService()
+    
+    # 优先使用帧包格式，其次是单帧文件格式
+    frames = artifact_store.lookup(media_file, "frames", frames_params(fps, "pack"))
+    files = artifact_store.lookup(media_file, "frames", frames_params(fps, "files"))
+    if frames is None and files is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="视频帧尚未提取"
+        )
+    if frames is None:
+        if index >= files["frame_count"]:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="帧不存在"
+            )
+        headers["Content-Type"] = "image/jpeg"
+        return _storage_response(minio_service, f"{files['prefix']}/frame_{index:06d}.jpg", headers)
+    
+    prefix = frames["prefix"]
+    try:
+        index_header = parse_index_header(
+            await run_in_threadpool(minio_service.read_range, index_key(prefix), 0, INDEX_HEADER_SIZE)
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="视频帧尚未提取"
+        )
+    if index >= index_header["frame_count"]:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="帧不存在"
+        )
+    
+    record = parse_index_record(await run_in_threadpool(
+        minio_service.read_range, index_key(prefix), record_offset(index), INDEX_RECORD_SIZE
+    ))
+    data = await run_in_threadpool(
+        minio_service.read_range, pack_key(prefix, record["pack"]), record["offset"], record["length"]
+    )
+    headers["X-Frame-Timestamp"] = str(record["timestamp"])
+    return Response(content=data, media_type="image/jpeg", headers=headers)
+
+@router.post("/{media_id}/segments", response_model=SegmentTaskResponse)
+async def create_media_segments(
+    media_id: int,
+    segments_in: VideoSegmentBatchCreate,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """批量创建视频片段（异步执行，源文件只处理一遍）"""
+    media_file = _get_readable_media_file(media_id, access, db)
+    if media_file.media_type != MediaType.VIDEO:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不是视频文件"
+        )
+    if not segments_in.ranges or len(segments_in.ranges) > settings.SEGMENT_BATCH_MAX_RANGES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"片段数量需在 1~{settings.SEGMENT_BATCH_MAX_RANGES} 之间"
+        )
+    for item in segments_in.ranges:
+        if item.start_time < 0 or item.end_time <= item.start_time:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="片段区间无效"
+            )
+    
+    task = job_scheduler.dispatch(
+        create_video_segments, media_file, ["segment"],
+        args=(media_id, [[item.start_time, item.end_time] for item in segments_in.ranges], current_user.id),
+        seconds=sum(item.end_time - item.start_time for item in segments_in.ranges)
+    )
+    return {"task_id": task.id, "range_count": len(segments_in.ranges)}
+
+@router.get("/{media_id}/hls/{path:path}")
+async def get_media_hls(
+    media_id: int,
+    path: str,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """获取 HLS 播放列表或分片（播放列表中的路径均为相对路径）"""
+    media_file = _get_readable_media_file(media_id, access, db)
+    if not media_file.hls_playlist:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="HLS 档位尚未生成"
+        )
+    
+    content_type = content_type_for(path)
+    if content_type is None or ".." in path.split("/"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="路径无效"
+        )
+    
+    prefix = media_file.hls_playlist.rsplit("/", 1)[0]
+    headers = {"Content-Type": content_type}
+    if path.endswith(".ts"):
+        # 分片内容不可变，经由带缓存的内部 location 回源
+        headers["Cache-Control"] = "private, max-age=31536000, immutable"
+        return _storage_response(
+            MinioService(), f"{prefix}/{path}", headers,
+            accel_prefix=settings.MEDIA_ACCEL_CACHED_PREFIX
+        )
+    headers["Cache-Control"] = "private, max-age=0, must-revalidate"
+    return _storage_response(MinioService(), f"{prefix}/{path}", headers)
\ No newline at end of file
@@ -3,8 +3,11 @@ from sqlalchemy.orm import Session
 from typing import Any, List, Optional
 from app.core.database import get_db, User, Project, ProjectUser, UserRole
 from app.core.security import get_current_user, check_user_permission
+from app.core.permissions import ProjectAccess, get_project_access, invalidate_project_access
 from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse, ProjectList
 from app.schemas.user import UserResponse
+from app.schemas.media import SegmentTaskResponse
+from app.tasks.media_tasks import export_approved_segments
 
 router = APIRouter()
 
@@ -25,11 +28,13 @@ async def create_project(
     db_project = Project(
         name=project_in.name,
         description=project_in.description,
+        processing_config=project_in.processing_config,
         owner_id=current_user.id
     )
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    invalidate_project_access([current_user.id])
     
     return db_project
 
@@ -37,20 +42,17 @@ async def create_project(
 async def get_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """获取项目列表"""
     # 根据用户角色获取项目
-    if current_user.role == UserRole.ADMIN:
+    if access.is_admin:
         projects = db.query(Project).offset(skip).limit(limit).all()
     else:
-        # 获取用户参与的项目
-        project_ids = db.query(ProjectUser.project_id).filter(
-            ProjectUser.user_id == current_user.id
-        ).subquery()
+        # 获取用户拥有或参与的项目
         projects = db.query(Project).filter(
-            Project.id.in_(project_ids)
+            Project.id.in_(access.project_ids())
         ).offset(skip).limit(limit).all()
     
     return projects
@@ -58,10 +60,13 @@ async def get_projects(
 @router.get("/{project_id}", response_model=ProjectResponse)
 async def get_project(
     project_id: int,
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """获取项目详情"""
+    # 检查用户权限
+    access.require(project_id)
+    
     project = db.query(Project).filter(Project.id == project_id).first()
     if not project:
         raise HTTPException(
@@ -69,26 +74,13 @@ async def get_project(
             detail="项目不存在"
         )
     
-    # 检查用户权限
-    if current_user.role != UserRole.ADMIN and project.owner_id != current_user.id:
-        # 检查用户是否参与该项目
-        project_user = db.query(ProjectUser).filter(
-            ProjectUser.project_id == project_id,
-            ProjectUser.user_id == current_user.id
-        ).first()
-        if not project_user:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="无权访问该项目"
-            )
-    
     return project
 
 @router.put("/{project_id}", response_model=ProjectResponse)
 async def update_project(
     project_id: int,
     project_in: ProjectUpdate,
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """更新项目信息"""
@@ -100,7 +92,7 @@ async def update_project(
         )
     
     # 检查权限
-    if current_user.role != UserRole.ADMIN and project.owner_id != current_user.id:
+    if not access.is_owner(project):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权修改该项目"
@@ -118,7 +110,7 @@ async def update_project(
 @router.delete("/{project_id}")
 async def delete_project(
     project_id: int,
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """删除项目"""
@@ -130,15 +122,20 @@ async def delete_project(
         )
     
     # 检查权限
-    if current_user.role != UserRole.ADMIN and project.owner_id != current_user.id:
+    if not access.is_owner(project):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权删除该项目"
         )
     
     # 删除项目（这里应该先删除相关数据）
+    # 成员和所有者的权限缓存在提交后清除
+    member_ids = [project.owner_id] + [user_id for (user_id,) in db.query(ProjectUser.user_id).filter(
+        ProjectUser.project_id == project_id
+    ).all()]
     db.delete(project)
     db.commit()
+    invalidate_project_access(member_ids)
     
     return {"message": "项目删除成功"}
 
@@ -147,7 +144,7 @@ async def add_user_to_project(
     project_id: int,
     user_id: int,
     role: UserRole = UserRole.ANNOTATOR,
-    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
     db: Session = Depends(get_db)
 ) -> Any:
     """添加用户到项目"""
@@ -159,7 +156,7 @@ async def add_user_to_project(
         )
     
     # 检查权限
-    if current_user.role != UserRole.ADMIN and project.owner_id != current_user.id:
+    if not access.is_owner(project):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="无权管理该项目用户"
@@ -193,5 +190,30 @@ async def add_user_to_project(
     )
     db.add(project_user)
     db.commit()
+    invalidate_project_access([user_id])
+    
+    return {"message": "用户添加成功"}
+
+@router.post("/{project_id}/export-segments", response_model=SegmentTaskResponse)
+async def export_project_segments(
+    project_id: int,
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """为项目中所有已审核通过的标注导出视频片段"""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="项目不存在"
+        )
+    
+    # 检查权限
+    if not access.is_owner(project):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权导出该项目"
+        )
     
-    return {"message": "用户添加成功"}
\ No newline at end of file
+    task = export_approved_segments.delay(project_id, access.user.id)
+    return {"task_id": task.id}
@@ -0,0 +1,375 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from typing import Any
+import math
+import os
+import uuid
+
+from app.core.database import get_db, User, MediaFile, UploadSession, UploadPart, resolve_media_type
+from app.core.security import get_current_user
+from app.core.permissions import ProjectAccess, get_project_access
+from app.core.config import settings
+from app.schemas.media import MediaFileResponse
+from app.schemas.upload import (
+    UploadSessionCreate, UploadSessionResponse, UploadChunkResponse,
+    PresignedUploadCreate, PresignedUploadResponse
+)
+from app.services.minio_service import MinioService
+from app.tasks.media_tasks import ingest_signature
+
+router = APIRouter()
+
+# S3 multipart 最多 10000 个分片
+MAX_PART_COUNT = 10000
+
+def _get_session(session_id: int, current_user: User, db: Session, for_update: bool = False) -> UploadSession:
+    """获取当前用户的上传会话"""
+    query = db.query(UploadSession).filter(UploadSession.id == session_id)
+    if for_update:
+        query = query.with_for_update()
+    upload_session = query.first()
+    if not upload_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="上传会话不存在"
+        )
+    if current_user.role != "admin" and upload_session.uploaded_by != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="无权访问该上传会话"
+        )
+    return upload_session
+
+def _total_chunks(upload_session: UploadSession) -> int:
+    if upload_session.upload_mode == "presigned":
+        return 0
+    return max(1, math.ceil(upload_session.total_size / upload_session.chunk_size))
+
+def _session_response(upload_session: UploadSession) -> dict:
+    total_chunks = _total_chunks(upload_session)
+    received = sorted(part.part_number - 1 for part in upload_session.parts)
+    received_set = set(received)
+    return {
+        "id": upload_session.id,
+        "project_id": upload_session.project_id,
+        "original_filename": upload_session.original_filename,
+        "upload_mode": upload_session.upload_mode,
+        "media_type": upload_session.media_type,
+        "total_size": upload_session.total_size,
+        "chunk_size": upload_session.chunk_size,
+        "total_chunks": total_chunks,
+        "status": upload_session.status,
+        "received_chunks": received,
+        "received_bytes": sum(part.size for part in upload_session.parts),
+        "missing_chunks": [i for i in range(total_chunks) if i not in received_set],
+        "media_file_id": upload_session.media_file_id,
+        "created_at": upload_session.created_at,
+    }
+
+@router.post("/", response_model=UploadSessionResponse)
+async def create_upload_session(
+    session_in: UploadSessionCreate,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """创建分片上传会话"""
+    access.require_upload(session_in.project_id)
+    media_type = resolve_media_type(session_in.filename)
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的文件类型"
+        )
+
+    if session_in.total_size <= 0 or session_in.total_size > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="文件大小超过限制"
+        )
+
+    # 分片大小限制在 S3 允许的范围内，且分片数不超过 10000
+    chunk_size = session_in.chunk_size or settings.UPLOAD_CHUNK_SIZE
+    chunk_size = min(max(chunk_size, settings.UPLOAD_MIN_CHUNK_SIZE), settings.UPLOAD_MAX_CHUNK_SIZE)
+    chunk_size = max(chunk_size, math.ceil(session_in.total_size / MAX_PART_COUNT))
+
+    file_extension = os.path.splitext(session_in.filename)[1].lower()
+    file_path = f"projects/{session_in.project_id}/{uuid.uuid4()}{file_extension}"
+
+    minio_service = MinioService()
+    try:
+        upload_id = await run_in_threadpool(
+            minio_service.create_multipart_upload, file_path, session_in.content_type
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"创建上传会话失败: {str(e)}"
+        )
+
+    upload_session = UploadSession(
+        project_id=session_in.project_id,
+        uploaded_by=current_user.id,
+        original_filename=session_in.filename,
+        file_path=file_path,
+        media_type=media_type.value,
+        content_type=session_in.content_type,
+        total_size=session_in.total_size,
+        chunk_size=chunk_size,
+        upload_id=upload_id
+    )
+    db.add(upload_session)
+    db.commit()
+    db.refresh(upload_session)
+
+    return _session_response(upload_session)
+
+@router.post("/presigned", response_model=PresignedUploadResponse)
+async def create_presigned_upload(
+    upload_in: PresignedUploadCreate,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """签发预签名PUT URL，客户端直接上传到对象存储，完成后调用 complete"""
+    access.require_upload(upload_in.project_id)
+    media_type = resolve_media_type(upload_in.filename)
+    if media_type is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不支持的文件类型"
+        )
+
+    file_extension = os.path.splitext(upload_in.filename)[1].lower()
+    file_path = f"projects/{upload_in.project_id}/{uuid.uuid4()}{file_extension}"
+
+    minio_service = MinioService()
+    url = minio_service.get_upload_url(file_path, expires=settings.PRESIGNED_UPLOAD_EXPIRES)
+    if not url:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="生成上传地址失败"
+        )
+
+    upload_session = UploadSession(
+        project_id=upload_in.project_id,
+        uploaded_by=current_user.id,
+        original_filename=upload_in.filename,
+        file_path=file_path,
+        media_type=media_type.value,
+        content_type=upload_in.content_type,
+        upload_mode="presigned"
+    )
+    db.add(upload_session)
+    db.commit()
+    db.refresh(upload_session)
+
+    return {
+        "session_id": upload_session.id,
+        "url": url,
+        "method": "PUT",
+        "file_path": file_path,
+        "expires_in": settings.PRESIGNED_UPLOAD_EXPIRES
+    }
+
+@router.get("/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """查询上传会话及已接收的分片"""
+    upload_session = _get_session(session_id, current_user, db)
+    return _session_response(upload_session)
+
+@router.put("/{session_id}/chunks/{index}", response_model=UploadChunkResponse)
+async def upload_chunk(
+    session_id: int,
+    index: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """上传单个分片（请求体为分片原始字节，可乱序、并行、重复上传）"""
+    upload_session = _get_session(session_id, current_user, db)
+    if upload_session.status != "uploading" or upload_session.upload_mode != "multipart":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上传会话已结束"
+        )
+
+    total_chunks = _total_chunks(upload_session)
+    if index < 0 or index >= total_chunks:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分片序号超出范围"
+        )
+
+    offset = index * upload_session.chunk_size
+    expected_size = min(upload_session.chunk_size, upload_session.total_size - offset)
+    content_length = request.headers.get("content-length")
+    if content_length is not None and int(content_length) != expected_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"分片大小应为 {expected_size} 字节"
+        )
+
+    data = await request.body()
+    if len(data) != expected_size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"分片大小应为 {expected_size} 字节"
+        )
+
+    minio_service = MinioService()
+    part_number = index + 1
+    try:
+        etag = await run_in_threadpool(
+            minio_service.upload_part,
+            upload_session.file_path, upload_session.upload_id, part_number, data
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"分片上传失败: {str(e)}"
+        )
+
+    # 同一分片重复上传时以最后一次为准
+    part = db.query(UploadPart).filter(
+        UploadPart.session_id == session_id,
+        UploadPart.part_number == part_number
+    ).first()
+    if part:
+        part.etag = etag
+        part.size = len(data)
+        db.commit()
+    else:
+        db.add(UploadPart(session_id=session_id, part_number=part_number, etag=etag, size=len(data)))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            db.query(UploadPart).filter(
+                UploadPart.session_id == session_id,
+                UploadPart.part_number == part_number
+            ).update({"etag": etag, "size": len(data)})
+            db.commit()
+
+    return {
+        "session_id": session_id,
+        "index": index,
+        "offset": offset,
+        "size": len(data),
+        "etag": etag
+    }
+
+@router.post("/{session_id}/complete", response_model=MediaFileResponse)
+async def complete_upload_session(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    access: ProjectAccess = Depends(get_project_access),
+    db: Session = Depends(get_db)
+) -> Any:
+    """完成上传：分片上传在 MinIO 端合并分片，预签名直传则校验对象，随后创建媒体文件记录"""
+    upload_session = _get_session(session_id, current_user, db, for_update=True)
+    if upload_session.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上传会话已结束"
+        )
+    # 创建会话后用户可能已被移出项目，创建媒体文件前重新检查
+    access.require_upload(upload_session.project_id)
+
+    minio_service = MinioService()
+    if upload_session.upload_mode == "presigned":
+        # 客户端已直传到对象存储，确认对象存在并读取实际大小
+        stat = await run_in_threadpool(minio_service.stat_file, upload_session.file_path)
+        if stat is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="文件尚未上传"
+            )
+        if stat.size > settings.MAX_UPLOAD_SIZE:
+            await run_in_threadpool(minio_service.delete_file, upload_session.file_path)
+            upload_session.status = "aborted"
+            db.commit()
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="文件大小超过限制"
+            )
+        upload_session.total_size = stat.size
+    else:
+        parts = sorted(upload_session.parts, key=lambda part: part.part_number)
+        received = {part.part_number for part in parts}
+        missing = [i for i in range(_total_chunks(upload_session)) if i + 1 not in received]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"缺少分片: {missing[:100]}"
+            )
+
+        try:
+            await run_in_threadpool(
+                minio_service.complete_multipart_upload,
+                upload_session.file_path,
+                upload_session.upload_id,
+                [(part.part_number, part.etag) for part in parts]
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"合并分片失败: {str(e)}"
+            )
+
+    db_media_file = MediaFile(
+        filename=os.path.basename(upload_session.file_path),
+        original_filename=upload_session.original_filename,
+        file_path=upload_session.file_path,
+        file_size=upload_session.total_size,
+        media_type=upload_session.media_type,
+        project_id=upload_session.project_id,
+        uploaded_by=upload_session.uploaded_by,
+        media_metadata={},
+        processing_status="pending"
+    )
+    db.add(db_media_file)
+    db.flush()
+
+    upload_session.status = "completed"
+    upload_session.media_file_id = db_media_file.id
+    db.commit()
+    db.refresh(db_media_file)
+
+    # 异步执行入库流水线（去重、探测、派生结果）
+    ingest_signature(db, db_media_file).apply_async()
+
+    return db_media_file
+
+@router.delete("/{session_id}")
+async def abort_upload_session(
+    session_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> Any:
+    """取消上传"""
+    upload_session = _get_session(session_id, current_user, db, for_update=True)
+    if upload_session.status != "uploading":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="上传会话已结束"
+        )
+
+    minio_service = MinioService()
+    if upload_session.upload_mode == "presigned":
+        await run_in_threadpool(minio_service.delete_file, upload_session.file_path)
+    else:
+        await run_in_threadpool(
+            minio_service.abort_multipart_upload, upload_session.file_path, upload_session.upload_id
+        )
+
+    upload_session.status = "aborted"
+    db.commit()
+
+    return {"message": "上传已取消"}
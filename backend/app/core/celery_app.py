@@ -1,4 +1,5 @@
 from celery import Celery
+from celery.signals import worker_init, before_task_publish, task_prerun, task_postrun
 from app.core.config import settings
 
 celery_app = Celery(
@@ -22,8 +23,20 @@ celery_app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
-# 任务路由
+# 任务路由（媒体任务通过 job_scheduler 按成本发送到 media.light / media.heavy，未经调度的进入 media）
 celery_app.conf.task_routes = {
     "app.tasks.media_tasks.*": {"queue": "media"},
     "app.tasks.annotation_tasks.*": {"queue": "annotation"},
-}
\ No newline at end of file
+}
+
+# 记录各类任务的排队等待与运行时间
+from app.services import job_scheduler
+before_task_publish.connect(job_scheduler.on_before_publish, weak=False)
+task_prerun.connect(job_scheduler.on_task_prerun, weak=False)
+task_postrun.connect(job_scheduler.on_task_postrun, weak=False)
+
+@worker_init.connect
+def init_storage(**kwargs):
+    """worker 启动时检查一次存储桶"""
+    from app.services.minio_service import ensure_bucket_exists
+    ensure_bucket_exists()
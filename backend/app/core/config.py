@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -25,9 +25,33 @@ class Settings(BaseSettings):
     MINIO_SECRET_KEY: str = "minioadmin"
     MINIO_BUCKET_NAME: str = "annotation-media"
     MINIO_SECURE: bool = False
+    MINIO_REGION: str = "us-east-1"
+    MINIO_PUBLIC_ENDPOINT: Optional[str] = None  # 客户端可访问的地址，用于生成预签名URL
+    MINIO_PUBLIC_SECURE: bool = False
+    MINIO_POOL_MAXSIZE: int = 32  # 每个进程到 MinIO 的连接池大小
+    MINIO_CONNECT_TIMEOUT: float = 5.0
+    MINIO_READ_TIMEOUT: float = 300.0
+    MINIO_RETRY_TOTAL: int = 3
+    MINIO_RETRY_BACKOFF: float = 0.5  # 重试退避系数（秒）
+    MINIO_PART_SIZE: int = 1024 * 1024 * 8  # 流式上传分片大小（最小5MB）
     
     # 文件上传配置
     MAX_FILE_SIZE: int = 1024 * 1024 * 100  # 100MB
+    MAX_UPLOAD_SIZE: int = 1024 * 1024 * 1024 * 50  # 分片上传上限 50GB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024 * 16  # 默认分片大小 16MB
+    UPLOAD_MIN_CHUNK_SIZE: int = 1024 * 1024 * 5  # S3 multipart 最小分片 5MB
+    UPLOAD_MAX_CHUNK_SIZE: int = 1024 * 1024 * 64
+    MEDIA_BATCH_UPLOAD_WORKERS: int = 8  # 批量上传时并发写入存储的线程数
+    MEDIA_BATCH_MAX_FILES: int = 500
+    ANNOTATION_BULK_MAX_OPERATIONS: int = 20000  # 单个批量标注请求的操作数上限
+    PROJECT_ACCESS_TTL: int = 60  # 用户项目成员关系在 Redis 中的缓存时间（秒）
+    PRESIGNED_UPLOAD_EXPIRES: int = 3600  # 预签名上传URL有效期（秒）
+    
+    # 媒体播放配置
+    MEDIA_STREAM_MODE: str = "accel"  # accel: 通过 nginx X-Accel-Redirect 转发; redirect: 重定向到预签名URL
+    MEDIA_STREAM_URL_EXPIRES: int = 300  # 播放用预签名URL有效期（秒）
+    MEDIA_ACCEL_PREFIX: str = "/_storage"  # nginx 内部 location，代理到 MinIO
+    MEDIA_ACCEL_CACHED_PREFIX: str = "/_storage_cached"  # 带 nginx 缓存的内部 location，用于不可变的瓦片
     ALLOWED_VIDEO_EXTENSIONS: List[str] = [".mp4", ".avi", ".mov", ".mkv", ".wmv"]
     ALLOWED_AUDIO_EXTENSIONS: List[str] = [".mp3", ".wav", ".flac", ".aac", ".ogg"]
     
@@ -41,6 +65,47 @@ class Settings(BaseSettings):
     # 媒体处理配置
     FFMPEG_PATH: str = "ffmpeg"
     TEMP_DIR: str = "/tmp/annotation"
+    MEDIA_PROBE_URL_EXPIRES: int = 600  # ffprobe 读取用预签名URL有效期（秒）
+    MEDIA_URL_INPUT: bool = True  # 探测和剪切时 ffmpeg 直接读取预签名URL（按需 Range 读取）
+    MEDIA_URL_INPUT_EXCLUDED_EXTENSIONS: List[str] = [".avi", ".wmv"]  # 不便随机访问的容器，回退为下载
+    WAVEFORM_SAMPLE_RATE: int = 16000  # 波形计算时的重采样率
+    WAVEFORM_SAMPLES_PER_PEAK: int = 64  # 最细层级每个峰值覆盖的样本数
+    WAVEFORM_LEVEL_FACTOR: int = 4  # 相邻层级的合并倍数
+    WAVEFORM_MIN_PEAKS: int = 1024  # 最粗层级的峰值数上限
+    SPECTROGRAM_SAMPLE_RATE: int = 16000
+    SPECTROGRAM_N_FFT: int = 512  # 频率方向 256 个频点
+    SPECTROGRAM_HOP: int = 160  # 第 0 层每列 10ms
+    SPECTROGRAM_TILE_WIDTH: int = 256  # 每个瓦片的列数
+    SPECTROGRAM_LEVELS: int = 8  # 缩放层级数，每层时间分辨率减半
+    SPECTROGRAM_DB_FLOOR: float = -100.0
+    FRAME_OUTPUT_FORMAT: str = "pack"  # pack: 帧包 + 索引；files: 每帧一个对象
+    FRAME_PACK_MAX_BYTES: int = 1024 * 1024 * 32  # 单个帧包的字节数上限
+    FRAME_PACK_MAX_PENDING: int = 2  # 等待上传的帧包数上限（限制 worker 内存）
+    SEGMENT_BATCH_WORKERS: int = 4  # 批量剪切时并发的 ffmpeg 进程数
+    SEGMENT_BATCH_GROUP_SIZE: int = 16  # 一次 ffmpeg 调用输出的片段数上限
+    SEGMENT_BATCH_MAX_GAP: float = 10.0  # 同组相邻片段之间的最大间隔（秒），超过时分组
+    SEGMENT_BATCH_MAX_SPAN: float = 120.0  # 一组覆盖的最大时长（秒）
+    SEGMENT_BATCH_MAX_RANGES: int = 1000  # 单个批量请求的片段数上限
+    HLS_ENABLED: bool = True  # 探测完成后生成 HLS 播放档位
+    HLS_LADDER: List[Dict[str, Any]] = [
+        {"name": "360p", "height": 360, "video_bitrate": "800k", "audio_bitrate": "96k"},
+        {"name": "720p", "height": 720, "video_bitrate": "2800k", "audio_bitrate": "128k"},
+    ]
+    HLS_AUDIO_BITRATE: str = "128k"
+    HLS_MAX_ENCODE_HEIGHT: int = 1080  # 原始分辨率档位需要重编码时的高度上限
+    HLS_SEGMENT_SECONDS: int = 6
+    INGEST_DEFAULT_STAGES: List[str] = ["probe", "keyframes", "waveform", "spectrogram", "hls"]  # 帧提取按项目开启
+    INGEST_STAGE_WORKERS: int = 3  # 入库流水线并发执行的阶段数
+    MEDIA_HEAVY_COST_THRESHOLD: float = 600.0  # 估算成本（约单核 CPU 秒）不低于该值的任务进入 heavy 队列
+    MEDIA_ASSUMED_BITRATE: int = 5 * 1000 * 1000  # 尚未探测时长时按该码率（bit/s）由文件大小估算
+    MEDIA_LIGHT_FFMPEG_THREADS: int = 1  # light 任务每个 ffmpeg 进程的线程数
+    MEDIA_HEAVY_FFMPEG_THREADS: int = 4  # heavy 任务每个 ffmpeg 进程的线程数
+    MEDIA_UPLOAD_WORKERS: int = 8  # worker 中并发上传派生对象的线程数
+    ARTIFACT_LOCK_TIMEOUT: int = 3600  # 派生结果计算锁的超时（秒），持锁 worker 异常退出后自动释放
+    ARTIFACT_RETRY_COUNTDOWN: int = 30  # 相同计算正由其他 worker 执行时，任务重试的间隔（秒）
+    ARTIFACT_MAX_RETRIES: int = 120  # 上述重试的最大次数（约为锁超时）
+    MEDIA_CACHE_DIR: str = "/tmp/annotation/cache"  # worker 本地媒体缓存目录
+    MEDIA_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024 * 20  # 缓存容量上限 20GB
     
     class Config:
         env_file = ".env"
@@ -1,9 +1,12 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, JSON, Float
+from sqlalchemy import inspect, create_engine, Column, Integer, BigInteger, String, DateTime, Boolean, Text, ForeignKey, JSON, Float, Numeric, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy.sql import func
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.sql import func, cast, literal_column, text
+from typing import Optional
 from app.core.config import settings
 import enum
+import os
 
 # 创建数据库引擎
 engine = create_engine(settings.DATABASE_URL)
@@ -31,6 +34,15 @@ class MediaType(str, enum.Enum):
     VIDEO = "video"
     AUDIO = "audio"
 
+def resolve_media_type(filename: str) -> Optional[MediaType]:
+    """根据扩展名判断媒体类型，不支持时返回 None"""
+    file_extension = os.path.splitext(filename)[1].lower()
+    if file_extension in settings.ALLOWED_VIDEO_EXTENSIONS:
+        return MediaType.VIDEO
+    if file_extension in settings.ALLOWED_AUDIO_EXTENSIONS:
+        return MediaType.AUDIO
+    return None
+
 # 用户模型
 class User(Base):
     __tablename__ = "users"
@@ -46,7 +58,7 @@ class User(Base):
     
     # 关系
     projects = relationship("Project", back_populates="owner")
-    annotations = relationship("Annotation", back_populates="annotator")
+    annotations = relationship("Annotation", foreign_keys="Annotation.annotator_id", back_populates="annotator")
 
 # 项目模型
 class Project(Base):
@@ -57,6 +69,7 @@ class Project(Base):
     description = Column(Text)
     owner_id = Column(Integer, ForeignKey("users.id"))
     is_active = Column(Boolean, default=True)
+    processing_config = Column(JSON)  # 媒体入库流水线配置（stages / skip_stages / frame_fps）
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -69,6 +82,9 @@ class Project(Base):
 # 项目用户关联模型
 class ProjectUser(Base):
     __tablename__ = "project_users"
+    __table_args__ = (
+        Index("ix_project_users_user_project", "user_id", "project_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
@@ -76,6 +92,8 @@ class ProjectUser(Base):
     role = Column(String(20), default=UserRole.ANNOTATOR)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    project = relationship("Project", back_populates="project_users")
+
 # 标签模型
 class Label(Base):
     __tablename__ = "labels"
@@ -90,32 +108,87 @@ class Label(Base):
     
     # 关系
     project = relationship("Project", back_populates="labels")
-    parent = relationship("Label", remote_side=[id])
-    children = relationship("Label")
+    parent = relationship("Label", remote_side=[id], back_populates="children")
+    children = relationship("Label", back_populates="parent")
 
 # 媒体文件模型
 class MediaFile(Base):
     __tablename__ = "media_files"
+    # 列表按 id 做游标分页，索引覆盖 get_media_files 的过滤组合
+    __table_args__ = (
+        Index("ix_media_files_project_id_id", "project_id", "id"),
+        Index("ix_media_files_project_type_id", "project_id", "media_type", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String(255), nullable=False)
     original_filename = Column(String(255), nullable=False)
     file_path = Column(String(500), nullable=False)
-    file_size = Column(Integer)
+    file_size = Column(BigInteger)
     duration = Column(Float)  # 视频/音频时长（秒）
     media_type = Column(String(10), nullable=False)  # video/audio
     project_id = Column(Integer, ForeignKey("projects.id"))
     uploaded_by = Column(Integer, ForeignKey("users.id"))
-    metadata = Column(JSON)  # 媒体文件元数据
+    media_metadata = Column("metadata", JSON)  # 媒体文件元数据（metadata 为声明式 API 保留属性名，数据库列名不变）
+    keyframes = Column(JSON)  # 视频关键帧时间戳（秒，升序）
+    hls_playlist = Column(String(500))  # HLS 主播放列表对象名
+    processing_status = Column(String(20), default="pending")  # pending, probing, ready, failed
+    processing_stages = Column(JSON)  # 入库流水线各阶段的状态与耗时
+    content_hash = Column(String(64), index=True)  # SHA-256
+    blob_id = Column(Integer, ForeignKey("media_blobs.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # 关系
     project = relationship("Project", back_populates="media_files")
+    blob = relationship("MediaBlob", back_populates="media_files")
     annotations = relationship("Annotation", back_populates="media_file")
 
+# 媒体内容模型（按内容哈希去重，多个 MediaFile 共享同一存储对象）
+class MediaBlob(Base):
+    __tablename__ = "media_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, index=True, nullable=False)  # SHA-256
+    file_path = Column(String(500), nullable=False)
+    file_size = Column(BigInteger)
+    ref_count = Column(Integer, default=1, nullable=False)
+    duration = Column(Float)
+    probe_metadata = Column(JSON)  # 探测得到的媒体元数据，供重复内容复用
+    keyframes = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # 关系
+    media_files = relationship("MediaFile", back_populates="blob")
+
+# 派生结果登记（波形、频谱图、帧、HLS、片段等），按源对象 etag + 操作 + 参数去重
+class DerivedArtifact(Base):
+    __tablename__ = "derived_artifacts"
+    __table_args__ = (
+        UniqueConstraint("source_path", "source_etag", "operation", "params_hash", name="uq_derived_artifact"),
+        Index("ix_derived_artifacts_lookup", "source_etag", "operation", "params_hash"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    source_path = Column(String(500), nullable=False, index=True)  # 源对象名
+    source_etag = Column(String(64), nullable=False)
+    operation = Column(String(50), nullable=False)
+    params_hash = Column(String(64), nullable=False)
+    params = Column(JSON)
+    object_prefix = Column(String(500), nullable=False, index=True)  # 派生对象都位于该前缀下，相同内容的源对象共用
+    result = Column(JSON)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 # 标注模型
 class Annotation(Base):
     __tablename__ = "annotations"
+    # 列表按 id 做游标分页，索引覆盖 get_annotations 的过滤组合
+    __table_args__ = (
+        Index("ix_annotations_media_file_id_id", "media_file_id", "id"),
+        Index("ix_annotations_media_status_id", "media_file_id", "status", "id"),
+        Index("ix_annotations_annotator_id_id", "annotator_id", "id"),
+        Index("ix_annotations_status_id", "status", "id"),
+        Index("ix_annotations_media_area", "media_file_id", "area"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     media_file_id = Column(Integer, ForeignKey("media_files.id"))
@@ -125,6 +198,12 @@ class Annotation(Base):
     data = Column(JSON, nullable=False)  # 标注数据（坐标、时间等）
     start_time = Column(Float)  # 开始时间（秒）
     end_time = Column(Float)  # 结束时间（秒）
+    # 由 data 中的坐标计算的包围盒（写入时维护，非空间类型为空）
+    x_min = Column(Float)
+    y_min = Column(Float)
+    x_max = Column(Float)
+    y_max = Column(Float)
+    area = Column(Float)
     confidence = Column(Float, default=1.0)  # 置信度
     status = Column(String(20), default="pending")  # pending, approved, rejected
     reviewer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -138,17 +217,202 @@ class Annotation(Base):
     label = relationship("Label")
     reviewer = relationship("User", foreign_keys=[reviewer_id])
 
+def annotation_time_range():
+    """标注的时间区间，查询时必须使用与 GiST 索引相同的表达式
+
+    没有时间的标注为无界区间（覆盖整个媒体），只有一端时间的标注为该时间点。
+    用 least/greatest 排列两端（两者都忽略 NULL），历史数据中结束早于开始的标注也不会使 numrange 报错。
+    """
+    start_time = cast(Annotation.start_time, Numeric)
+    end_time = cast(Annotation.end_time, Numeric)
+    return func.numrange(
+        func.least(start_time, end_time),
+        func.greatest(start_time, end_time),
+        literal_column("'[]'")
+    )
+
+def time_window(t0: Optional[float], t1: Optional[float]):
+    """查询窗口 [t0, t1]（缺省的一端无界）"""
+    return func.numrange(cast(t0, Numeric), cast(t1, Numeric), literal_column("'[]'"))
+
+def annotation_box():
+    """标注的包围盒，查询时必须使用与 GiST 索引相同的表达式"""
+    return func.box(func.point(Annotation.x_min, Annotation.y_min), func.point(Annotation.x_max, Annotation.y_max))
+
+def region_box(x0: float, y0: float, x1: float, y1: float):
+    return func.box(func.point(x0, y0), func.point(x1, y1))
+
+# 媒体内时间窗口（&& 重叠）与区域的组合查询，只按时间窗口查询时同样使用该索引；
+# 组合 media_file_id 需要 btree_gist 扩展
+Index(
+    "ix_annotations_media_span_box",
+    Annotation.media_file_id, annotation_time_range(), annotation_box(),
+    postgresql_using="gist"
+)
+
 # 视频片段模型
 class VideoSegment(Base):
     __tablename__ = "video_segments"
     
     id = Column(Integer, primary_key=True, index=True)
     media_file_id = Column(Integer, ForeignKey("media_files.id"))
+    annotation_id = Column(Integer, ForeignKey("annotations.id"), nullable=True)  # 由标注导出时对应的标注
     start_time = Column(Float, nullable=False)
     end_time = Column(Float, nullable=False)
+    file_path = Column(String(500))  # 片段对象名
     created_by = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+# 分片上传会话模型
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"))
+    uploaded_by = Column(Integer, ForeignKey("users.id"))
+    original_filename = Column(String(255), nullable=False)
+    file_path = Column(String(500), nullable=False)  # 目标对象名
+    media_type = Column(String(10), nullable=False)
+    content_type = Column(String(100))
+    total_size = Column(BigInteger)  # 预签名直传在完成前未知
+    chunk_size = Column(Integer)
+    upload_mode = Column(String(20), default="multipart")  # multipart, presigned
+    upload_id = Column(String(255))  # MinIO multipart upload ID
+    status = Column(String(20), default="uploading")  # uploading, completed, aborted
+    media_file_id = Column(Integer, ForeignKey("media_files.id"), nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    # 关系
+    parts = relationship("UploadPart", back_populates="session", cascade="all, delete-orphan")
+
+# 已接收分片模型
+class UploadPart(Base):
+    __tablename__ = "upload_parts"
+    __table_args__ = (UniqueConstraint("session_id", "part_number"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(Integer, ForeignKey("upload_sessions.id"), index=True)
+    part_number = Column(Integer, nullable=False)  # 从1开始，对应分片序号+1
+    etag = Column(String(100), nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # 关系
+    session = relationship("UploadSession", back_populates="parts")
+
+# 模型中已移除的索引，ensure_indexes 时删除
+OBSOLETE_INDEXES = [
+    "ix_annotations_media_time_range",  # 与时间、区域组合索引的前两列重复
+    "ix_annotations_media_time_box",  # 时间区间表达式已改为 least/greatest，由 ix_annotations_media_span_box 取代
+]
+
+# 启动时建表和补建索引使用的 PostgreSQL advisory lock
+SCHEMA_LOCK_KEY = 7_301_001
+INDEX_LOCK_KEY = 7_301_002
+
+def ensure_extensions():
+    """创建索引依赖的扩展（需在 create_all 之前执行）"""
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+
+def ensure_columns():
+    """为已存在的表补加模型中新增的可空列（create_all 不会修改已存在的表，外键约束不补建）"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+
+def ensure_column_types():
+    """将已存在表中的 INTEGER 列放宽为模型中的 BIGINT（如超过 2GB 的 file_size），create_all 不会修改列类型"""
+    if engine.dialect.name != "postgresql":
+        return
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing or not isinstance(column.type, BigInteger):
+                    continue
+                if isinstance(existing[column.name], BigInteger) or not isinstance(existing[column.name], Integer):
+                    continue
+                connection.execute(text(f'ALTER TABLE "{table.name}" ALTER COLUMN "{column.name}" TYPE BIGINT'))
+
+def ensure_indexes():
+    """为已存在的表补建模型中新增的索引（create_all 不会修改已存在的表），并删除已移除的索引
+
+    PostgreSQL 上以 CREATE/DROP INDEX CONCURRENTLY 执行，不阻塞表的写入；
+    上次中断留下的无效索引先删除重建。多个进程同时调用时由 advisory lock 保证只有一个进程执行，
+    其余进程直接返回。
+    """
+    if engine.dialect.name != "postgresql":
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        return
+
+    # CONCURRENTLY 不能在事务中执行
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if not connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": INDEX_LOCK_KEY}).scalar():
+            return
+        try:
+            invalid = set(connection.execute(text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+            )).scalars())
+            for name in OBSOLETE_INDEXES:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+            inspector = inspect(connection)
+            for table in Base.metadata.sorted_tables:
+                existing = {index["name"] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in invalid:
+                        connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                    elif index.name in existing:
+                        continue
+                    connection.execute(text(_create_index_concurrently(index)))
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INDEX_LOCK_KEY})
+
+def _create_index_concurrently(index: Index) -> str:
+    """生成 CREATE INDEX CONCURRENTLY IF NOT EXISTS 语句（临时打开索引的 concurrently 选项，不影响 create_all）"""
+    options = index.dialect_options["postgresql"]
+    concurrently = options["concurrently"]
+    options["concurrently"] = True
+    try:
+        return str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+    finally:
+        options["concurrently"] = concurrently
+
+def init_schema():
+    """启动时建表并补加列（多个 API 进程同时启动时以 advisory lock 串行执行）
+
+    索引由 ensure_indexes 在后台补建，不阻塞启动。
+    """
+    if engine.dialect.name != "postgresql":
+        Base.metadata.create_all(bind=engine)
+        ensure_columns()
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        try:
+            ensure_extensions()
+            Base.metadata.create_all(bind=engine)
+            ensure_columns()
+            ensure_column_types()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+
 # 数据库依赖
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,35 @@
+import base64
+import json
+from typing import Optional
+from fastapi import HTTPException, status
+
+# 列表接口使用基于 id 的游标分页：按 id 升序，游标记录上一页最后一条的 id，
+# 下一页从该 id 之后开始读取，任意深度的分页都只走一次索引范围扫描
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """解析游标，返回上一页最后一条的 id（未提供游标时返回 None）"""
+    if not cursor:
+        return None
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(data["id"])
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="分页游标无效"
+        )
+
+def paginate(query, id_column, cursor: Optional[str], limit: int, response) -> list:
+    """按 id 游标读取一页，还有下一页时在响应头中返回下一页游标"""
+    last_id = decode_cursor(cursor)
+    if last_id is not None:
+        query = query.filter(id_column > last_id)
+    items = query.order_by(id_column).limit(limit + 1).all()
+    if len(items) > limit:
+        items = items[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].id)
+    return items
@@ -0,0 +1,126 @@
+import json
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from fastapi import Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import get_db, User, UserRole, Project, ProjectUser
+from app.core.redis_client import get_redis
+from app.core.security import get_current_user
+
+MEMBERSHIP_KEY = "project_access:{user_id}:{generation}"
+# 每个用户的缓存代数，失效时递增；缓存键包含代数，失效前开始加载的结果写入旧键后不会再被读取
+GENERATION_KEY = "project_access_gen:{user_id}"
+GENERATION_TTL = 24 * 3600  # 代数键的过期时间（秒），需远大于 PROJECT_ACCESS_TTL
+
+class ProjectAccess:
+    """当前用户的项目访问权限
+
+    用户拥有和参与的全部项目及角色只加载一次：同一请求内复用（FastAPI 依赖缓存），
+    并在 Redis 中缓存 PROJECT_ACCESS_TTL 秒，项目成员变化或项目删除时失效。
+    """
+
+    def __init__(self, user: User, db: Session):
+        self.user = user
+        self.db = db
+        self._memberships: Optional[Dict[int, Tuple[bool, Optional[str]]]] = None
+
+    @property
+    def is_admin(self) -> bool:
+        return self.user.role == UserRole.ADMIN
+
+    def memberships(self) -> Dict[int, Tuple[bool, Optional[str]]]:
+        """项目 ID -> (是否所有者, 项目内角色)"""
+        if self._memberships is None:
+            self._memberships = self._load_cached()
+        return self._memberships
+
+    def _load_cached(self) -> Dict[int, Tuple[bool, Optional[str]]]:
+        # 先读代数再查询数据库：加载期间发生的失效会递增代数，本次结果只写入不再使用的旧键
+        key = None
+        try:
+            redis = get_redis()
+            generation = redis.get(GENERATION_KEY.format(user_id=self.user.id))
+            key = MEMBERSHIP_KEY.format(user_id=self.user.id, generation=int(generation or 0))
+            cached = redis.get(key)
+            if cached is not None:
+                return {int(project_id): (owner, role) for project_id, (owner, role) in json.loads(cached).items()}
+        except Exception as e:
+            print(f"读取项目权限缓存失败: {e}")
+
+        memberships = self._load()
+        if key is None:
+            return memberships
+        try:
+            get_redis().set(key, json.dumps(memberships), ex=settings.PROJECT_ACCESS_TTL, nx=True)
+        except Exception as e:
+            print(f"写入项目权限缓存失败: {e}")
+        return memberships
+
+    def _load(self) -> Dict[int, Tuple[bool, Optional[str]]]:
+        memberships = {
+            project_id: (False, role)
+            for project_id, role in self.db.query(ProjectUser.project_id, ProjectUser.role).filter(
+                ProjectUser.user_id == self.user.id
+            ).all()
+        }
+        for (project_id,) in self.db.query(Project.id).filter(Project.owner_id == self.user.id).all():
+            memberships[project_id] = (True, memberships.get(project_id, (False, None))[1])
+        return memberships
+
+    def project_ids(self) -> List[int]:
+        """用户拥有或参与的项目"""
+        return list(self.memberships())
+
+    def can_access(self, project_id: int) -> bool:
+        return self.is_admin or project_id in self.memberships()
+
+    def is_owner(self, project: Project) -> bool:
+        return self.is_admin or project.owner_id == self.user.id
+
+    def has_role(self, project_id: int, roles: Sequence[str]) -> bool:
+        """管理员或在项目内担任指定角色之一"""
+        if self.is_admin:
+            return True
+        membership = self.memberships().get(project_id)
+        return membership is not None and membership[1] in roles
+
+    def require(self, project_id: int, detail: str = "无权访问该项目"):
+        """要求用户可以访问项目：项目不存在时 404，无权访问时 403"""
+        if not self.is_admin and project_id in self.memberships():
+            return
+        # 只有拒绝（或管理员）时才需要确认项目是否存在
+        if not self.db.query(Project.id).filter(Project.id == project_id).first():
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="项目不存在"
+            )
+        if not self.is_admin:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail
+            )
+
+    def require_upload(self, project_id: int):
+        """要求用户可以上传文件到项目"""
+        self.require(project_id, "无权上传文件到该项目")
+
+def get_project_access(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> ProjectAccess:
+    return ProjectAccess(current_user, db)
+
+def invalidate_project_access(user_ids: Iterable[int]):
+    """项目成员或所有权变化（已提交）后递增相关用户的缓存代数，使已缓存和正在加载的权限失效"""
+    user_ids = [user_id for user_id in set(user_ids) if user_id is not None]
+    if not user_ids:
+        return
+    try:
+        pipeline = get_redis().pipeline()
+        for user_id in user_ids:
+            generation_key = GENERATION_KEY.format(user_id=user_id)
+            pipeline.incr(generation_key)
+            pipeline.expire(generation_key, GENERATION_TTL)
+        pipeline.execute()
+    except Exception as e:
+        print(f"清除项目权限缓存失败: {e}")
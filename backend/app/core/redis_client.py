@@ -0,0 +1,15 @@
+import os
+import redis
+from typing import Optional
+from app.core.config import settings
+
+_client: Optional[redis.Redis] = None
+_client_pid: Optional[int] = None
+
+def get_redis() -> redis.Redis:
+    """获取当前进程共享的 Redis 客户端（fork 后的子进程重新创建）"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = redis.Redis.from_url(settings.REDIS_URL)
+        _client_pid = os.getpid()
+    return _client
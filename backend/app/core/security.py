@@ -1,14 +1,19 @@
 from datetime import datetime, timedelta
 from typing import Optional, Union
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
-from app.core.database import User, UserRole
+from app.core.database import get_db, User, UserRole
 from sqlalchemy.orm import Session
 
 # 密码加密上下文
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Bearer 令牌认证
+bearer_scheme = HTTPBearer()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -71,6 +76,21 @@ def create_user(db: Session, username: str, email: str, password: str, role: Use
     db.refresh(db_user)
     return db_user
 
+def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
+    db: Session = Depends(get_db)
+) -> User:
+    """根据 Bearer 令牌获取当前用户"""
+    payload = verify_token(credentials.credentials)
+    user = get_user_by_username(db, payload["sub"]) if payload else None
+    if not user or not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
 def check_user_permission(user: User, required_role: UserRole) -> bool:
     """检查用户权限"""
     role_hierarchy = {
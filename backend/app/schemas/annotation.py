@@ -1,9 +1,23 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, model_validator
+from typing import Optional, Dict, Any, List, Literal
 from datetime import datetime
 from app.core.database import AnnotationType
 
-class AnnotationBase(BaseModel):
+def check_time_range(start_time: Optional[float], end_time: Optional[float]):
+    """结束时间不能早于开始时间（时间区间索引要求 start_time <= end_time）"""
+    if start_time is not None and end_time is not None and end_time < start_time:
+        raise ValueError("结束时间不能早于开始时间")
+
+class TimeRangeModel(BaseModel):
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+
+    @model_validator(mode="after")
+    def validate_time_range(self):
+        check_time_range(self.start_time, self.end_time)
+        return self
+
+class AnnotationBase(TimeRangeModel):
     media_file_id: int
     label_id: Optional[int] = None
     annotation_type: AnnotationType
@@ -15,7 +29,7 @@ class AnnotationBase(BaseModel):
 class AnnotationCreate(AnnotationBase):
     pass
 
-class AnnotationUpdate(BaseModel):
+class AnnotationUpdate(TimeRangeModel):
     label_id: Optional[int] = None
     annotation_type: Optional[AnnotationType] = None
     data: Optional[Dict[str, Any]] = None
@@ -44,6 +58,33 @@ class AnnotationResponse(AnnotationList):
     review_comment: Optional[str] = None
     updated_at: Optional[datetime] = None
 
+class AnnotationBulkOperation(BaseModel):
+    """批量操作中的单条操作（时间范围在 _apply_bulk 中逐条校验，错误只影响该条）"""
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None  # update/delete 的标注 ID
+    media_file_id: Optional[int] = None  # create 必填
+    label_id: Optional[int] = None
+    annotation_type: Optional[AnnotationType] = None  # create 必填
+    data: Optional[Dict[str, Any]] = None  # create 必填
+    start_time: Optional[float] = None
+    end_time: Optional[float] = None
+    confidence: Optional[float] = None
+
+class AnnotationBulkRequest(BaseModel):
+    operations: List[AnnotationBulkOperation]
+
+class AnnotationBulkItemResult(BaseModel):
+    index: int
+    op: str
+    success: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class AnnotationBulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[AnnotationBulkItemResult]
+
 class VideoSegmentBase(BaseModel):
     media_file_id: int
     start_time: float
@@ -53,7 +94,7 @@ class VideoSegmentBase(BaseModel):
 class VideoSegmentCreate(VideoSegmentBase):
     pass
 
-class VideoSegmentResponse(VideoSegmentResponse):
+class VideoSegmentResponse(VideoSegmentBase):
     id: int
     created_at: datetime
     
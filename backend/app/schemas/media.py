@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class MediaFileBase(BaseModel):
@@ -11,7 +11,7 @@ class MediaFileBase(BaseModel):
     media_type: str
     project_id: int
     uploaded_by: int
-    metadata: Optional[Dict[str, Any]] = None
+    media_metadata: Optional[Dict[str, Any]] = Field(None, alias="metadata")
 
 class MediaFileCreate(MediaFileBase):
     pass
@@ -20,7 +20,7 @@ class MediaFileUpdate(BaseModel):
     filename: Optional[str] = None
     original_filename: Optional[str] = None
     duration: Optional[float] = None
-    metadata: Optional[Dict[str, Any]] = None
+    media_metadata: Optional[Dict[str, Any]] = Field(None, alias="metadata")
 
 class MediaFileList(BaseModel):
     id: int
@@ -31,6 +31,7 @@ class MediaFileList(BaseModel):
     media_type: str
     project_id: int
     uploaded_by: int
+    processing_status: Optional[str] = None
     created_at: datetime
     
     class Config:
@@ -38,15 +39,61 @@ class MediaFileList(BaseModel):
 
 class MediaFileResponse(MediaFileList):
     file_path: str
-    metadata: Optional[Dict[str, Any]] = None
+    content_hash: Optional[str] = None
+    hls_playlist: Optional[str] = None
+    processing_stages: Optional[Dict[str, Any]] = None
+    # 从模型的 media_metadata 属性读取，响应中仍为 metadata
+    media_metadata: Optional[Dict[str, Any]] = Field(None, serialization_alias="metadata")
     updated_at: Optional[datetime] = None
 
+class StagedMediaItem(BaseModel):
+    file_path: str
+    original_filename: str
+
+class MediaBatchRegister(BaseModel):
+    project_id: int
+    items: List[StagedMediaItem]
+
+class MediaBatchItemResult(BaseModel):
+    index: int
+    filename: str
+    success: bool
+    media_file: Optional[MediaFileList] = None
+    error: Optional[str] = None
+
+class MediaBatchResponse(BaseModel):
+    project_id: int
+    succeeded: int
+    failed: int
+    results: List[MediaBatchItemResult]
+
+class WaveformPeaksResponse(BaseModel):
+    media_file_id: int
+    level: int
+    sample_rate: int
+    samples_per_peak: int
+    start_index: int
+    start_time: float
+    peak_duration: float
+    peaks: List[int]  # min/max 交替，取值范围 -128~127
+
 class VideoSegmentBase(BaseModel):
     media_file_id: int
     start_time: float
     end_time: float
     created_by: int
 
+class SegmentRange(BaseModel):
+    start_time: float
+    end_time: float
+
+class VideoSegmentBatchCreate(BaseModel):
+    ranges: List[SegmentRange]
+
+class SegmentTaskResponse(BaseModel):
+    task_id: str
+    range_count: Optional[int] = None
+
 class VideoSegmentCreate(VideoSegmentBase):
     pass
 
@@ -1,10 +1,11 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 
 class ProjectBase(BaseModel):
     name: str
     description: Optional[str] = None
+    processing_config: Optional[Dict[str, Any]] = None
 
 class ProjectCreate(ProjectBase):
     pass
@@ -13,6 +14,7 @@ class ProjectUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
     is_active: Optional[bool] = None
+    processing_config: Optional[Dict[str, Any]] = None
 
 class ProjectList(BaseModel):
     id: int
@@ -26,6 +28,7 @@ class ProjectList(BaseModel):
 
 class ProjectResponse(ProjectList):
     owner_id: int
+    processing_config: Optional[Dict[str, Any]] = None
     updated_at: Optional[datetime] = None
 
 class ProjectUserBase(BaseModel):
@@ -0,0 +1,45 @@
+from pydantic import BaseModel
+from typing import Optional, List
+from datetime import datetime
+
+class UploadSessionCreate(BaseModel):
+    project_id: int
+    filename: str
+    total_size: int
+    content_type: Optional[str] = None
+    chunk_size: Optional[int] = None
+
+class PresignedUploadCreate(BaseModel):
+    project_id: int
+    filename: str
+    content_type: Optional[str] = None
+
+class PresignedUploadResponse(BaseModel):
+    session_id: int
+    url: str
+    method: str = "PUT"
+    file_path: str
+    expires_in: int
+
+class UploadSessionResponse(BaseModel):
+    id: int
+    project_id: int
+    original_filename: str
+    upload_mode: str
+    media_type: str
+    total_size: Optional[int] = None
+    chunk_size: Optional[int] = None
+    total_chunks: int
+    status: str
+    received_chunks: List[int]
+    received_bytes: int
+    missing_chunks: List[int]
+    media_file_id: Optional[int] = None
+    created_at: datetime
+
+class UploadChunkResponse(BaseModel):
+    session_id: int
+    index: int
+    offset: int
+    size: int
+    etag: str
@@ -0,0 +1,231 @@
+import hashlib
+import json
+from typing import Any, Callable, Dict, List, Optional, Set
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import DerivedArtifact, MediaFile
+from app.core.redis_client import get_redis
+from app.services.minio_service import MinioService
+
+LOCK_KEY = "artifact_lock:{etag}:{operation}:{params_hash}"
+
+def params_hash(params: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+# 各操作的参数：除调用方指定的参数外，还包含影响输出的配置，配置变化后自然生成新的派生结果
+def waveform_params() -> Dict[str, Any]:
+    return {
+        "sample_rate": settings.WAVEFORM_SAMPLE_RATE,
+        "samples_per_peak": settings.WAVEFORM_SAMPLES_PER_PEAK,
+        "level_factor": settings.WAVEFORM_LEVEL_FACTOR,
+        "min_peaks": settings.WAVEFORM_MIN_PEAKS,
+    }
+
+def spectrogram_params() -> Dict[str, Any]:
+    return {
+        "sample_rate": settings.SPECTROGRAM_SAMPLE_RATE,
+        "n_fft": settings.SPECTROGRAM_N_FFT,
+        "hop": settings.SPECTROGRAM_HOP,
+        "tile_width": settings.SPECTROGRAM_TILE_WIDTH,
+        "levels": settings.SPECTROGRAM_LEVELS,
+        "db_floor": settings.SPECTROGRAM_DB_FLOOR,
+    }
+
+def frames_params(fps: int, output_format: str) -> Dict[str, Any]:
+    params = {"fps": fps, "format": output_format}
+    if output_format == "pack":
+        params["pack_max_bytes"] = settings.FRAME_PACK_MAX_BYTES
+    return params
+
+def hls_params() -> Dict[str, Any]:
+    return {
+        "ladder": settings.HLS_LADDER,
+        "audio_bitrate": settings.HLS_AUDIO_BITRATE,
+        "max_encode_height": settings.HLS_MAX_ENCODE_HEIGHT,
+        "segment_seconds": settings.HLS_SEGMENT_SECONDS,
+        # 原始分辨率档位只在关键帧对齐分片网格时流复制（此前生成的结果分片可能不对齐）
+        "aligned_copy": True,
+    }
+
+def segment_params(start_time: float, end_time: float) -> Dict[str, Any]:
+    return {"start_time": float(start_time), "end_time": float(end_time)}
+
+class ArtifactBusy(Exception):
+    """相同的派生结果正由其他 worker 计算，调用方稍后重试（不在 worker 中阻塞等待）"""
+
+class ArtifactStore:
+    """派生结果登记表
+
+    派生结果按 (源对象 etag, 操作, 参数哈希) 唯一登记，对象都写在 derived/{etag}/{操作}/{参数哈希} 前缀下。
+    相同请求直接返回已登记的结果；并发的相同请求通过 Redis 锁合并，只有一个 worker 实际计算，
+    其余 worker 得到 ArtifactBusy 后稍后重试。
+    """
+
+    def __init__(self, db: Session, minio_service: Optional[MinioService] = None):
+        self.db = db
+        self.minio_service = minio_service or MinioService()
+        self._etags: Dict[str, str] = {}
+        # 作废记录引用的对象前缀，事务提交成功后才回收
+        self._pending_collect: List[str] = []
+
+    def source_etag(self, file_path: str) -> Optional[str]:
+        if file_path not in self._etags:
+            stat = self.minio_service.stat_file(file_path)
+            if stat is None:
+                return None
+            self._etags[file_path] = stat.etag
+        return self._etags[file_path]
+
+    def prefix(self, etag: str, operation: str, params: Dict[str, Any]) -> str:
+        return f"derived/{etag}/{operation}/{params_hash(params)}"
+
+    def lookup(self, media_file: MediaFile, operation: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按源对象名查找已登记的结果（不访问存储，供 API 使用）"""
+        artifact = self.db.query(DerivedArtifact).filter(
+            DerivedArtifact.source_path == media_file.file_path,
+            DerivedArtifact.operation == operation,
+            DerivedArtifact.params_hash == params_hash(params)
+        ).order_by(DerivedArtifact.id.desc()).first()
+        return artifact.result if artifact else None
+
+    def find(self, media_file: MediaFile, operation: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按源对象当前的 etag 查找已登记的结果（不提交）
+
+        相同内容的其他源对象已生成时，为当前源对象登记一条引用同一对象前缀的记录。
+        """
+        etag = self.source_etag(media_file.file_path)
+        if etag is None:
+            return None
+        artifacts = self.db.query(DerivedArtifact).filter(
+            DerivedArtifact.source_etag == etag,
+            DerivedArtifact.operation == operation,
+            DerivedArtifact.params_hash == params_hash(params)
+        ).all()
+        if not artifacts:
+            return None
+        if all(artifact.source_path != media_file.file_path for artifact in artifacts):
+            self._add(media_file, etag, operation, params, artifacts[0].object_prefix, artifacts[0].result)
+        return artifacts[0].result
+
+    def _add(self, media_file: MediaFile, etag: str, operation: str, params: Dict[str, Any],
+             object_prefix: str, result: Dict[str, Any]) -> bool:
+        try:
+            with self.db.begin_nested():
+                self.db.add(DerivedArtifact(
+                    source_path=media_file.file_path,
+                    source_etag=etag,
+                    operation=operation,
+                    params_hash=params_hash(params),
+                    params=params,
+                    object_prefix=object_prefix,
+                    result=result
+                ))
+            return True
+        except IntegrityError:
+            return False
+
+    def lock(self, media_file: MediaFile, operation: str, params: Dict[str, Any]):
+        """相同派生结果的分布式锁（计算时间可能很长，锁超时取配置；调用方以非阻塞方式获取）"""
+        etag = self.source_etag(media_file.file_path)
+        return get_redis().lock(
+            LOCK_KEY.format(etag=etag, operation=operation, params_hash=params_hash(params)),
+            timeout=settings.ARTIFACT_LOCK_TIMEOUT
+        )
+
+    def register(self, media_file: MediaFile, operation: str, params: Dict[str, Any],
+                 result: Dict[str, Any]) -> Dict[str, Any]:
+        """登记派生结果（不提交），同一源对象旧 etag 下的结果一并作废
+
+        作废结果的存储对象在 commit() 成功后才回收。
+        """
+        etag = self.source_etag(media_file.file_path)
+        digest = params_hash(params)
+        stale = self.db.query(DerivedArtifact).filter(
+            DerivedArtifact.source_path == media_file.file_path,
+            DerivedArtifact.operation == operation,
+            DerivedArtifact.params_hash == digest,
+            DerivedArtifact.source_etag != etag
+        ).all()
+        for artifact in stale:
+            self.db.delete(artifact)
+        stale_prefixes = self._unreferenced({artifact.object_prefix for artifact in stale})
+
+        if not self._add(media_file, etag, operation, params, self.prefix(etag, operation, params), result):
+            # 锁超时后其他 worker 已登记相同结果
+            existing = self.find(media_file, operation, params)
+            result = existing if existing is not None else result
+
+        self._pending_collect.extend(stale_prefixes)
+        return result
+
+    def commit(self):
+        """提交事务，成功后回收 register 作废的存储对象（提交失败时不回收，记录仍指向这些对象）"""
+        prefixes, self._pending_collect = self._pending_collect, []
+        self.db.commit()
+        if prefixes:
+            self.collect(prefixes)
+
+    def get_or_compute(self, media_file: MediaFile, operation: str, params: Dict[str, Any],
+                       compute: Callable[[str], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """返回已登记的结果，否则在锁内计算并登记；compute 接收输出前缀，失败时返回 None
+
+        其他 worker 正在计算相同结果时抛出 ArtifactBusy。
+        """
+        result = self.find(media_file, operation, params)
+        if result is not None:
+            self.commit()
+            return result
+        etag = self.source_etag(media_file.file_path)
+        if etag is None:
+            return None
+
+        lock = self.lock(media_file, operation, params)
+        if not lock.acquire(blocking=False):
+            raise ArtifactBusy(f"{operation} 正由其他 worker 计算")
+        try:
+            # 拿到锁之前其他 worker 可能刚完成计算
+            result = self.find(media_file, operation, params)
+            if result is not None:
+                self.commit()
+                return result
+            result = compute(self.prefix(etag, operation, params))
+            if result is None:
+                return None
+            result = self.register(media_file, operation, params, result)
+            self.commit()
+            return result
+        finally:
+            try:
+                lock.release()
+            except Exception as e:
+                print(f"释放派生结果锁失败: {e}")
+
+    def _unreferenced(self, prefixes: Set[str]) -> List[str]:
+        """已删除的记录中不再被其他记录引用的对象前缀"""
+        if not prefixes:
+            return []
+        self.db.flush()
+        referenced = {
+            prefix for (prefix,) in self.db.query(DerivedArtifact.object_prefix).filter(
+                DerivedArtifact.object_prefix.in_(list(prefixes))
+            ).distinct()
+        }
+        return sorted(prefixes - referenced)
+
+    def invalidate(self, source_path: str) -> List[str]:
+        """删除源对象的所有登记记录（不提交），返回可以回收的对象前缀（相同内容的其他源对象仍引用的除外）"""
+        artifacts = self.db.query(DerivedArtifact).filter(DerivedArtifact.source_path == source_path).all()
+        for artifact in artifacts:
+            self.db.delete(artifact)
+        return self._unreferenced({artifact.object_prefix for artifact in artifacts})
+
+    def collect(self, prefixes: List[str]) -> int:
+        """删除派生对象，返回删除的对象数"""
+        deleted = 0
+        for prefix in prefixes:
+            try:
+                deleted += self.minio_service.delete_prefix(prefix + "/")
+            except Exception as e:
+                print(f"回收派生对象失败: {e}")
+        return deleted
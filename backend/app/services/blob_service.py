@@ -0,0 +1,147 @@
+import hashlib
+from typing import Iterable, Optional, Set
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from app.core.database import MediaBlob, MediaFile, UploadSession
+from app.services.minio_service import MinioService
+
+class HashingReader:
+    """包装文件对象，在读取（上传）的同时计算 SHA-256"""
+
+    def __init__(self, file_obj):
+        self.file_obj = file_obj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file_obj.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
+class BlobService:
+    """内容寻址存储：相同内容只保留一个对象，按引用计数回收"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def compute_hash(self, file_path: str, minio_service: Optional[MinioService] = None,
+                     local_path: Optional[str] = None) -> str:
+        """流式读取对象计算 SHA-256（用于未经过 API 进程的分片/直传上传）
+
+        对象已有本地副本时传入 local_path，直接读取本地文件。
+        """
+        sha256 = hashlib.sha256()
+        if local_path:
+            with open(local_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            return sha256.hexdigest()
+
+        minio_service = minio_service or MinioService()
+        for chunk in minio_service.iter_file(file_path):
+            sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def attach(self, media_file: MediaFile, content_hash: str) -> Optional[str]:
+        """把媒体文件关联到内容对象
+
+        已存在相同内容时引用计数加一、复用已有对象和探测结果，并返回需要删除的重复对象名；
+        否则以当前对象创建新的内容记录，返回 None。调用方在提交事务后删除重复对象。
+        """
+        media_file.content_hash = content_hash
+        blob = self.db.query(MediaBlob).filter(
+            MediaBlob.content_hash == content_hash
+        ).with_for_update().first()
+
+        if blob is None:
+            # 先写入媒体文件本身，保存点回滚时只撤销内容记录
+            self.db.flush()
+            try:
+                with self.db.begin_nested():
+                    blob = MediaBlob(
+                        content_hash=content_hash,
+                        file_path=media_file.file_path,
+                        file_size=media_file.file_size,
+                        ref_count=1
+                    )
+                    self.db.add(blob)
+                media_file.blob = blob
+                return None
+            except IntegrityError:
+                # 并发上传了相同内容，改为引用对方创建的记录
+                blob = self.db.query(MediaBlob).filter(
+                    MediaBlob.content_hash == content_hash
+                ).with_for_update().first()
+
+        duplicate_path = None
+        if blob.file_path != media_file.file_path:
+            duplicate_path = media_file.file_path
+            media_file.file_path = blob.file_path
+        if media_file.blob_id != blob.id:
+            blob.ref_count += 1
+            media_file.blob = blob
+
+        if blob.probe_metadata is not None:
+            media_file.duration = blob.duration
+            media_file.media_metadata = blob.probe_metadata
+            media_file.keyframes = blob.keyframes
+            media_file.processing_status = "ready"
+
+        return duplicate_path
+
+    def referenced_paths(self, file_paths: Iterable[str], exclude_media_file_id: Optional[int] = None,
+                         exclude_blob_id: Optional[int] = None) -> Set[str]:
+        """返回其中已被媒体文件、内容对象或进行中的上传会话引用的对象名"""
+        file_paths = set(file_paths)
+        if not file_paths:
+            return set()
+        media_files = self.db.query(MediaFile.file_path).filter(MediaFile.file_path.in_(file_paths))
+        if exclude_media_file_id is not None:
+            media_files = media_files.filter(MediaFile.id != exclude_media_file_id)
+        blobs = self.db.query(MediaBlob.file_path).filter(MediaBlob.file_path.in_(file_paths))
+        if exclude_blob_id is not None:
+            blobs = blobs.filter(MediaBlob.id != exclude_blob_id)
+        sessions = self.db.query(UploadSession.file_path).filter(
+            UploadSession.file_path.in_(file_paths),
+            UploadSession.status == "uploading"
+        )
+        return {file_path for (file_path,) in media_files.union(blobs, sessions).all()}
+
+    def release(self, media_file: MediaFile) -> Optional[str]:
+        """释放媒体文件对内容对象的引用，返回需要从存储中删除的对象名（仍被引用时返回 None）
+
+        没有关联内容记录的媒体文件（如批量登记的对象）也要确认对象没有被其他记录引用。
+        """
+        if media_file.blob_id is None:
+            return self._unreferenced(media_file.file_path, media_file)
+
+        blob = self.db.query(MediaBlob).filter(
+            MediaBlob.id == media_file.blob_id
+        ).with_for_update().first()
+        if blob is None:
+            return self._unreferenced(media_file.file_path, media_file)
+
+        media_file.blob = None
+        blob.ref_count -= 1
+        if blob.ref_count > 0:
+            return None
+
+        self.db.delete(blob)
+        return self._unreferenced(blob.file_path, media_file, blob)
+
+    def _unreferenced(self, file_path: str, media_file: MediaFile,
+                      blob: Optional[MediaBlob] = None) -> Optional[str]:
+        if self.referenced_paths([file_path], media_file.id, blob.id if blob is not None else None):
+            return None
+        return file_path
+
+    def record_probe(self, media_file: MediaFile):
+        """把探测结果记录到内容对象上，供相同内容复用"""
+        if media_file.blob is not None:
+            media_file.blob.duration = media_file.duration
+            media_file.blob.probe_metadata = media_file.media_metadata
+            media_file.blob.keyframes = media_file.keyframes
@@ -0,0 +1,100 @@
+import struct
+from typing import BinaryIO, Callable, Dict, Any, Iterator, List, Tuple
+
+# ffmpeg image2pipe 输出的 JPEG 首尾相接，以 EOI(FFD9) 紧跟下一帧 SOI(FFD8) 作为分界。
+# 熵编码数据中的 0xFF 都经过字节填充，不会出现该序列
+JPEG_BOUNDARY = b"\xff\xd9\xff\xd8"
+
+# 帧包索引二进制格式（小端）：
+#   头部: magic(4s) version(H) reserved(H) frame_count(I) fps(d)
+#   记录: 每帧 pack(I) offset(Q) length(I) timestamp(d)，定长，第 i 帧位于 HEADER_SIZE + i * RECORD_SIZE
+INDEX_MAGIC = b"FIDX"
+INDEX_VERSION = 1
+INDEX_HEADER_FORMAT = "<4sHHId"
+INDEX_HEADER_SIZE = struct.calcsize(INDEX_HEADER_FORMAT)
+INDEX_RECORD_FORMAT = "<IQId"
+INDEX_RECORD_SIZE = struct.calcsize(INDEX_RECORD_FORMAT)
+
+def split_jpeg_stream(stream: BinaryIO, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """从 mjpeg 字节流中逐帧切出完整的 JPEG 数据"""
+    buffer = bytearray()
+    search_from = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        while True:
+            boundary = buffer.find(JPEG_BOUNDARY, search_from)
+            if boundary < 0:
+                # 分界序列可能跨越两次读取
+                search_from = max(len(buffer) - len(JPEG_BOUNDARY) + 1, 0)
+                break
+            yield bytes(buffer[:boundary + 2])
+            del buffer[:boundary + 2]
+            search_from = 0
+    if buffer:
+        yield bytes(buffer)
+
+def pack_key(prefix: str, pack: int) -> str:
+    return f"{prefix}/pack_{pack:05d}.bin"
+
+def index_key(prefix: str) -> str:
+    return f"{prefix}/index.bin"
+
+class FramePackWriter:
+    """把连续的 JPEG 帧拼接成帧包对象，单个帧包不超过 max_pack_bytes（单帧超过上限时独占一个帧包）
+
+    每个帧包凑满后把缓冲区本身交给 on_pack(对象名, 数据) 上传（不复制），只在内存中保留当前帧包。
+    """
+
+    def __init__(self, prefix: str, max_pack_bytes: int, fps: float,
+                 on_pack: Callable[[str, bytearray], None]):
+        self.prefix = prefix
+        self.max_pack_bytes = max_pack_bytes
+        self.fps = fps
+        self.on_pack = on_pack
+        self.records: List[Tuple[int, int, int, float]] = []
+        self._buffer = bytearray()
+        self._pack = 0
+
+    def add(self, data: bytes, timestamp: float):
+        if self._buffer and len(self._buffer) + len(data) > self.max_pack_bytes:
+            self._flush()
+        self.records.append((self._pack, len(self._buffer), len(data), timestamp))
+        self._buffer += data
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        # 交出缓冲区后换新的，上传线程持有的数据不会再被修改
+        buffer, self._buffer = self._buffer, bytearray()
+        self.on_pack(pack_key(self.prefix, self._pack), buffer)
+        self._pack += 1
+
+    def finish(self) -> bytes:
+        """写出最后一个帧包，返回编码后的索引"""
+        self._flush()
+        return encode_index(self.records, self.fps)
+
+    @property
+    def pack_count(self) -> int:
+        return self._pack
+
+def encode_index(records: List[Tuple[int, int, int, float]], fps: float) -> bytes:
+    header = struct.pack(INDEX_HEADER_FORMAT, INDEX_MAGIC, INDEX_VERSION, 0, len(records), fps)
+    return header + b"".join(struct.pack(INDEX_RECORD_FORMAT, *record) for record in records)
+
+def parse_index_header(data: bytes) -> Dict[str, Any]:
+    magic, version, _, frame_count, fps = struct.unpack_from(INDEX_HEADER_FORMAT, data, 0)
+    if magic != INDEX_MAGIC or version != INDEX_VERSION:
+        raise ValueError("无效的帧索引文件")
+    return {"frame_count": frame_count, "fps": fps}
+
+def parse_index_record(data: bytes) -> Dict[str, Any]:
+    pack, offset, length, timestamp = struct.unpack_from(INDEX_RECORD_FORMAT, data, 0)
+    return {"pack": pack, "offset": offset, "length": length, "timestamp": timestamp}
+
+def record_offset(index: int) -> int:
+    """第 index 帧的索引记录在索引对象中的字节偏移"""
+    return INDEX_HEADER_SIZE + index * INDEX_RECORD_SIZE
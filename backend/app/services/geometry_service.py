@@ -0,0 +1,65 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+from app.core.database import AnnotationType
+
+# 带空间坐标的标注类型，其余类型（文本、音频片段）没有包围盒
+SPATIAL_TYPES = {
+    AnnotationType.RECTANGLE.value,
+    AnnotationType.POLYGON.value,
+    AnnotationType.POINT.value,
+    AnnotationType.LINE.value,
+}
+
+BBOX_FIELDS = ("x_min", "y_min", "x_max", "y_max", "area")
+
+def _points(data: Dict[str, Any]) -> Iterable[Tuple[float, float]]:
+    """从标注数据中取出所有坐标点
+
+    支持 {x, y, width, height}、{x1, y1, x2, y2}、{x, y} 以及
+    {points: [[x, y], ...]} / {points: [{x, y}, ...]} 几种形式。
+    """
+    points = data.get("points")
+    if isinstance(points, list):
+        for point in points:
+            if isinstance(point, dict):
+                yield float(point["x"]), float(point["y"])
+            else:
+                yield float(point[0]), float(point[1])
+        return
+    if all(key in data for key in ("x1", "y1", "x2", "y2")):
+        yield float(data["x1"]), float(data["y1"])
+        yield float(data["x2"]), float(data["y2"])
+        return
+    if "x" in data and "y" in data:
+        x, y = float(data["x"]), float(data["y"])
+        yield x, y
+        if "width" in data and "height" in data:
+            yield x + float(data["width"]), y + float(data["height"])
+
+def bounding_box(annotation_type: Any, data: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float, float, float]]:
+    """标注的轴对齐包围盒 (x_min, y_min, x_max, y_max)，无法确定时返回 None"""
+    annotation_type = getattr(annotation_type, "value", annotation_type)
+    if annotation_type not in SPATIAL_TYPES or not isinstance(data, dict):
+        return None
+    try:
+        points = list(_points(data))
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+    if not points:
+        return None
+    xs = [x for x, _ in points]
+    ys = [y for _, y in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def bbox_columns(annotation_type: Any, data: Optional[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    """写入 Annotation 包围盒列的值（面积为包围盒面积）"""
+    box = bounding_box(annotation_type, data)
+    if box is None:
+        return dict.fromkeys(BBOX_FIELDS)
+    x_min, y_min, x_max, y_max = box
+    return {
+        "x_min": x_min,
+        "y_min": y_min,
+        "x_max": x_max,
+        "y_max": y_max,
+        "area": (x_max - x_min) * (y_max - y_min)
+    }
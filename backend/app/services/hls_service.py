@@ -0,0 +1,130 @@
+import bisect
+from typing import Any, Dict, List, Optional
+
+# 可直接流复制进 HLS 的原始视频编码（浏览器普遍可解码）
+COPYABLE_VIDEO_CODECS = {"h264"}
+COPYABLE_PIX_FMTS = {"yuv420p", "yuvj420p"}
+
+# 源关键帧与分片网格点的容差（秒）
+KEYFRAME_GRID_TOLERANCE = 0.02
+
+CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+}
+
+def _parse_bitrate(value: str) -> int:
+    """把 800k / 2.5M 形式的码率转换为 bit/s"""
+    value = str(value).strip().lower()
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1000)
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1000 * 1000)
+    return int(value)
+
+def _even(value: float) -> int:
+    return max(2, int(round(value / 2)) * 2)
+
+def copyable_video(video_stream: Optional[Dict[str, Any]]) -> bool:
+    """视频编码是否可以直接流复制进 HLS（还需关键帧落在分片网格上）"""
+    return bool(video_stream) and video_stream.get("codec_name") in COPYABLE_VIDEO_CODECS \
+        and video_stream.get("pix_fmt") in COPYABLE_PIX_FMTS
+
+def keyframes_on_grid(keyframes: Optional[List[float]], segment_seconds: float, duration: float) -> bool:
+    """源视频在每个分片边界 k * segment_seconds 上都有关键帧
+
+    重编码档位在这些时间点强制关键帧，流复制档位只有关键帧落在同样的位置时分片边界才能对齐。
+    """
+    if not keyframes or segment_seconds <= 0 or not duration:
+        return False
+    boundary = segment_seconds
+    while boundary < duration - KEYFRAME_GRID_TOLERANCE:
+        position = bisect.bisect_left(keyframes, boundary - KEYFRAME_GRID_TOLERANCE)
+        if position >= len(keyframes) or keyframes[position] > boundary + KEYFRAME_GRID_TOLERANCE:
+            return False
+        boundary += segment_seconds
+    return True
+
+def plan_renditions(metadata: Dict[str, Any], ladder: List[Dict[str, Any]],
+                    audio_bitrate: str, max_encode_height: int,
+                    keyframes: Optional[List[float]] = None, segment_seconds: float = 0) -> List[Dict[str, Any]]:
+    """根据源媒体信息选择要生成的码率档位
+
+    音频文件只生成一个纯音频档位；视频文件生成阶梯中低于源分辨率的档位，
+    另加原始分辨率档位：编码兼容且关键帧落在分片网格上时直接流复制视频，
+    否则在不超过 max_encode_height 时重编码。
+    """
+    video_stream = metadata.get("video_stream")
+    has_audio = metadata.get("audio_stream") is not None
+    if not video_stream:
+        if not has_audio:
+            return []
+        return [{
+            "name": "audio",
+            "audio_only": True,
+            "audio_bitrate": audio_bitrate,
+            "bandwidth": _parse_bitrate(audio_bitrate),
+        }]
+
+    width = int(video_stream.get("width") or 0)
+    height = int(video_stream.get("height") or 0)
+    if not width or not height:
+        return []
+
+    renditions = []
+    for step in sorted(ladder, key=lambda item: item["height"]):
+        if step["height"] >= height:
+            continue
+        renditions.append({
+            "name": step["name"],
+            "height": step["height"],
+            "width": _even(width * step["height"] / height),
+            "video_bitrate": step["video_bitrate"],
+            "audio_bitrate": step.get("audio_bitrate", audio_bitrate),
+            "has_audio": has_audio,
+            "bandwidth": _parse_bitrate(step["video_bitrate"]) + (
+                _parse_bitrate(step.get("audio_bitrate", audio_bitrate)) if has_audio else 0
+            ),
+        })
+
+    copy_video = copyable_video(video_stream) and keyframes_on_grid(
+        keyframes, segment_seconds, float(metadata.get("duration") or 0)
+    )
+    if not copy_video and height > max_encode_height and renditions:
+        return renditions
+    top = max(ladder, key=lambda item: item["height"]) if ladder else None
+    source_bitrate = video_stream.get("bit_rate") or metadata.get("bit_rate")
+    if copy_video and source_bitrate:
+        video_bandwidth = int(source_bitrate)
+    elif top:
+        video_bandwidth = _parse_bitrate(top["video_bitrate"]) * max(1, height // top["height"])
+    else:
+        video_bandwidth = 0
+    renditions.append({
+        "name": "original",
+        "height": height,
+        "width": width,
+        "copy_video": copy_video,
+        "video_bitrate": None if copy_video else (top["video_bitrate"] if top else None),
+        "audio_bitrate": audio_bitrate,
+        "has_audio": has_audio,
+        "bandwidth": video_bandwidth + (_parse_bitrate(audio_bitrate) if has_audio else 0),
+    })
+    return renditions
+
+def build_master_playlist(renditions: List[Dict[str, Any]], playlist_name: str = "index.m3u8") -> str:
+    """生成主播放列表，各档位播放列表以相对路径引用"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rendition in sorted(renditions, key=lambda item: item["bandwidth"]):
+        attributes = [f"BANDWIDTH={rendition['bandwidth']}"]
+        if not rendition.get("audio_only"):
+            attributes.append(f"RESOLUTION={rendition['width']}x{rendition['height']}")
+        lines.append("#EXT-X-STREAM-INF:" + ",".join(attributes))
+        lines.append(f"{rendition['name']}/{playlist_name}")
+    return "\n".join(lines) + "\n"
+
+def content_type_for(path: str) -> Optional[str]:
+    for suffix, content_type in CONTENT_TYPES.items():
+        if path.endswith(suffix):
+            return content_type
+    return None
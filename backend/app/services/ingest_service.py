@@ -0,0 +1,313 @@
+import copy
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import MediaFile, Project
+from app.services.artifact_service import (
+    ArtifactStore, frames_params, hls_params, spectrogram_params, waveform_params
+)
+from app.services import job_scheduler
+from app.services.blob_service import BlobService
+from app.services.media_service import MediaService
+from app.services.minio_service import MinioService
+
+# 全部阶段（probe 之外的阶段依赖探测结果，在 probe 完成后并发执行）
+STAGES = ["probe", "keyframes", "waveform", "spectrogram", "frames", "hls"]
+
+def resolve_stages(project: Optional[Project]) -> List[str]:
+    """按项目配置确定要执行的阶段
+
+    processing_config 示例：{"stages": ["probe", "waveform"]} 指定阶段列表，
+    或 {"skip_stages": ["spectrogram"]} 在默认阶段上跳过部分阶段。probe 总是执行。
+    """
+    config = (project.processing_config if project else None) or {}
+    stages = config.get("stages") or settings.INGEST_DEFAULT_STAGES
+    skipped = set(config.get("skip_stages") or [])
+    return [stage for stage in STAGES if stage == "probe" or (stage in stages and stage not in skipped)]
+
+class IngestPipeline:
+    """媒体入库流水线：源文件只获取一次，派生阶段在本地副本上并发执行
+
+    每个阶段的状态和耗时记录在 MediaFile.processing_stages。阶段函数只做计算，
+    不访问数据库会话；结果由主线程登记和写回，派生结果登记表中已有的结果直接复用。
+    """
+
+    def __init__(self, db: Session, media_file: MediaFile, media_service: Optional[MediaService] = None):
+        self.db = db
+        self.media_file = media_file
+        self.media_service = media_service or MediaService()
+        self.blob_service = BlobService(db)
+        self.artifact_store = ArtifactStore(db)
+        project = db.query(Project).filter(Project.id == media_file.project_id).first()
+        self.config = (project.processing_config if project else None) or {}
+        self.stages = resolve_stages(project)
+        # 阶段并发执行，任务的线程预算按阶段成本分配（HLS 转码得到大部分线程）
+        self.stage_threads = job_scheduler.stage_threads(
+            [stage for stage in self.stages if stage != "probe"], self.media_service.ffmpeg_threads
+        )
+
+    def _stage_service(self, name: str) -> MediaService:
+        """使用该阶段线程数的 MediaService（浅复制，共享存储客户端和已固定的本地文件）"""
+        service = copy.copy(self.media_service)
+        service.ffmpeg_threads = self.stage_threads.get(name, 1)
+        return service
+
+    def _set_stage(self, name: str, **fields):
+        # JSON 列整体赋值，保证变更被追踪
+        stages = dict(self.media_file.processing_stages or {})
+        stages[name] = {**stages.get(name, {}), **fields}
+        self.media_file.processing_stages = stages
+
+    def _finish_stage(self, name: str, started: float, status: str, error: Optional[str] = None):
+        fields = {"status": status, "duration": round(time.monotonic() - started, 3)}
+        if error:
+            fields["error"] = error
+        self._set_stage(name, **fields)
+        # 提交成功后才回收登记时作废的派生对象
+        self.artifact_store.commit()
+
+    def _derived_stages(self) -> Dict[str, Dict[str, Any]]:
+        """probe 之后的阶段：artifact 为派生结果登记的 (操作, 参数)，compute(源文件, 输出前缀) 在线程中执行，apply 在主线程写回"""
+        metadata = self.media_file.media_metadata or {}
+        has_video = metadata.get("video_stream") is not None
+        has_audio = metadata.get("audio_stream") is not None
+        fps = int(self.config.get("frame_fps", 1))
+        frame_format = self.config.get("frame_format", settings.FRAME_OUTPUT_FORMAT)
+        # 关键帧阶段与 HLS 并发执行，尚未得到关键帧时由 HLS 阶段自行读取
+        keyframes = self.media_file.keyframes
+        stage_service = self._stage_service
+
+        def apply_keyframes(media_file: MediaFile, result):
+            media_file.keyframes = result
+            if media_file.blob is not None:
+                media_file.blob.keyframes = result
+
+        def apply_hls(media_file: MediaFile, result):
+            media_file.hls_playlist = result["master"]
+
+        return {
+            "keyframes": {
+                "enabled": has_video,
+                "reuse": lambda media_file: media_file.keyframes,
+                "compute": lambda file_path, prefix: stage_service("keyframes").get_keyframes(file_path),
+                "apply": apply_keyframes,
+            },
+            "waveform": {
+                "enabled": has_audio,
+                "artifact": ("waveform", waveform_params()),
+                "compute": lambda file_path, prefix: stage_service("waveform").extract_audio_waveform(file_path, f"{prefix}/peaks.bin"),
+            },
+            "spectrogram": {
+                "enabled": has_audio,
+                "artifact": ("spectrogram", spectrogram_params()),
+                "compute": lambda file_path, prefix: stage_service("spectrogram").generate_spectrogram(file_path, prefix),
+            },
+            "frames": {
+                "enabled": has_video,
+                "artifact": ("frames", frames_params(fps, frame_format)),
+                "compute": lambda file_path, prefix: stage_service("frames").extract_frames(file_path, prefix, fps, frame_format),
+            },
+            "hls": {
+                "enabled": settings.HLS_ENABLED,
+                "artifact": ("hls", hls_params()),
+                "compute": lambda file_path, prefix: stage_service("hls").transcode_hls(file_path, prefix, metadata, keyframes),
+                "apply": apply_hls,
+            },
+        }
+
+    def run(self) -> Dict[str, Any]:
+        """执行流水线
+
+        探测通过预签名URL读取文件头，不需要下载源文件；只有计算内容哈希或执行派生阶段时才把源文件固定到本地。
+        尚未去重且配置了派生阶段时，哈希与派生阶段共用一次下载。
+        """
+        media_file = self.media_file
+        media_file.processing_stages = {stage: {"status": "pending"} for stage in self.stages}
+        self.db.commit()
+
+        try:
+            if media_file.content_hash is None and any(stage != "probe" for stage in self.stages):
+                with self.media_service.pin(media_file.file_path) as local_path:
+                    self._deduplicate(local_path)
+                    if self._ensure_probe():
+                        self._run_derived_stages()
+            else:
+                if media_file.content_hash is None:
+                    self._deduplicate()
+                if self._ensure_probe():
+                    # 派生结果全部可复用时无需获取源文件
+                    source = self.media_service.pin(media_file.file_path) if self._pending_stages() else nullcontext()
+                    with source:
+                        self._run_derived_stages()
+        except Exception as e:
+            self.db.rollback()
+            self._close_stages("failed", str(e))
+            raise
+
+        return self._result()
+
+    def _ensure_probe(self) -> bool:
+        """已有探测结果（去重复用）时跳过探测；探测失败时后续阶段依赖探测结果，不再执行"""
+        if self.media_file.processing_status == "ready":
+            self._set_stage("probe", status="reused")
+            return True
+        if not self._probe():
+            self._close_stages("skipped")
+            return False
+        return True
+
+    def _close_stages(self, status: str, error: Optional[str] = None):
+        """把仍处于 pending / running 的阶段标记为 status 并提交"""
+        for name, stage in (self.media_file.processing_stages or {}).items():
+            if stage.get("status") in ("pending", "running"):
+                fields = {"status": status}
+                if error:
+                    fields["error"] = error
+                self._set_stage(name, **fields)
+        self.db.commit()
+
+    def _deduplicate(self, local_path: Optional[str] = None):
+        """分片/直传上传未经过 API 进程，计算内容哈希并去重（已固定到本地时读取本地副本，否则流式读取对象）"""
+        media_file = self.media_file
+        pinned_path = media_file.file_path
+        content_hash = self.blob_service.compute_hash(
+            pinned_path, minio_service=self.media_service.minio_service, local_path=local_path
+        )
+        duplicate_path = self.blob_service.attach(media_file, content_hash)
+        self.db.commit()
+        if duplicate_path:
+            self.media_service.alias_pin(media_file.file_path, pinned_path)
+            MinioService().delete_file(duplicate_path)
+
+    def _probe(self) -> bool:
+        media_file = self.media_file
+        started = time.monotonic()
+        self._set_stage("probe", status="running", started_at=datetime.now(timezone.utc).isoformat())
+        media_file.processing_status = "probing"
+        self.db.commit()
+        try:
+            duration, metadata = self.media_service.get_media_info(media_file.file_path)
+        except Exception as e:
+            self.db.rollback()
+            media_file.processing_status = "failed"
+            self._finish_stage("probe", started, "failed", str(e))
+            return False
+
+        media_file.duration = duration
+        media_file.media_metadata = metadata
+        media_file.processing_status = "ready"
+        self.blob_service.record_probe(media_file)
+        self._finish_stage("probe", started, "done")
+        return True
+
+    def _pending_stages(self) -> List[str]:
+        """需要实际计算（没有可复用结果）的阶段"""
+        definitions = self._derived_stages()
+        pending = []
+        for name in self.stages:
+            definition = definitions.get(name)
+            if definition is None or not definition["enabled"]:
+                continue
+            if self._reusable(definition) is None:
+                pending.append(name)
+        return pending
+
+    def _reusable(self, definition: Dict[str, Any]) -> Any:
+        if "reuse" in definition:
+            return definition["reuse"](self.media_file)
+        operation, params = definition["artifact"]
+        return self.artifact_store.find(self.media_file, operation, params)
+
+    def _apply(self, definition: Dict[str, Any], result: Any, computed: bool = False) -> Any:
+        if computed and "artifact" in definition:
+            operation, params = definition["artifact"]
+            result = self.artifact_store.register(self.media_file, operation, params, result)
+        if "apply" in definition:
+            definition["apply"](self.media_file, result)
+        return result
+
+    def _run_derived_stages(self):
+        """并发执行派生阶段
+
+        相同结果正由其他 worker 计算的阶段不在此等待，标记为 deferred，由调用方稍后重新执行流水线复用其结果。
+        """
+        definitions = self._derived_stages()
+        file_path = self.media_file.file_path
+        running: Dict[Any, str] = {}
+        locks: Dict[str, Any] = {}
+        started_at: Dict[str, float] = {}
+
+        with ThreadPoolExecutor(max_workers=settings.INGEST_STAGE_WORKERS) as executor:
+            try:
+                for name in self.stages:
+                    definition = definitions.get(name)
+                    if definition is None:
+                        continue
+                    if not definition["enabled"]:
+                        self._set_stage(name, status="skipped")
+                        continue
+                    reused = self._reusable(definition)
+                    if reused is not None:
+                        self._apply(definition, reused)
+                        self._set_stage(name, status="reused")
+                        continue
+                    prefix = None
+                    if "artifact" in definition:
+                        operation, params = definition["artifact"]
+                        lock = self.artifact_store.lock(self.media_file, operation, params)
+                        if not lock.acquire(blocking=False):
+                            self._set_stage(name, status="deferred")
+                            continue
+                        locks[name] = lock
+                        prefix = self.artifact_store.prefix(
+                            self.artifact_store.source_etag(file_path), operation, params
+                        )
+                    started_at[name] = time.monotonic()
+                    self._set_stage(name, status="running", started_at=datetime.now(timezone.utc).isoformat())
+                    running[executor.submit(definition["compute"], file_path, prefix)] = name
+                self.db.commit()
+
+                for future in as_completed(running):
+                    name = running[future]
+                    try:
+                        result = future.result()
+                        if result is None:
+                            self._finish_stage(name, started_at[name], "failed")
+                            continue
+                        self._apply(definitions[name], result, computed=True)
+                        self._finish_stage(name, started_at[name], "done")
+                    except Exception as e:
+                        self.db.rollback()
+                        self._finish_stage(name, started_at[name], "failed", str(e))
+                    finally:
+                        # 结果提交后才释放锁，之后执行的 worker 随即可以查到登记的结果
+                        self._release(locks.pop(name, None))
+            finally:
+                for lock in locks.values():
+                    self._release(lock)
+
+    @staticmethod
+    def _release(lock):
+        if lock is None:
+            return
+        try:
+            lock.release()
+        except Exception as e:
+            print(f"释放派生结果锁失败: {e}")
+
+    def _result(self) -> Dict[str, Any]:
+        media_file = self.media_file
+        return {
+            "success": media_file.processing_status == "ready",
+            "media_file_id": media_file.id,
+            "processing_status": media_file.processing_status,
+            "stages": media_file.processing_stages,
+            "deferred": [
+                name for name, stage in (media_file.processing_stages or {}).items()
+                if stage.get("status") == "deferred"
+            ]
+        }
@@ -0,0 +1,198 @@
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+from app.core.config import settings
+from app.core.redis_client import get_redis
+
+# 媒体任务按估算成本分为两类，各自使用独立队列和 worker，短任务不会排在长转码之后
+LIGHT = "light"
+HEAVY = "heavy"
+JOB_CLASSES = (LIGHT, HEAVY)
+
+# 各操作每秒源媒体（720p H.264 基准）的相对 CPU 成本
+OPERATION_COST = {
+    "probe": 0.001,
+    "keyframes": 0.01,
+    "waveform": 0.02,
+    "spectrogram": 0.05,
+    "frames": 0.2,
+    "segment": 1.0,
+    "hls": 1.5,
+}
+
+# 成本低于该值的操作（探测、关键帧、波形等）在并发执行时只分配一个 ffmpeg 线程
+SINGLE_THREAD_COST = 0.1
+
+# 解码/编码开销高于 H.264 的编码格式
+CODEC_COST = {
+    "hevc": 1.5,
+    "vp9": 1.5,
+    "av1": 2.0,
+    "prores": 1.3,
+}
+
+METRICS_KEY = "media_jobs:metrics:{job_class}"
+SAMPLES_KEY = "media_jobs:{kind}:{job_class}"
+SAMPLE_LIMIT = 1000
+
+# 当前 worker 进程正在执行的任务类别（prefork 下每个子进程同一时间只执行一个任务）
+_current_class: Optional[str] = None
+_started: Dict[str, Tuple[float, str]] = {}
+
+def queue_name(job_class: str) -> str:
+    return f"media.{job_class}"
+
+def estimate_duration(media_file) -> float:
+    """媒体时长；尚未探测时按文件大小和假定码率估算"""
+    if media_file.duration:
+        return float(media_file.duration)
+    if media_file.file_size:
+        return media_file.file_size * 8 / settings.MEDIA_ASSUMED_BITRATE
+    return 0.0
+
+def media_cost_factor(media_file) -> float:
+    """分辨率和编码格式带来的成本倍数"""
+    video_stream = (media_file.media_metadata or {}).get("video_stream")
+    if not video_stream:
+        # 纯音频（或尚未探测）
+        return 0.05 if media_file.media_type == "audio" else 1.0
+    pixels = int(video_stream.get("width") or 1280) * int(video_stream.get("height") or 720)
+    return max(pixels / (1280 * 720), 0.1) * CODEC_COST.get(video_stream.get("codec_name"), 1.0)
+
+def estimate_cost(media_file, operations: Iterable[str], seconds: Optional[float] = None) -> float:
+    """估算任务成本（约等于单核 CPU 秒数）
+
+    seconds 为实际处理的源媒体时长（如片段总时长），默认为整个文件。
+    """
+    seconds = estimate_duration(media_file) if seconds is None else seconds
+    factor = media_cost_factor(media_file)
+    return sum(OPERATION_COST.get(operation, 1.0) for operation in operations) * seconds * factor
+
+def classify(cost: float) -> str:
+    return HEAVY if cost >= settings.MEDIA_HEAVY_COST_THRESHOLD else LIGHT
+
+def dispatch(task, media_file, operations: Iterable[str], args: tuple = (), kwargs: Optional[dict] = None,
+             seconds: Optional[float] = None):
+    """按估算成本把任务发送到对应的子队列"""
+    cost = estimate_cost(media_file, operations, seconds)
+    job_class = classify(cost)
+    return task.apply_async(
+        args=args,
+        kwargs=kwargs or {},
+        queue=queue_name(job_class),
+        headers={"job_class": job_class, "estimated_cost": round(cost, 1)}
+    )
+
+def signature(task, media_file, operations: Iterable[str], args: tuple = (), seconds: Optional[float] = None):
+    """与 dispatch 相同，但返回签名，用于 group 等组合"""
+    cost = estimate_cost(media_file, operations, seconds)
+    job_class = classify(cost)
+    return task.signature(
+        args, queue=queue_name(job_class),
+        headers={"job_class": job_class, "estimated_cost": round(cost, 1)}
+    )
+
+def ffmpeg_threads() -> int:
+    """当前任务每个 ffmpeg 进程可使用的线程数"""
+    if _current_class == HEAVY:
+        return settings.MEDIA_HEAVY_FFMPEG_THREADS
+    return settings.MEDIA_LIGHT_FFMPEG_THREADS
+
+def stage_threads(operations: Iterable[str], total: int) -> Dict[str, int]:
+    """同一任务内并发执行的各操作的 ffmpeg 线程数
+
+    轻量操作各用一个线程（很快结束，只短时超出预算）；其余操作按成本比例分摊整个预算，
+    每个至少一个线程，最耗时的操作（如 HLS 转码）得到大部分线程。
+    """
+    operations = list(operations)
+    heavy = [operation for operation in operations if OPERATION_COST.get(operation, 1.0) >= SINGLE_THREAD_COST]
+    heavy_cost = sum(OPERATION_COST.get(operation, 1.0) for operation in heavy)
+    return {
+        operation: max(1, int(total * OPERATION_COST.get(operation, 1.0) / heavy_cost)) if operation in heavy else 1
+        for operation in operations
+    }
+
+def _header(request, name: str) -> Any:
+    value = getattr(request, name, None)
+    if value is None:
+        value = (getattr(request, "headers", None) or {}).get(name)
+    return value
+
+def _job_class(request) -> Optional[str]:
+    job_class = _header(request, "job_class")
+    if job_class in JOB_CLASSES:
+        return job_class
+    routing_key = ((getattr(request, "delivery_info", None) or {}).get("routing_key") or "")
+    for candidate in JOB_CLASSES:
+        if routing_key == queue_name(candidate):
+            return candidate
+    return None
+
+def _record(job_class: str, kind: str, seconds: float):
+    """累计并保留最近的样本（用于计算分位数），统计失败不影响任务"""
+    try:
+        pipe = get_redis().pipeline()
+        key = METRICS_KEY.format(job_class=job_class)
+        pipe.hincrby(key, f"{kind}_count", 1)
+        pipe.hincrbyfloat(key, f"{kind}_total", seconds)
+        samples_key = SAMPLES_KEY.format(kind=kind, job_class=job_class)
+        pipe.lpush(samples_key, round(seconds, 3))
+        pipe.ltrim(samples_key, 0, SAMPLE_LIMIT - 1)
+        pipe.execute()
+    except Exception as e:
+        print(f"记录任务统计失败: {e}")
+
+def on_before_publish(headers=None, **kwargs):
+    """发布任务时记录入队时间"""
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+def on_task_prerun(task_id=None, task=None, **kwargs):
+    global _current_class
+    job_class = _job_class(task.request) if task is not None else None
+    _current_class = job_class
+    if job_class is None:
+        return
+    enqueued_at = _header(task.request, "enqueued_at")
+    if enqueued_at:
+        _record(job_class, "wait", max(time.time() - float(enqueued_at), 0.0))
+    _started[task_id] = (time.monotonic(), job_class)
+
+def on_task_postrun(task_id=None, state=None, **kwargs):
+    global _current_class
+    _current_class = None
+    started = _started.pop(task_id, None)
+    if started is None:
+        return
+    started_at, job_class = started
+    _record(job_class, "run", time.monotonic() - started_at)
+    if state != "SUCCESS":
+        try:
+            get_redis().hincrby(METRICS_KEY.format(job_class=job_class), "failures", 1)
+        except Exception as e:
+            print(f"记录任务统计失败: {e}")
+
+def _percentile(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def metrics() -> Dict[str, Any]:
+    """各任务类别的排队等待和运行时间统计（最近样本的 p50/p95 与累计均值）"""
+    redis = get_redis()
+    result = {}
+    for job_class in JOB_CLASSES:
+        totals = {key.decode(): float(value) for key, value in redis.hgetall(METRICS_KEY.format(job_class=job_class)).items()}
+        stats = {"queue": queue_name(job_class), "queued": redis.llen(queue_name(job_class)),
+                 "failures": int(totals.get("failures", 0))}
+        for kind in ("wait", "run"):
+            samples = [float(value) for value in redis.lrange(SAMPLES_KEY.format(kind=kind, job_class=job_class), 0, -1)]
+            count = int(totals.get(f"{kind}_count", 0))
+            stats[kind] = {
+                "count": count,
+                "mean": totals.get(f"{kind}_total", 0.0) / count if count else None,
+                "p50": _percentile(samples, 0.5),
+                "p95": _percentile(samples, 0.95),
+            }
+        result[job_class] = stats
+    return result
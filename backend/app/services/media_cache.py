@@ -0,0 +1,127 @@
+import fcntl
+import hashlib
+import os
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+from app.core.config import settings
+from app.core.redis_client import get_redis
+from app.services.minio_service import MinioService
+
+# Redis 中记录缓存命中统计的 key（所有 worker 子进程共享）
+STATS_KEY = "media_cache:stats"
+
+def cache_stats() -> Dict[str, int]:
+    """读取缓存命中统计（只读 Redis，API 进程中使用，不创建缓存目录和存储客户端）"""
+    try:
+        raw = get_redis().hgetall(STATS_KEY)
+    except Exception as e:
+        print(f"读取缓存统计失败: {e}")
+        return {}
+    return {key.decode(): int(value) for key, value in raw.items()}
+
+class MediaCache:
+    """worker 本地的媒体文件磁盘缓存
+
+    以 (对象名, etag) 为键缓存到 MEDIA_CACHE_DIR，超出 MEDIA_CACHE_MAX_BYTES 时按最近使用时间淘汰。
+    prefork 子进程之间用文件锁协调：下载时持有排他锁，使用中持有共享锁，淘汰只删除能拿到排他锁的文件；
+    下载先写临时文件再原子重命名。
+    """
+
+    def __init__(self, minio_service: Optional[MinioService] = None,
+                 cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.minio_service = minio_service or MinioService()
+        self.cache_dir = cache_dir or settings.MEDIA_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else settings.MEDIA_CACHE_MAX_BYTES
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, object_name: str, etag: str) -> str:
+        key = hashlib.sha1(object_name.encode("utf-8")).hexdigest()
+        suffix = os.path.splitext(object_name)[1]
+        return os.path.join(self.cache_dir, f"{key}-{etag}{suffix}")
+
+    @contextmanager
+    def open(self, object_name: str):
+        """获取对象的本地路径，with 块内保证文件不会被淘汰"""
+        stat = self.minio_service.stat_file(object_name)
+        if stat is None:
+            raise Exception("无法下载文件")
+
+        path = self._entry_path(object_name, stat.etag)
+        lock_file = open(path + ".lock", "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(path):
+                self._record("hits")
+            else:
+                tmp_path = f"{path}.{uuid.uuid4().hex}.part"
+                try:
+                    self.minio_service.download_to_path(object_name, path, tmp_file_path=tmp_path)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.unlink(tmp_path)
+                self._record("misses", os.path.getsize(path))
+            # 更新最近使用时间，降级为共享锁供其他进程同时读取
+            os.utime(path, None)
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+
+            self._evict(keep=path)
+            yield path
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def _evict(self, keep: Optional[str] = None):
+        """淘汰最久未使用的文件直到总大小不超过上限"""
+        guard = open(os.path.join(self.cache_dir, ".evict.lock"), "a+")
+        try:
+            try:
+                fcntl.flock(guard, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # 其他进程正在淘汰
+                return
+
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.startswith(".") or entry.name.endswith((".lock", ".part")):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                with open(path + ".lock", "a+") as lock_file:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # 正在被使用
+                        continue
+                    # 锁文件保留，避免其他进程持有已删除锁文件造成互斥失效
+                    try:
+                        os.unlink(path)
+                    except FileNotFoundError:
+                        pass
+                    total -= size
+                    self._record("evictions", size)
+        finally:
+            fcntl.flock(guard, fcntl.LOCK_UN)
+            guard.close()
+
+    def _record(self, field: str, size: int = 0):
+        """记录命中统计，统计失败不影响缓存本身"""
+        try:
+            pipe = get_redis().pipeline()
+            pipe.hincrby(STATS_KEY, field, 1)
+            if size:
+                pipe.hincrby(STATS_KEY, f"{field}_bytes", size)
+            pipe.execute()
+        except Exception as e:
+            print(f"记录缓存统计失败: {e}")
@@ -1,173 +1,636 @@
 import ffmpeg
+import json
+import numpy as np
 import os
 import tempfile
-from typing import Tuple, Dict, Any, Optional
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Tuple, Dict, Any, List, Optional, Callable, Iterator
 from app.core.config import settings
-from app.services.minio_service import MinioService
+from app.services.minio_service import MinioService, UploadPool
+from app.services.media_cache import MediaCache
+from app.services import job_scheduler
+from app.services.waveform_service import PeakAccumulator, build_levels, encode_pyramid
+from app.services.spectrogram_service import StreamingSTFT, TileBuilder
+from app.services.segment_service import (
+    DURATION_TOLERANCE, group_ranges, plan_smart_cut, smart_cut_options, stream_matches, track_timescale
+)
+from app.services.hls_service import copyable_video, plan_renditions, build_master_playlist, content_type_for
+from app.services.frame_service import split_jpeg_stream, FramePackWriter, index_key
 
 class MediaService:
     def __init__(self):
         self.minio_service = MinioService()
+        self.cache = MediaCache(self.minio_service)
+        # 已固定在本地缓存中的对象：对象名 -> 本地路径
+        self._pinned: Dict[str, str] = {}
+        # 每个 ffmpeg 进程的线程数，由任务的成本类别决定；同一任务并发多个 ffmpeg 时需按并发数分摊
+        self.ffmpeg_threads = job_scheduler.ffmpeg_threads()
+    
+    @contextmanager
+    def pin(self, file_path: str):
+        """在 with 块内把对象固定在本地缓存中，期间所有处理都直接读取本地文件"""
+        with self.cache.open(file_path) as local_path:
+            self._pinned[file_path] = local_path
+            try:
+                yield local_path
+            finally:
+                for name in [name for name, path in self._pinned.items() if path == local_path]:
+                    del self._pinned[name]
+    
+    @contextmanager
+    def local_copy(self, file_path: str):
+        """获取对象的本地文件（已固定时直接复用，避免重复加锁）"""
+        if file_path in self._pinned:
+            yield self._pinned[file_path]
+        else:
+            with self.cache.open(file_path) as local_path:
+                yield local_path
+    
+    def alias_pin(self, file_path: str, pinned_path: str):
+        """内容相同的对象（如去重后改指向的对象）复用已固定的本地文件"""
+        if pinned_path in self._pinned:
+            self._pinned[file_path] = self._pinned[pinned_path]
+    
+    def _use_url_input(self, file_path: str) -> bool:
+        """是否让 ffmpeg 直接读取预签名URL"""
+        extension = os.path.splitext(file_path)[1].lower()
+        return settings.MEDIA_URL_INPUT and extension not in settings.MEDIA_URL_INPUT_EXCLUDED_EXTENSIONS
+    
+    def _with_input(self, file_path: str, func: Callable[[str], Any]) -> Any:
+        """以预签名URL作为 ffmpeg 输入执行 func，失败或不适用时回退到本地缓存文件
+
+        对象已通过 pin 固定在本地时直接使用本地文件。
+        """
+        if file_path not in self._pinned and self._use_url_input(file_path):
+            url = self.minio_service.get_file_url(file_path, expires=settings.MEDIA_PROBE_URL_EXPIRES)
+            if url:
+                try:
+                    return func(url)
+                except ffmpeg.Error as e:
+                    print(f"URL 输入处理失败，回退到下载: {e}")
+        
+        with self.local_copy(file_path) as local_path:
+            return func(local_path)
     
     def get_media_info(self, file_path: str) -> Tuple[float, Dict[str, Any]]:
-        """获取媒体文件信息"""
+        """获取媒体文件信息
+
+        ffprobe 直接读取预签名URL，只按需发起 Range 请求读取文件头（以及 moov 在末尾时的文件尾），
+        不下载整个文件。
+        """
         try:
-            # 从MinIO下载文件到临时目录
-            file_data = self.minio_service.download_file(file_path)
-            if not file_data:
-                raise Exception("无法下载文件")
+            # 使用ffmpeg获取媒体信息
+            probe = self._with_input(file_path, ffmpeg.probe)
             
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_path)[1]) as temp_file:
-                temp_file.write(file_data)
-                temp_file_path = temp_file.name
+            # 获取时长
+            duration = float(probe['format']['duration'])
             
-            try:
-                # 使用ffmpeg获取媒体信息
-                probe = ffmpeg.probe(temp_file_path)
-                
-                # 获取时长
-                duration = float(probe['format']['duration'])
-                
-                # 获取视频/音频流信息
-                streams = probe.get('streams', [])
-                video_stream = next((s for s in streams if s['codec_type'] == 'video'), None)
-                audio_stream = next((s for s in streams if s['codec_type'] == 'audio'), None)
-                
-                metadata = {
-                    'format': probe['format']['format_name'],
-                    'duration': duration,
-                    'size': probe['format']['size'],
-                    'bit_rate': probe['format'].get('bit_rate'),
-                    'video_stream': video_stream,
-                    'audio_stream': audio_stream
-                }
-                
-                return duration, metadata
-                
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            # 获取视频/音频流信息
+            streams = probe.get('streams', [])
+            video_stream = next((s for s in streams if s['codec_type'] == 'video'), None)
+            audio_stream = next((s for s in streams if s['codec_type'] == 'audio'), None)
+            
+            metadata = {
+                'format': probe['format']['format_name'],
+                'duration': duration,
+                'size': probe['format'].get('size'),
+                'bit_rate': probe['format'].get('bit_rate'),
+                'video_stream': video_stream,
+                'audio_stream': audio_stream
+            }
+            
+            return duration, metadata
                     
         except Exception as e:
             print(f"获取媒体信息失败: {e}")
             raise e
     
-    def extract_frames(self, file_path: str, output_dir: str, fps: int = 1) -> list:
-        """提取视频帧"""
+    def iter_frames(self, source: str, fps: int = 1) -> Iterator[bytes]:
+        """从 ffmpeg 标准输出逐帧读取 JPEG，不落盘"""
+        process = (
+            ffmpeg
+            .input(source)
+            .filter('fps', fps=fps)
+            .output('pipe:', format='image2pipe', vcodec='mjpeg', threads=self.ffmpeg_threads, **{'q:v': 2})
+            .run_async(pipe_stdout=True)
+        )
         try:
-            # 从MinIO下载文件
-            file_data = self.minio_service.download_file(file_path)
-            if not file_data:
-                raise Exception("无法下载文件")
-            
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_path)[1]) as temp_file:
-                temp_file.write(file_data)
-                temp_file_path = temp_file.name
-            
-            try:
-                # 确保输出目录存在
-                os.makedirs(output_dir, exist_ok=True)
-                
-                # 使用ffmpeg提取帧
-                output_pattern = os.path.join(output_dir, "frame_%04d.jpg")
-                
-                stream = ffmpeg.input(temp_file_path)
-                stream = ffmpeg.filter(stream, 'fps', fps=fps)
-                stream = ffmpeg.output(stream, output_pattern, vframes=None)
-                ffmpeg.run(stream, overwrite_output=True)
-                
-                # 返回生成的帧文件列表
-                frame_files = []
-                for filename in os.listdir(output_dir):
-                    if filename.startswith("frame_") and filename.endswith(".jpg"):
-                        frame_files.append(os.path.join(output_dir, filename))
-                
-                return sorted(frame_files)
-                
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+            yield from split_jpeg_stream(process.stdout)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+        if returncode != 0:
+            raise ffmpeg.Error('ffmpeg', None, None)
+    
+    def extract_frames(self, file_path: str, output_prefix: str, fps: int = 1,
+                       output_format: str = "files") -> Dict[str, Any]:
+        """提取视频帧
+        
+        帧从管道读出后直接提交到上传线程池，解码与上传并行进行。
+        files 格式每帧一个对象 {output_prefix}/frame_%06d.jpg；pack 格式把帧拼接为
+        {output_prefix}/pack_%05d.bin，并写入定长记录的 {output_prefix}/index.bin 供按序号随机读取。
+        两种格式都另写入 {output_prefix}/manifest.json。
+        """
+        def extract_files(source: str) -> Dict[str, Any]:
+            frames = []
+            with UploadPool(self.minio_service, settings.MEDIA_UPLOAD_WORKERS) as pool:
+                for index, data in enumerate(self.iter_frames(source, fps)):
+                    key = f"{output_prefix}/frame_{index:06d}.jpg"
+                    pool.submit(data, key, "image/jpeg")
+                    frames.append({'index': index, 'timestamp': index / fps, 'key': key})
+            return {'frame_count': len(frames), 'frames': frames}
+        
+        def extract_pack(source: str) -> Dict[str, Any]:
+            # 内存中最多保留正在写入的帧包和 FRAME_PACK_MAX_PENDING 个待上传的帧包
+            with UploadPool(self.minio_service, settings.FRAME_PACK_MAX_PENDING,
+                            max_pending=settings.FRAME_PACK_MAX_PENDING) as pool:
+                writer = FramePackWriter(
+                    output_prefix, settings.FRAME_PACK_MAX_BYTES, fps,
+                    lambda key, data: pool.submit(data, key)
+                )
+                for index, data in enumerate(self.iter_frames(source, fps)):
+                    writer.add(data, index / fps)
+                index_data = writer.finish()
+            self.minio_service.upload_bytes(index_data, index_key(output_prefix))
+            return {
+                'frame_count': len(writer.records),
+                'pack_count': writer.pack_count,
+                'pack_max_bytes': settings.FRAME_PACK_MAX_BYTES,
+                'index': index_key(output_prefix)
+            }
+        
+        try:
+            extract = extract_pack if output_format == "pack" else extract_files
+            manifest = {
+                'format': output_format,
+                'prefix': output_prefix,
+                'fps': fps,
+                **self._with_input(file_path, extract)
+            }
+            manifest_key = f"{output_prefix}/manifest.json"
+            self.minio_service.upload_bytes(json.dumps(manifest).encode('utf-8'), manifest_key, "application/json")
+            return {
+                'manifest': manifest_key,
+                'format': output_format,
+                'prefix': output_prefix,
+                'frame_count': manifest['frame_count']
+            }
                     
         except Exception as e:
             print(f"提取视频帧失败: {e}")
             raise e
     
-    def create_video_segment(self, input_path: str, output_path: str, start_time: float, end_time: float) -> bool:
-        """创建视频片段"""
-        try:
-            # 从MinIO下载文件
-            file_data = self.minio_service.download_file(input_path)
-            if not file_data:
-                raise Exception("无法下载文件")
-            
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(input_path)[1]) as temp_file:
-                temp_file.write(file_data)
-                temp_file_path = temp_file.name
+    def get_keyframes(self, file_path: str) -> List[float]:
+        """读取视频流的包级关键帧标记，返回关键帧时间戳（不解码）"""
+        probe = self._with_input(
+            file_path,
+            lambda source: ffmpeg.probe(source, select_streams='v:0', show_entries='packet=pts_time,flags')
+        )
+        keyframes = set()
+        for packet in probe.get('packets', []):
+            pts_time = packet.get('pts_time')
+            if 'K' in packet.get('flags', '') and pts_time not in (None, 'N/A'):
+                keyframes.add(round(float(pts_time), 6))
+        return sorted(keyframes)
+    
+    def _encode_range(self, source: str, output_path: str, start_time: float, end_time: float,
+                      vcodec: str = 'libx264', pix_fmt: Optional[str] = None, threads: Optional[int] = None,
+                      **output_kwargs):
+        """重编码 [start_time, end_time)，输入端定位后解码到精确的起始帧"""
+        kwargs = {'t': end_time - start_time, 'vcodec': vcodec, 'preset': 'veryfast', 'crf': 18, 'acodec': 'aac',
+                  'threads': threads or self.ffmpeg_threads}
+        if pix_fmt:
+            kwargs['pix_fmt'] = pix_fmt
+        kwargs.update(output_kwargs)
+        stream = ffmpeg.input(source, ss=start_time)
+        ffmpeg.run(ffmpeg.output(stream, output_path, **kwargs), overwrite_output=True, quiet=True)
+    
+    def _smart_cut(self, source: str, output_path: str, plan: List[Tuple[str, float, float]],
+                   video_stream: Dict[str, Any], threads: Optional[int] = None):
+        """按剪切计划分段处理后用 concat 分离器拼接
+
+        边缘 GOP 按源视频流的 profile、level、像素格式编码，输出沿用源的时间刻度；
+        拼接结果经过校验，不一致时抛出 ValueError。
+        """
+        encode_options = smart_cut_options(video_stream)
+        with tempfile.TemporaryDirectory(prefix="segment_") as work_dir:
+            parts = []
+            for index, (mode, part_start, part_end) in enumerate(plan):
+                part_path = os.path.join(work_dir, f"part_{index}.ts")
+                if mode == 'copy':
+                    # 起点是关键帧，输入端定位后流复制不会丢帧
+                    stream = ffmpeg.input(source, ss=part_start)
+                    ffmpeg.run(
+                        ffmpeg.output(stream, part_path, t=part_end - part_start,
+                                      vcodec='copy', acodec='aac', format='mpegts',
+                                      threads=threads or self.ffmpeg_threads),
+                        overwrite_output=True, quiet=True
+                    )
+                else:
+                    self._encode_range(source, part_path, part_start, part_end, threads=threads,
+                                       format='mpegts', **encode_options)
+                parts.append(part_path)
             
+            list_path = os.path.join(work_dir, "parts.txt")
+            with open(list_path, "w") as f:
+                f.writelines(f"file '{part}'\n" for part in parts)
+            stream = ffmpeg.input(list_path, format='concat', safe=0)
+            ffmpeg.run(
+                ffmpeg.output(stream, output_path, c='copy', movflags='+faststart',
+                              video_track_timescale=track_timescale(video_stream)),
+                overwrite_output=True, quiet=True
+            )
+        self._verify_smart_cut(output_path, plan[-1][2] - plan[0][1], video_stream, threads)
+    
+    def _verify_smart_cut(self, output_path: str, expected_duration: float, video_stream: Dict[str, Any],
+                          threads: Optional[int] = None):
+        """校验拼接结果：编码参数与源一致、时长符合预期且完整解码没有错误
+
+        参数不兼容的拼接不一定让 ffmpeg 返回非零，只能在输出上检查。
+        """
+        probe = ffmpeg.probe(output_path)
+        output_stream = next((s for s in probe.get('streams', []) if s['codec_type'] == 'video'), None)
+        if not stream_matches(video_stream, output_stream):
+            raise ValueError("拼接结果的编码参数与源视频不一致")
+        duration = float(probe['format'].get('duration') or 0)
+        if abs(duration - expected_duration) > DURATION_TOLERANCE:
+            raise ValueError(f"拼接结果时长 {duration} 与预期 {expected_duration} 不符")
+        _, stderr = ffmpeg.run(
+            ffmpeg.input(output_path).output('-', format='null', threads=threads or self.ffmpeg_threads)
+            .global_args('-v', 'error'),
+            capture_stdout=True, capture_stderr=True
+        )
+        if stderr and stderr.strip():
+            raise ValueError(f"拼接结果解码出错: {stderr.decode('utf-8', 'replace').strip()}")
+    
+    def _cut_segment(self, source: str, output_path: str, start_time: float, end_time: float,
+                     keyframes: Optional[List[float]], video_stream: Optional[Dict[str, Any]],
+                     threads: Optional[int] = None):
+        """精确剪切单个片段，精确剪切不可用或失败时整段重编码"""
+        can_smart_cut = keyframes and smart_cut_options(video_stream) is not None
+        plan = plan_smart_cut(keyframes, start_time, end_time) if can_smart_cut else None
+        if plan is not None:
             try:
-                # 使用ffmpeg剪切视频
-                duration = end_time - start_time
-                
-                stream = ffmpeg.input(temp_file_path, ss=start_time, t=duration)
-                stream = ffmpeg.output(stream, output_path, acodec='copy', vcodec='copy')
-                ffmpeg.run(stream, overwrite_output=True)
-                
-                return True
-                
-            finally:
-                # 清理临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+                self._smart_cut(source, output_path, plan, video_stream, threads)
+                return
+            except (ffmpeg.Error, ValueError) as e:
+                # 拼接失败或拼接结果校验不通过时回退到整段重编码
+                print(f"精确剪切失败，回退到整段重编码: {e}")
+        self._encode_range(source, output_path, start_time, end_time, threads=threads, movflags='+faststart')
+    
+    def create_video_segment(self, input_path: str, output_path: str, start_time: float, end_time: float,
+                             keyframes: Optional[List[float]] = None,
+                             video_stream: Optional[Dict[str, Any]] = None) -> bool:
+        """创建视频片段（精确到帧）
+        
+        有关键帧索引且编码格式支持时，只重编码两端不完整的 GOP，中间完整的 GOP 流复制，
+        再用 concat 分离器拼接；否则整段重编码。音频统一重编码为 AAC 以便拼接。
+        """
+        try:
+            self._with_input(
+                input_path,
+                lambda source: self._cut_segment(source, output_path, start_time, end_time, keyframes, video_stream)
+            )
+            return True
                     
         except Exception as e:
             print(f"创建视频片段失败: {e}")
             return False
     
-    def extract_audio_waveform(self, file_path: str) -> Optional[Dict[str, Any]]:
-        """提取音频波形数据"""
-        try:
-            # 从MinIO下载文件
-            file_data = self.minio_service.download_file(file_path)
-            if not file_data:
-                raise Exception("无法下载文件")
+    def _encode_ranges(self, source: str, ranges: List[Tuple[float, float, str]], has_audio: bool,
+                       threads: Optional[int] = None):
+        """一次 ffmpeg 调用输出多个片段：解码一遍覆盖范围，split 后分别 trim 和编码"""
+        group_start = min(start for start, _, _ in ranges)
+        group_end = max(end for _, end, _ in ranges)
+        stream = ffmpeg.input(source, ss=group_start, t=group_end - group_start)
+        videos = stream.video.filter_multi_output('split', len(ranges))
+        audios = stream.audio.filter_multi_output('asplit', len(ranges)) if has_audio else None
+        
+        outputs = []
+        for index, (start, end, output_path) in enumerate(ranges):
+            streams = [
+                videos[index]
+                .trim(start=start - group_start, end=end - group_start)
+                .setpts('PTS-STARTPTS')
+            ]
+            if audios is not None:
+                streams.append(
+                    audios[index]
+                    .filter('atrim', start=start - group_start, end=end - group_start)
+                    .filter('asetpts', 'PTS-STARTPTS')
+                )
+            # 各输出的编码器同时运行，线程数按输出数分摊
+            outputs.append(ffmpeg.output(
+                *streams, output_path, vcodec='libx264', preset='veryfast', crf=18,
+                acodec='aac', movflags='+faststart',
+                threads=max(1, (threads or self.ffmpeg_threads) // len(ranges))
+            ))
+        ffmpeg.run(ffmpeg.merge_outputs(*outputs), overwrite_output=True, quiet=True)
+    
+    def create_video_segments(self, input_path: str, ranges: List[Tuple[float, float]], output_dir: str,
+                              on_segment: Callable[[int, str], None],
+                              keyframes: Optional[List[float]] = None,
+                              metadata: Optional[Dict[str, Any]] = None) -> List[Optional[str]]:
+        """从同一源文件批量剪切片段
+        
+        源文件只下载一次并在处理期间固定在本地缓存中。能精确剪切的片段（区间内至少两个关键帧）
+        以流复制为主并发处理；其余短片段按时间邻近分组，每组一次 ffmpeg 调用输出多个文件，
+        只解码一遍组覆盖的范围，相距较远的片段各自定位后单独剪切。
+        每个片段完成后立即回调 on_segment(序号, 本地路径)，返回每个片段的本地路径，失败的片段为 None。
+        """
+        video_stream = (metadata or {}).get('video_stream')
+        can_smart_cut = keyframes and smart_cut_options(video_stream) is not None
+        output_paths: List[Optional[str]] = [None] * len(ranges)
+        
+        smart, grouped = [], []
+        for index, (start, end) in enumerate(ranges):
+            path = os.path.join(output_dir, f"segment_{index:05d}.mp4")
+            if can_smart_cut and plan_smart_cut(keyframes, start, end) is not None:
+                smart.append((index, start, end, path))
+            else:
+                grouped.append((index, start, end, path))
+        paths = {index: path for index, _, _, path in grouped}
+        groups = []
+        for group in group_ranges(
+            [(index, start, end) for index, start, end, _ in grouped],
+            settings.SEGMENT_BATCH_MAX_GAP, settings.SEGMENT_BATCH_MAX_SPAN, settings.SEGMENT_BATCH_GROUP_SIZE
+        ):
+            group = [(index, start, end, paths[index]) for index, start, end in group]
+            if len(group) == 1:
+                # 孤立的片段在输入端定位后单独剪切，不解码无关的范围
+                smart.extend(group)
+            else:
+                groups.append(group)
+        
+        # 并发的 ffmpeg 进程共享当前任务的线程预算
+        workers = max(1, min(settings.SEGMENT_BATCH_WORKERS, self.ffmpeg_threads))
+        threads = max(1, self.ffmpeg_threads // workers)
+        
+        with self.local_copy(input_path) as local_path:
+            # 按文件实际的流判断是否有音频，元数据缺失时不会丢掉音轨
+            has_audio = bool(ffmpeg.probe(local_path, select_streams='a').get('streams')) if groups else False
             
-            # 创建临时文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file_path)[1]) as temp_file:
-                temp_file.write(file_data)
-                temp_file_path = temp_file.name
+            def cut_one(item):
+                index, start, end, path = item
+                try:
+                    self._cut_segment(local_path, path, start, end, keyframes, video_stream, threads)
+                except Exception as e:
+                    print(f"创建视频片段失败 [{start}, {end}]: {e}")
+                    return
+                output_paths[index] = path
+                on_segment(index, path)
             
-            try:
-                # 使用ffmpeg提取音频信息
-                probe = ffmpeg.probe(temp_file_path)
-                
-                # 获取音频流信息
-                audio_stream = next((s for s in probe.get('streams', []) if s['codec_type'] == 'audio'), None)
-                if not audio_stream:
-                    raise Exception("未找到音频流")
+            def cut_group(group):
+                try:
+                    self._encode_ranges(
+                        local_path, [(start, end, path) for _, start, end, path in group],
+                        has_audio=has_audio, threads=threads
+                    )
+                except Exception as e:
+                    # 整组失败时逐个重试，避免一个片段影响整组
+                    print(f"批量剪切失败，逐个重试: {e}")
+                    for item in group:
+                        cut_one(item)
+                    return
+                for index, _, _, path in group:
+                    output_paths[index] = path
+                    on_segment(index, path)
+            
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(cut_one, item) for item in smart]
+                futures += [executor.submit(cut_group, group) for group in groups]
+                for future in futures:
+                    future.result()
+        
+        return output_paths
+    
+    def transcode_hls(self, file_path: str, output_prefix: str, metadata: Dict[str, Any],
+                      keyframes: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        """生成 HLS 码率阶梯
+        
+        所有档位由一次 ffmpeg 调用输出：源只解码一遍，split 后分别缩放和编码（线程预算按编码器数分摊），
+        完成后并发上传；对象布局为 {output_prefix}/master.m3u8 与 {output_prefix}/{档位}/index.m3u8、seg_%05d.ts。
+        重编码档位在分片边界强制关键帧；原始分辨率档位只在源关键帧落在同一网格上时流复制，保证各档位分片对齐。
+        """
+        segment_seconds = settings.HLS_SEGMENT_SECONDS
+        if keyframes is None and copyable_video(metadata.get('video_stream')):
+            keyframes = self.get_keyframes(file_path)
+        renditions = plan_renditions(
+            metadata, settings.HLS_LADDER, settings.HLS_AUDIO_BITRATE, settings.HLS_MAX_ENCODE_HEIGHT,
+            keyframes=keyframes, segment_seconds=segment_seconds
+        )
+        if not renditions:
+            return None
+        
+        encoded = [
+            rendition for rendition in renditions
+            if not rendition.get('audio_only') and not rendition.get('copy_video')
+        ]
+        threads = max(1, self.ffmpeg_threads // max(1, len(encoded)))
+        
+        def transcode(source: str, work_dir: str):
+            stream = ffmpeg.input(source)
+            videos = stream.video.filter_multi_output('split', len(encoded)) if encoded else None
+            outputs = []
+            for rendition in renditions:
+                rendition_dir = os.path.join(work_dir, rendition['name'])
+                os.makedirs(rendition_dir, exist_ok=True)
+                options = {
+                    'format': 'hls',
+                    'hls_time': segment_seconds,
+                    'hls_playlist_type': 'vod',
+                    'hls_segment_filename': os.path.join(rendition_dir, 'seg_%05d.ts'),
+                    'threads': threads,
+                }
                 
-                # 提取音频数据用于波形分析
-                # 这里可以添加更复杂的音频分析逻辑
+                if rendition.get('audio_only'):
+                    streams = [stream.audio]
+                    options.update(acodec='aac', audio_bitrate=rendition['audio_bitrate'], vn=None)
+                elif rendition.get('copy_video'):
+                    streams = [stream.video] + ([stream.audio] if rendition['has_audio'] else [])
+                    options.update(vcodec='copy')
+                else:
+                    video = videos[encoded.index(rendition)].filter('scale', rendition['width'], rendition['height'])
+                    streams = [video] + ([stream.audio] if rendition['has_audio'] else [])
+                    # 固定 GOP 使各档位的分片边界对齐，便于切换
+                    options.update(
+                        vcodec='libx264', preset='veryfast', pix_fmt='yuv420p',
+                        video_bitrate=rendition['video_bitrate'],
+                        maxrate=rendition['video_bitrate'], bufsize=rendition['video_bitrate'],
+                        force_key_frames=f"expr:gte(t,n_forced*{segment_seconds})",
+                        sc_threshold=0
+                    )
+                if rendition.get('has_audio') and not rendition.get('audio_only'):
+                    options.update(acodec='aac', audio_bitrate=rendition['audio_bitrate'], ac=2)
                 
-                waveform_data = {
-                    'sample_rate': int(audio_stream.get('sample_rate', 44100)),
-                    'channels': int(audio_stream.get('channels', 2)),
-                    'duration': float(probe['format']['duration']),
-                    'bit_rate': audio_stream.get('bit_rate'),
-                    'codec': audio_stream.get('codec_name')
-                }
+                outputs.append(ffmpeg.output(*streams, os.path.join(rendition_dir, 'index.m3u8'), **options))
+            ffmpeg.run(ffmpeg.merge_outputs(*outputs), overwrite_output=True, quiet=True)
+        
+        try:
+            with tempfile.TemporaryDirectory(prefix="hls_") as work_dir:
+                self._with_input(file_path, lambda source: transcode(source, work_dir))
                 
-                return waveform_data
+                with open(os.path.join(work_dir, 'master.m3u8'), 'w') as f:
+                    f.write(build_master_playlist(renditions))
                 
+                with UploadPool(self.minio_service, settings.MEDIA_UPLOAD_WORKERS) as pool:
+                    for root, _, files in os.walk(work_dir):
+                        for name in files:
+                            path = os.path.join(root, name)
+                            relative = os.path.relpath(path, work_dir).replace(os.sep, '/')
+                            pool.submit_file(
+                                path, f"{output_prefix}/{relative}",
+                                content_type_for(name) or "application/octet-stream"
+                            )
+            
+            return {
+                'master': f"{output_prefix}/master.m3u8",
+                'renditions': [rendition['name'] for rendition in renditions]
+            }
+                    
+        except Exception as e:
+            print(f"生成 HLS 档位失败: {e}")
+            return None
+    
+    def extract_audio_waveform(self, file_path: str, output_key: str) -> Optional[Dict[str, Any]]:
+        """提取音频波形峰值金字塔
+
+        ffmpeg 把音频解码为单声道 float32 PCM 写入管道，按块计算每个桶的 min/max，
+        内存中只保留峰值而不保留解码后的样本；结果以二进制对象写入 MinIO。
+        """
+        sample_rate = settings.WAVEFORM_SAMPLE_RATE
+        samples_per_peak = settings.WAVEFORM_SAMPLES_PER_PEAK
+        factor = settings.WAVEFORM_LEVEL_FACTOR
+        # 每次从管道读取 4096 个桶的样本
+        read_size = samples_per_peak * 4096 * 4
+        
+        def compute(source: str):
+            process = (
+                ffmpeg
+                .input(source)
+                .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=sample_rate,
+                        threads=self.ffmpeg_threads)
+                .run_async(pipe_stdout=True)
+            )
+            accumulator = PeakAccumulator(samples_per_peak)
+            pending = b""
+            try:
+                while True:
+                    chunk = process.stdout.read(read_size)
+                    if not chunk:
+                        break
+                    chunk = pending + chunk
+                    usable = len(chunk) - len(chunk) % 4
+                    pending = chunk[usable:]
+                    accumulator.feed(np.frombuffer(chunk[:usable], dtype='<f4'))
             finally:
-                # 清理临时文件
-                if os.path.exists(temp_file_path):
-                    os.unlink(temp_file_path)
+                process.stdout.close()
+                returncode = process.wait()
+            if returncode != 0:
+                # 抛出 ffmpeg.Error 以便 URL 输入失败时回退到本地文件
+                raise ffmpeg.Error('ffmpeg', None, None)
+            return accumulator.finish()
+        
+        try:
+            mins, maxs = self._with_input(file_path, compute)
+            if mins.size == 0:
+                raise Exception("未找到音频流")
+            
+            levels = build_levels(mins, maxs, factor, settings.WAVEFORM_MIN_PEAKS)
+            data = encode_pyramid(levels, sample_rate, samples_per_peak, factor)
+            self.minio_service.upload_bytes(data, output_key, "application/octet-stream")
+            
+            return {
+                'object_key': output_key,
+                'sample_rate': sample_rate,
+                'duration': mins.size * samples_per_peak / sample_rate,
+                'levels': [
+                    {'samples_per_peak': samples_per_peak * factor ** index, 'count': int(level[0].size)}
+                    for index, level in enumerate(levels)
+                ]
+            }
                     
         except Exception as e:
             print(f"提取音频波形失败: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    def generate_spectrogram(self, file_path: str, output_prefix: str) -> Optional[Dict[str, Any]]:
+        """生成多层级频谱图瓦片
+
+        ffmpeg 把音频解码为单声道 PCM 写入管道，按固定大小的块做 STFT，
+        瓦片生成后立即并发上传，内存占用与音频时长无关。瓦片对象为 {output_prefix}/{level}/{x}.png，
+        另写入 {output_prefix}/manifest.json 描述层级和瓦片数。
+        """
+        sample_rate = settings.SPECTROGRAM_SAMPLE_RATE
+        n_fft = settings.SPECTROGRAM_N_FFT
+        hop = settings.SPECTROGRAM_HOP
+        # 每次从管道读取 1024 列对应的样本
+        read_size = hop * 1024 * 4
+        
+        def compute(source: str) -> TileBuilder:
+            process = (
+                ffmpeg
+                .input(source)
+                .output('pipe:', format='f32le', acodec='pcm_f32le', ac=1, ar=sample_rate,
+                        threads=self.ffmpeg_threads)
+                .run_async(pipe_stdout=True)
+            )
+            stft = StreamingSTFT(n_fft, hop)
+            with UploadPool(self.minio_service, settings.MEDIA_UPLOAD_WORKERS) as pool:
+                builder = TileBuilder(
+                    settings.SPECTROGRAM_TILE_WIDTH,
+                    settings.SPECTROGRAM_LEVELS,
+                    settings.SPECTROGRAM_DB_FLOOR,
+                    lambda level, x, data: pool.submit(data, f"{output_prefix}/{level}/{x}.png", "image/png")
+                )
+                pending = b""
+                try:
+                    while True:
+                        chunk = process.stdout.read(read_size)
+                        if not chunk:
+                            break
+                        chunk = pending + chunk
+                        usable = len(chunk) - len(chunk) % 4
+                        pending = chunk[usable:]
+                        builder.add(stft.feed(np.frombuffer(chunk[:usable], dtype='<f4')))
+                finally:
+                    process.stdout.close()
+                    returncode = process.wait()
+                if returncode != 0:
+                    raise ffmpeg.Error('ffmpeg', None, None)
+                builder.finish()
+            return builder
+        
+        try:
+            builder = self._with_input(file_path, compute)
+            if builder.columns[0] == 0:
+                raise Exception("未找到音频流")
+            
+            manifest = {
+                'prefix': output_prefix,
+                'sample_rate': sample_rate,
+                'n_fft': n_fft,
+                'hop': hop,
+                'frequency_bins': n_fft // 2,
+                'tile_width': settings.SPECTROGRAM_TILE_WIDTH,
+                'db_floor': settings.SPECTROGRAM_DB_FLOOR,
+                'levels': [
+                    {
+                        'level': level,
+                        'seconds_per_column': hop * 2 ** level / sample_rate,
+                        'columns': builder.columns[level],
+                        'tiles': builder.tile_counts[level]
+                    }
+                    for level in range(settings.SPECTROGRAM_LEVELS)
+                    if builder.tile_counts[level]
+                ]
+            }
+            self.minio_service.upload_bytes(
+                json.dumps(manifest).encode('utf-8'), f"{output_prefix}/manifest.json", "application/json"
+            )
+            return manifest
+                    
+        except Exception as e:
+            print(f"生成频谱图失败: {e}")
+            return None
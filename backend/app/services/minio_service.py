@@ -1,48 +1,156 @@
 from minio import Minio
 from minio.error import S3Error
+from minio.datatypes import Part
+from minio.deleteobjects import DeleteObject
+from urllib3.connection import HTTPConnection
 from app.core.config import settings
-import io
-from typing import Optional
+from typing import Optional, List, Tuple
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+import certifi
+import os
+import socket
+import threading
+import urllib3
 
-class MinioService:
-    def __init__(self):
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
+# 进程内共享的客户端（按 pid 区分，Celery prefork 子进程 fork 后重新创建连接池）
+_clients = {}
+_clients_pid = None
+
+def _create_http_client() -> urllib3.PoolManager:
+    """创建带连接池、keep-alive 和重试退避的 HTTP 客户端"""
+    return urllib3.PoolManager(
+        num_pools=4,
+        maxsize=settings.MINIO_POOL_MAXSIZE,
+        timeout=urllib3.util.Timeout(
+            connect=settings.MINIO_CONNECT_TIMEOUT, read=settings.MINIO_READ_TIMEOUT
+        ),
+        retries=urllib3.Retry(
+            total=settings.MINIO_RETRY_TOTAL,
+            backoff_factor=settings.MINIO_RETRY_BACKOFF,
+            status_forcelist=[500, 502, 503, 504]
+        ),
+        socket_options=HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        ],
+        cert_reqs="CERT_REQUIRED",
+        ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where()
+    )
+
+def get_minio_client(public: bool = False) -> Minio:
+    """获取当前进程共享的 MinIO 客户端
+
+    public 为 True 时返回以 MINIO_PUBLIC_ENDPOINT 为地址的客户端，只用于生成预签名URL
+    （指定 region，签名时不访问网络）。
+    """
+    global _clients_pid
+    if _clients_pid != os.getpid():
+        _clients.clear()
+        _clients_pid = os.getpid()
+
+    if public and not settings.MINIO_PUBLIC_ENDPOINT:
+        public = False
+    if public not in _clients:
+        _clients[public] = Minio(
+            settings.MINIO_PUBLIC_ENDPOINT if public else settings.MINIO_ENDPOINT,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE
+            secure=settings.MINIO_PUBLIC_SECURE if public else settings.MINIO_SECURE,
+            region=settings.MINIO_REGION,
+            http_client=_create_http_client()
         )
+    return _clients[public]
+
+def ensure_bucket_exists():
+    """确保存储桶存在（在 API 和 worker 启动时执行一次）"""
+    client = get_minio_client()
+    try:
+        if not client.bucket_exists(settings.MINIO_BUCKET_NAME):
+            client.make_bucket(settings.MINIO_BUCKET_NAME)
+    except S3Error as e:
+        print(f"创建存储桶失败: {e}")
+
+class MinioService:
+    def __init__(self):
+        # 复用进程级客户端，构造本身不产生网络请求
+        self.client = get_minio_client()
         self.bucket_name = settings.MINIO_BUCKET_NAME
-        self._ensure_bucket_exists()
     
-    def _ensure_bucket_exists(self):
-        """确保存储桶存在"""
-        try:
-            if not self.client.bucket_exists(self.bucket_name):
-                self.client.make_bucket(self.bucket_name)
-        except S3Error as e:
-            print(f"创建存储桶失败: {e}")
+    @property
+    def public_client(self) -> Minio:
+        """用于生成客户端可访问的预签名URL"""
+        return get_minio_client(public=True)
     
-    def upload_file(self, file_obj, object_name: str, content_type: str = "application/octet-stream"):
-        """上传文件到MinIO"""
+    def upload_file(self, file_obj, object_name: str, content_type: str = "application/octet-stream",
+                    length: int = -1):
+        """流式上传文件到MinIO
+
+        按 MINIO_PART_SIZE 分片读取并以 multipart 方式上传，单次上传只在内存中保留一个分片。
+        length 未知时传 -1。
+        """
         try:
-            # 读取文件内容
-            file_data = file_obj.read()
-            file_obj.seek(0)  # 重置文件指针
-            
-            # 上传文件
             self.client.put_object(
                 self.bucket_name,
                 object_name,
-                io.BytesIO(file_data),
-                length=len(file_data),
-                content_type=content_type
+                file_obj,
+                length=length,
+                content_type=content_type or "application/octet-stream",
+                part_size=settings.MINIO_PART_SIZE,
+                num_parallel_uploads=1
             )
             return True
         except S3Error as e:
             print(f"上传文件失败: {e}")
             raise e
     
+    def upload_bytes(self, data: bytes, object_name: str, content_type: str = "application/octet-stream"):
+        """上传内存中的对象（bytes / bytearray / memoryview），按分片切片读取，不复制整个缓冲区"""
+        return self.upload_file(BufferReader(data), object_name, content_type, length=len(data))
+    
+    def create_multipart_upload(self, object_name: str, content_type: str = "application/octet-stream") -> str:
+        """创建分片上传，返回 upload_id"""
+        try:
+            return self.client._create_multipart_upload(
+                self.bucket_name,
+                object_name,
+                {"Content-Type": content_type or "application/octet-stream"}
+            )
+        except S3Error as e:
+            print(f"创建分片上传失败: {e}")
+            raise e
+    
+    def upload_part(self, object_name: str, upload_id: str, part_number: int, data: bytes) -> str:
+        """上传单个分片，返回分片 etag"""
+        try:
+            return self.client._upload_part(
+                self.bucket_name, object_name, data, None, upload_id, part_number
+            )
+        except S3Error as e:
+            print(f"上传分片失败: {e}")
+            raise e
+    
+    def complete_multipart_upload(self, object_name: str, upload_id: str, parts: List[Tuple[int, str]]):
+        """在服务端合并分片，parts 为按序排列的 (part_number, etag)"""
+        try:
+            return self.client._complete_multipart_upload(
+                self.bucket_name,
+                object_name,
+                upload_id,
+                [Part(part_number, etag) for part_number, etag in parts]
+            )
+        except S3Error as e:
+            print(f"合并分片失败: {e}")
+            raise e
+    
+    def abort_multipart_upload(self, object_name: str, upload_id: str) -> bool:
+        """取消分片上传并释放已上传的分片"""
+        try:
+            self.client._abort_multipart_upload(self.bucket_name, object_name, upload_id)
+            return True
+        except S3Error as e:
+            print(f"取消分片上传失败: {e}")
+            return False
+    
     def download_file(self, object_name: str) -> Optional[bytes]:
         """从MinIO下载文件"""
         try:
@@ -52,18 +160,63 @@ class MinioService:
             print(f"下载文件失败: {e}")
             return None
     
-    def get_file_url(self, object_name: str, expires: int = 3600) -> Optional[str]:
-        """获取文件的预签名URL"""
+    def download_to_path(self, object_name: str, file_path: str, tmp_file_path: Optional[str] = None):
+        """流式下载对象到本地文件（先写临时文件再重命名）"""
         try:
-            return self.client.presigned_get_object(
+            return self.client.fget_object(
+                self.bucket_name, object_name, file_path, tmp_file_path=tmp_file_path
+            )
+        except S3Error as e:
+            print(f"下载文件失败: {e}")
+            raise e
+    
+    def read_range(self, object_name: str, offset: int, length: int) -> bytes:
+        """读取对象的指定字节范围"""
+        response = self.client.get_object(self.bucket_name, object_name, offset=offset, length=length)
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def iter_file(self, object_name: str, chunk_size: int = 1024 * 1024):
+        """按块流式读取对象内容"""
+        response = self.client.get_object(self.bucket_name, object_name)
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+    
+    def get_file_url(self, object_name: str, expires: int = 3600, public: bool = False) -> Optional[str]:
+        """获取文件的预签名URL
+
+        public 为 True 时使用 MINIO_PUBLIC_ENDPOINT 签名，供浏览器直接访问。
+        """
+        client = self.public_client if public else self.client
+        try:
+            return client.presigned_get_object(
                 self.bucket_name,
                 object_name,
-                expires=expires
+                expires=timedelta(seconds=expires)
             )
         except S3Error as e:
             print(f"生成预签名URL失败: {e}")
             return None
     
+    def get_upload_url(self, object_name: str, expires: int = 3600) -> Optional[str]:
+        """获取客户端直传用的预签名PUT URL"""
+        try:
+            return self.public_client.presigned_put_object(
+                self.bucket_name,
+                object_name,
+                expires=timedelta(seconds=expires)
+            )
+        except S3Error as e:
+            print(f"生成预签名上传URL失败: {e}")
+            return None
+    
     def delete_file(self, object_name: str) -> bool:
         """删除文件"""
         try:
@@ -73,6 +226,21 @@ class MinioService:
             print(f"删除文件失败: {e}")
             return False
     
+    def delete_prefix(self, prefix: str) -> int:
+        """批量删除前缀下的所有对象，返回删除数量"""
+        names = self.list_files(prefix)
+        if not names:
+            return 0
+        errors = self.client.remove_objects(
+            self.bucket_name, (DeleteObject(name) for name in names)
+        )
+        # remove_objects 惰性执行，遍历结果时才真正发送删除请求
+        failed = 0
+        for error in errors:
+            failed += 1
+            print(f"删除文件失败: {error}")
+        return len(names) - failed
+    
     def list_files(self, prefix: str = "", recursive: bool = True) -> list:
         """列出文件"""
         try:
@@ -86,10 +254,78 @@ class MinioService:
             print(f"列出文件失败: {e}")
             return []
     
+    def stat_file(self, object_name: str):
+        """获取对象信息，不存在时返回 None"""
+        try:
+            return self.client.stat_object(self.bucket_name, object_name)
+        except S3Error:
+            return None
+    
     def file_exists(self, object_name: str) -> bool:
         """检查文件是否存在"""
         try:
             self.client.stat_object(self.bucket_name, object_name)
             return True
         except S3Error:
-            return False
\ No newline at end of file
+            return False
+
+class BufferReader:
+    """内存缓冲区的只读文件接口，每次 read 只复制请求的部分"""
+    
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+    
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size is None or size < 0 else min(self._position + size, len(self._view))
+        chunk = self._view[self._position:end].tobytes()
+        self._position = end
+        return chunk
+
+class UploadPool:
+    """有界并发上传小对象：在途任务达到上限时阻塞提交方，生产与上传并行进行"""
+    
+    def __init__(self, minio_service: MinioService, max_workers: int, max_pending: Optional[int] = None):
+        self.minio_service = minio_service
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.semaphore = threading.BoundedSemaphore(max_pending or max_workers * 4)
+        self.errors = []
+        self.uploaded = 0
+    
+    def submit(self, data: bytes, object_name: str, content_type: str = "application/octet-stream"):
+        self.semaphore.acquire()
+        future = self.executor.submit(self.minio_service.upload_bytes, data, object_name, content_type)
+        future.add_done_callback(self._done)
+    
+    def submit_file(self, file_path: str, object_name: str, content_type: str = "application/octet-stream"):
+        """上传本地文件（适用于不便整体读入内存的对象）"""
+        self.semaphore.acquire()
+        future = self.executor.submit(self._upload_path, file_path, object_name, content_type)
+        future.add_done_callback(self._done)
+    
+    def _upload_path(self, file_path: str, object_name: str, content_type: str):
+        with open(file_path, "rb") as f:
+            return self.minio_service.upload_file(f, object_name, content_type, length=os.path.getsize(file_path))
+    
+    def _done(self, future):
+        self.semaphore.release()
+        if future.exception() is not None:
+            self.errors.append(future.exception())
+        else:
+            self.uploaded += 1
+    
+    def close(self):
+        """等待全部上传完成，有失败时抛出第一个异常"""
+        self.executor.shutdown(wait=True)
+        if self.errors:
+            raise self.errors[0]
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.executor.shutdown(wait=True)
+            return False
+        self.close()
+        return False
\ No newline at end of file
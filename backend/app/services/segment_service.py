@@ -0,0 +1,120 @@
+import bisect
+from typing import Any, Dict, List, Optional, Tuple
+
+# 可以与原视频流直接拼接的重编码器（编码格式需与流复制部分一致）
+SMART_CUT_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+}
+
+# ffprobe 报告的 profile 名 -> 编码器的 profile 参数；不在表中的 profile 不做精确剪切
+ENCODER_PROFILES = {
+    "h264": {
+        "Constrained Baseline": "baseline",
+        "Baseline": "baseline",
+        "Main": "main",
+        "High": "high",
+        "High 10": "high10",
+        "High 4:2:2": "high422",
+        "High 4:4:4 Predictive": "high444",
+    },
+    "hevc": {
+        "Main": "main",
+        "Main 10": "main10",
+    },
+}
+
+# 拼接结果必须与源视频流一致的属性
+MATCHED_STREAM_FIELDS = ("codec_name", "profile", "level", "pix_fmt", "width", "height")
+
+# 时间比较容差（秒），小于该值的边缘片段不单独编码
+EPSILON = 0.001
+
+# 拼接结果的时长与预期相差超过该值（秒）时视为失败
+DURATION_TOLERANCE = 0.1
+
+def smart_cut_options(video_stream: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """边缘 GOP 的编码参数：编码器、profile、level、像素格式、参考帧数与源视频流一致
+
+    这些参数任一未知时返回 None，不做精确剪切（编码器默认值与源不一致时拼接结果无法正常解码）。
+    """
+    video_stream = video_stream or {}
+    codec_name = video_stream.get("codec_name")
+    profile = ENCODER_PROFILES.get(codec_name, {}).get(video_stream.get("profile"))
+    level = video_stream.get("level")
+    pix_fmt = video_stream.get("pix_fmt")
+    if profile is None or not isinstance(level, int) or level <= 0 or not pix_fmt \
+            or track_timescale(video_stream) is None:
+        return None
+
+    options = {"vcodec": SMART_CUT_ENCODERS[codec_name], "pix_fmt": pix_fmt, "profile:v": profile}
+    refs = video_stream.get("refs")
+    if codec_name == "h264":
+        # ffprobe 的 H.264 level 为 level_idc（如 40 表示 4.0）
+        options["level"] = f"{level // 10}.{level % 10}"
+        if refs:
+            options["refs"] = refs
+    else:
+        # HEVC 的 level 为 general_level_idc，等于 level 的 30 倍
+        x265_params = [f"level-idc={level / 30:.1f}"]
+        if refs:
+            x265_params.append(f"ref={refs}")
+        options["x265-params"] = ":".join(x265_params)
+    return options
+
+def track_timescale(video_stream: Optional[Dict[str, Any]]) -> Optional[int]:
+    """源视频流的时间基分母（如 1/12800 -> 12800），用作输出文件的轨道时间刻度"""
+    time_base = (video_stream or {}).get("time_base") or ""
+    numerator, _, denominator = time_base.partition("/")
+    if numerator != "1" or not denominator.isdigit() or int(denominator) <= 0:
+        return None
+    return int(denominator)
+
+def stream_matches(source: Optional[Dict[str, Any]], output: Optional[Dict[str, Any]]) -> bool:
+    """拼接结果的视频流与源视频流的编码参数是否一致"""
+    if not source or not output:
+        return False
+    return all(source.get(field) == output.get(field) for field in MATCHED_STREAM_FIELDS)
+
+def plan_smart_cut(keyframes: List[float], start_time: float, end_time: float) -> Optional[List[Tuple[str, float, float]]]:
+    """规划精确剪切：返回 [(方式, 起点, 终点)]，方式为 encode 或 copy
+
+    区间内第一个关键帧之前和最后一个关键帧之后的不完整 GOP 重编码，中间完整的 GOP 流复制。
+    区间内不足两个关键帧时返回 None，由调用方整段重编码。
+    """
+    first = bisect.bisect_left(keyframes, start_time - EPSILON)
+    last = bisect.bisect_right(keyframes, end_time + EPSILON) - 1
+    if first >= len(keyframes) or last < first:
+        return None
+    copy_start = keyframes[first]
+    copy_end = keyframes[last]
+    if copy_end - copy_start < EPSILON:
+        return None
+
+    plan = []
+    if copy_start - start_time > EPSILON:
+        plan.append(("encode", start_time, copy_start))
+    plan.append(("copy", copy_start, copy_end))
+    if end_time - copy_end > EPSILON:
+        plan.append(("encode", copy_end, end_time))
+    return plan
+
+def group_ranges(items: List[Tuple[Any, float, float]], max_gap: float, max_span: float,
+                 max_size: int) -> List[List[Tuple[Any, float, float]]]:
+    """把 (标识, 起点, 终点) 按时间邻近分组，每组由一次 ffmpeg 调用解码覆盖的范围
+
+    按起点排序后，与组内已覆盖范围的间隔超过 max_gap、组的总跨度超过 max_span
+    或组内片段数达到 max_size 时开始新组。只有一个片段的组应由调用方单独剪切。
+    """
+    groups: List[List[Tuple[Any, float, float]]] = []
+    group_start = group_end = 0.0
+    for item in sorted(items, key=lambda item: (item[1], item[2])):
+        _, start, end = item
+        if groups and len(groups[-1]) < max_size and start - group_end <= max_gap \
+                and max(end, group_end) - group_start <= max_span:
+            groups[-1].append(item)
+            group_end = max(group_end, end)
+        else:
+            groups.append([item])
+            group_start, group_end = start, end
+    return groups
@@ -0,0 +1,99 @@
+import io
+from typing import Callable, List, Optional
+import numpy as np
+from PIL import Image
+
+class StreamingSTFT:
+    """对分块到达的 PCM 样本做向量化 STFT，只保留不足一帧的尾部样本"""
+
+    def __init__(self, n_fft: int, hop: int):
+        self.n_fft = n_fft
+        self.hop = hop
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self._buffer = np.empty(0, dtype=np.float32)
+
+    def feed(self, samples: np.ndarray) -> np.ndarray:
+        """返回新产生的列，形状为 (列数, n_fft // 2)，单位 dB"""
+        buffer = np.concatenate([self._buffer, samples]) if self._buffer.size else samples
+        if buffer.size < self.n_fft:
+            self._buffer = buffer.copy()
+            return np.empty((0, self.n_fft // 2), dtype=np.float32)
+
+        frame_count = 1 + (buffer.size - self.n_fft) // self.hop
+        frames = np.lib.stride_tricks.sliding_window_view(buffer, self.n_fft)[::self.hop][:frame_count]
+        spectrum = np.abs(np.fft.rfft(frames * self.window, axis=1))[:, :self.n_fft // 2]
+        self._buffer = buffer[frame_count * self.hop:].copy()
+        # 幅度归一化后转为 dB
+        return 20.0 * np.log10(spectrum * (2.0 / self.window.sum()) + 1e-10)
+
+class TileBuilder:
+    """把频谱列按多个缩放层级切成固定宽度的瓦片
+
+    第 0 层每列对应一个 hop，第 k 层每列由第 k-1 层相邻两列取最大值得到。
+    每层只缓存不足一个瓦片的列，内存占用与音频长度无关。
+    """
+
+    def __init__(self, tile_width: int, level_count: int, db_floor: float,
+                 on_tile: Callable[[int, int, bytes], None]):
+        self.tile_width = tile_width
+        self.level_count = level_count
+        self.db_floor = db_floor
+        self.on_tile = on_tile
+        self._pending: List[List[np.ndarray]] = [[] for _ in range(level_count)]
+        self._pending_columns = [0] * level_count
+        self._carry: List[Optional[np.ndarray]] = [None] * level_count
+        self._tile_index = [0] * level_count
+        self.columns = [0] * level_count
+
+    def quantize(self, columns_db: np.ndarray) -> np.ndarray:
+        """[db_floor, 0] dB 线性量化为 0~255"""
+        scaled = (columns_db - self.db_floor) * (255.0 / -self.db_floor)
+        return np.clip(scaled, 0, 255).astype(np.uint8)
+
+    def add(self, columns: np.ndarray, level: int = 0):
+        if columns.size == 0 or level >= self.level_count:
+            return
+        self.columns[level] += columns.shape[0]
+        self._pending[level].append(columns)
+        self._pending_columns[level] += columns.shape[0]
+        if self._pending_columns[level] >= self.tile_width:
+            merged = np.concatenate(self._pending[level])
+            full = merged.shape[0] - merged.shape[0] % self.tile_width
+            for start in range(0, full, self.tile_width):
+                self._emit(level, merged[start:start + self.tile_width])
+            rest = merged[full:]
+            self._pending[level] = [rest] if rest.shape[0] else []
+            self._pending_columns[level] = rest.shape[0]
+
+        # 相邻两列合并后送入下一层
+        if self._carry[level] is not None:
+            columns = np.concatenate([self._carry[level], columns])
+            self._carry[level] = None
+        if columns.shape[0] % 2:
+            self._carry[level] = columns[-1:]
+            columns = columns[:-1]
+        if columns.shape[0]:
+            self.add(np.maximum(columns[0::2], columns[1::2]), level + 1)
+
+    def finish(self):
+        for level in range(self.level_count):
+            if self._carry[level] is not None:
+                carry = self._carry[level]
+                self._carry[level] = None
+                self.add(carry, level + 1)
+            if self._pending_columns[level]:
+                self._emit(level, np.concatenate(self._pending[level]))
+                self._pending[level] = []
+                self._pending_columns[level] = 0
+
+    def _emit(self, level: int, tile: np.ndarray):
+        # 图像横轴为时间，纵轴为频率（低频在下）
+        image = Image.fromarray(np.ascontiguousarray(np.flipud(self.quantize(tile).T)), mode="L")
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        self.on_tile(level, self._tile_index[level], buffer.getvalue())
+        self._tile_index[level] += 1
+
+    @property
+    def tile_counts(self) -> List[int]:
+        return list(self._tile_index)
@@ -0,0 +1,106 @@
+import struct
+from typing import Dict, Any, List, Tuple
+import numpy as np
+
+# 峰值金字塔二进制格式（小端）：
+#   头部: magic(4s) version(H) level_count(H) sample_rate(I) base_samples_per_peak(I) factor(I)
+#   层级表: 每层 samples_per_peak(I) peak_count(I) data_offset(Q)
+#   数据: 每层依次存放 int8 的 [min, max] 交替序列
+MAGIC = b"WFPK"
+VERSION = 1
+HEADER_FORMAT = "<4sHHIII"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+LEVEL_FORMAT = "<IIQ"
+LEVEL_SIZE = struct.calcsize(LEVEL_FORMAT)
+MAX_LEVELS = 16
+# 读取头部时一次取足层级表
+HEADER_READ_SIZE = HEADER_SIZE + LEVEL_SIZE * MAX_LEVELS
+
+def _quantize(values: np.ndarray) -> np.ndarray:
+    """[-1, 1] 浮点样本量化为 int8"""
+    return np.clip(np.round(values * 127.0), -128, 127).astype(np.int8)
+
+class PeakAccumulator:
+    """流式计算最细层级的 min/max 峰值，只保留不足一个桶的尾部样本"""
+
+    def __init__(self, samples_per_peak: int):
+        self.samples_per_peak = samples_per_peak
+        self._remainder = np.empty(0, dtype=np.float32)
+        self._mins: List[np.ndarray] = []
+        self._maxs: List[np.ndarray] = []
+
+    def feed(self, samples: np.ndarray):
+        if self._remainder.size:
+            samples = np.concatenate([self._remainder, samples])
+        usable = samples.size - samples.size % self.samples_per_peak
+        if usable:
+            buckets = samples[:usable].reshape(-1, self.samples_per_peak)
+            self._mins.append(_quantize(buckets.min(axis=1)))
+            self._maxs.append(_quantize(buckets.max(axis=1)))
+        self._remainder = samples[usable:].copy()
+
+    def finish(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._remainder.size:
+            self._mins.append(_quantize(np.array([self._remainder.min()])))
+            self._maxs.append(_quantize(np.array([self._remainder.max()])))
+            self._remainder = np.empty(0, dtype=np.float32)
+        if not self._mins:
+            return np.empty(0, dtype=np.int8), np.empty(0, dtype=np.int8)
+        return np.concatenate(self._mins), np.concatenate(self._maxs)
+
+def build_levels(mins: np.ndarray, maxs: np.ndarray, factor: int, min_peaks: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """由最细层级逐级合并生成金字塔，直到峰值数不超过 min_peaks"""
+    levels = [(mins, maxs)]
+    while levels[-1][0].size > min_peaks and len(levels) < MAX_LEVELS:
+        level_mins, level_maxs = levels[-1]
+        pad = (-level_mins.size) % factor
+        if pad:
+            level_mins = np.concatenate([level_mins, np.full(pad, level_mins[-1], dtype=np.int8)])
+            level_maxs = np.concatenate([level_maxs, np.full(pad, level_maxs[-1], dtype=np.int8)])
+        levels.append((
+            level_mins.reshape(-1, factor).min(axis=1),
+            level_maxs.reshape(-1, factor).max(axis=1)
+        ))
+    return levels
+
+def encode_pyramid(levels: List[Tuple[np.ndarray, np.ndarray]], sample_rate: int,
+                   base_samples_per_peak: int, factor: int) -> bytes:
+    """编码为紧凑的二进制对象"""
+    header = struct.pack(HEADER_FORMAT, MAGIC, VERSION, len(levels), sample_rate, base_samples_per_peak, factor)
+    offset = HEADER_SIZE + LEVEL_SIZE * len(levels)
+    table = b""
+    data = []
+    for index, (mins, maxs) in enumerate(levels):
+        table += struct.pack(LEVEL_FORMAT, base_samples_per_peak * factor ** index, mins.size, offset)
+        interleaved = np.empty(mins.size * 2, dtype=np.int8)
+        interleaved[0::2] = mins
+        interleaved[1::2] = maxs
+        data.append(interleaved.tobytes())
+        offset += interleaved.size
+    return header + table + b"".join(data)
+
+def parse_header(data: bytes) -> Dict[str, Any]:
+    """解析头部和层级表"""
+    magic, version, level_count, sample_rate, base_samples_per_peak, factor = struct.unpack_from(HEADER_FORMAT, data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("无效的波形文件")
+    levels = []
+    for index in range(level_count):
+        samples_per_peak, count, offset = struct.unpack_from(LEVEL_FORMAT, data, HEADER_SIZE + LEVEL_SIZE * index)
+        levels.append({"samples_per_peak": samples_per_peak, "count": count, "offset": offset})
+    return {
+        "sample_rate": sample_rate,
+        "base_samples_per_peak": base_samples_per_peak,
+        "factor": factor,
+        "levels": levels
+    }
+
+def select_level(header: Dict[str, Any], t0: float, t1: float, width: int) -> int:
+    """选择窗口内峰值数不少于 width 的最粗层级"""
+    sample_rate = header["sample_rate"]
+    levels = header["levels"]
+    for index in range(len(levels) - 1, -1, -1):
+        peaks_in_window = (t1 - t0) * sample_rate / levels[index]["samples_per_peak"]
+        if peaks_in_window >= width:
+            return index
+    return 0
@@ -1,7 +1,8 @@
 from celery import shared_task
 from app.core.celery_app import celery_app
 from app.core.database import SessionLocal, Annotation, MediaFile, Project
-from sqlalchemy import func
+from sqlalchemy import func, update
+from app.services.geometry_service import SPATIAL_TYPES, bbox_columns
 import json
 from datetime import datetime
 
@@ -200,4 +201,42 @@ def cleanup_old_annotations(days: int = 30):
         db.rollback()
         return {"error": f"清理失败: {str(e)}"}
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@shared_task
+def backfill_annotation_bboxes(batch_size: int = 1000):
+    """为尚未计算包围盒的空间类型标注补算包围盒（按 id 分批，可重复执行）"""
+    db = SessionLocal()
+    try:
+        last_id = 0
+        updated_count = 0
+        while True:
+            rows = db.query(Annotation.id, Annotation.annotation_type, Annotation.data).filter(
+                Annotation.id > last_id,
+                Annotation.annotation_type.in_(sorted(SPATIAL_TYPES)),
+                Annotation.x_min.is_(None)
+            ).order_by(Annotation.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            
+            updates = []
+            for annotation_id, annotation_type, data in rows:
+                columns = bbox_columns(annotation_type, data)
+                if columns["x_min"] is not None:
+                    updates.append({"id": annotation_id, **columns})
+            if updates:
+                db.execute(update(Annotation), updates)
+                db.commit()
+                updated_count += len(updates)
+        
+        return {
+            "success": True,
+            "updated_count": updated_count
+        }
+        
+    except Exception as e:
+        db.rollback()
+        return {"error": f"补算包围盒失败: {str(e)}"}
+    finally:
+        db.close()
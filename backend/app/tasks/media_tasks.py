@@ -1,45 +1,73 @@
-from celery import shared_task
+from celery import shared_task, group
 from app.core.celery_app import celery_app
 from app.services.media_service import MediaService
-from app.services.minio_service import MinioService
-from app.core.database import SessionLocal, MediaFile
+from app.services.minio_service import MinioService, UploadPool
+from app.services.artifact_service import (
+    ArtifactBusy, ArtifactStore, frames_params, segment_params, waveform_params
+)
+from app.services.ingest_service import IngestPipeline, resolve_stages
+from app.services import job_scheduler
+from app.core.database import SessionLocal, MediaFile, Annotation, VideoSegment, Project
 import os
+import tempfile
+from typing import List, Optional
+from app.core.config import settings
 
-@shared_task
-def process_media_file(media_file_id: int):
-    """处理媒体文件（获取信息、提取帧等）"""
+def _retry_later(task, **kwargs):
+    """相同的派生结果正由其他 worker 计算：稍后重试，不占用 worker 等待"""
+    return task.retry(
+        countdown=settings.ARTIFACT_RETRY_COUNTDOWN, max_retries=settings.ARTIFACT_MAX_RETRIES, **kwargs
+    )
+
+def _can_retry(task) -> bool:
+    return task.request.retries < settings.ARTIFACT_MAX_RETRIES
+
+@shared_task(bind=True)
+def ingest_media_file(self, media_file_id: int):
+    """媒体入库流水线：获取一次源文件，依次去重、探测，再并发生成各派生结果
+
+    有阶段的结果正由其他 worker 计算时，任务稍后重试并复用其结果。
+    """
     db = SessionLocal()
     try:
         media_file = db.query(MediaFile).filter(MediaFile.id == media_file_id).first()
         if not media_file:
             return {"error": "媒体文件不存在"}
         
-        media_service = MediaService()
-        
-        # 获取媒体信息
         try:
-            duration, metadata = media_service.get_media_info(media_file.file_path)
-            
-            # 更新数据库中的媒体信息
-            media_file.duration = duration
-            media_file.metadata = metadata
-            db.commit()
-            
-            return {
-                "success": True,
-                "media_file_id": media_file_id,
-                "duration": duration,
-                "metadata": metadata
-            }
+            result = IngestPipeline(db, media_file).run()
         except Exception as e:
-            return {"error": f"处理媒体文件失败: {str(e)}"}
+            db.rollback()
+            if media_file.processing_status != "ready":
+                media_file.processing_status = "failed"
+                db.commit()
+            return {"error": f"媒体入库失败: {str(e)}"}
+        
+        if result["deferred"] and _can_retry(self):
+            raise _retry_later(self)
+        return result
             
     finally:
         db.close()
 
 @shared_task
-def extract_video_frames(media_file_id: int, fps: int = 1):
-    """提取视频帧"""
+def process_media_file(media_file_id: int):
+    """处理媒体文件（保留旧任务名，已排队的任务按成本转交入库流水线）"""
+    db = SessionLocal()
+    try:
+        media_file = db.query(MediaFile).filter(MediaFile.id == media_file_id).first()
+        if not media_file:
+            return {"error": "媒体文件不存在"}
+        
+        task = ingest_signature(db, media_file).apply_async()
+        return {"success": True, "media_file_id": media_file_id, "task_id": task.id}
+        
+    finally:
+        db.close()
+
+@shared_task(bind=True)
+def extract_video_frames(self, media_file_id: int, fps: int = 1, output_format: Optional[str] = None):
+    """提取视频帧（output_format: pack 或 files，默认取配置）"""
     db = SessionLocal()
     try:
         media_file = db.query(MediaFile).filter(MediaFile.id == media_file_id).first()
@@ -49,48 +77,35 @@ def extract_video_frames(media_file_id: int, fps: int = 1):
         if media_file.media_type != "video":
             return {"error": "不是视频文件"}
         
-        media_service = MediaService()
+        output_format = output_format or settings.FRAME_OUTPUT_FORMAT
+        if output_format not in ("pack", "files"):
+            return {"error": f"不支持的输出格式: {output_format}"}
         
-        # 创建临时目录
-        temp_dir = f"/tmp/frames_{media_file_id}"
-        os.makedirs(temp_dir, exist_ok=True)
+        media_service = MediaService()
         
+        # 帧对象可能有数千个，结果中只返回清单对象名；相同内容、相同参数已提取过时直接复用
         try:
-            # 提取帧
-            frame_files = media_service.extract_frames(media_file.file_path, temp_dir, fps)
-            
-            # 上传帧到MinIO
-            minio_service = MinioService()
-            uploaded_frames = []
-            
-            for frame_file in frame_files:
-                frame_name = os.path.basename(frame_file)
-                minio_path = f"frames/{media_file_id}/{frame_name}"
-                
-                with open(frame_file, 'rb') as f:
-                    minio_service.upload_file(f, minio_path, "image/jpeg")
-                
-                uploaded_frames.append(minio_path)
-            
-            return {
-                "success": True,
-                "media_file_id": media_file_id,
-                "frame_count": len(uploaded_frames),
-                "frames": uploaded_frames
-            }
-            
-        finally:
-            # 清理临时目录
-            import shutil
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
+            result = ArtifactStore(db).get_or_compute(
+                media_file, "frames", frames_params(fps, output_format),
+                lambda prefix: media_service.extract_frames(media_file.file_path, prefix, fps, output_format)
+            )
+        except ArtifactBusy:
+            raise _retry_later(self)
+        if result is None:
+            return {"error": "提取视频帧失败"}
+        
+        return {
+            "success": True,
+            "media_file_id": media_file_id,
+            **result
+        }
                 
     finally:
         db.close()
 
-@shared_task
-def create_video_segment(media_file_id: int, start_time: float, end_time: float):
-    """创建视频片段"""
+@shared_task(bind=True)
+def create_video_segment(self, media_file_id: int, start_time: float, end_time: float):
+    """创建视频片段（相同区间已剪切过时直接返回）"""
     db = SessionLocal()
     try:
         media_file = db.query(MediaFile).filter(MediaFile.id == media_file_id).first()
@@ -103,42 +118,209 @@ def create_video_segment(media_file_id: int, start_time: float, end_time: float)
         media_service = MediaService()
         minio_service = MinioService()
         
-        # 创建临时输出文件
-        temp_output = f"/tmp/segment_{media_file_id}_{start_time}_{end_time}.mp4"
+        def cut(prefix: str):
+            # 创建临时输出文件
+            temp_output = f"/tmp/segment_{media_file_id}_{start_time}_{end_time}.mp4"
+            try:
+                success = media_service.create_video_segment(
+                    media_file.file_path, temp_output, start_time, end_time,
+                    keyframes=media_file.keyframes,
+                    video_stream=(media_file.media_metadata or {}).get('video_stream')
+                )
+                if not success:
+                    return None
+                
+                # 上传到MinIO
+                segment_name = f"{prefix}/segment.mp4"
+                with open(temp_output, 'rb') as f:
+                    minio_service.upload_file(f, segment_name, "video/mp4", length=os.path.getsize(temp_output))
+                return {"segment_path": segment_name, "start_time": start_time, "end_time": end_time}
+                
+            finally:
+                # 清理临时文件
+                if os.path.exists(temp_output):
+                    os.unlink(temp_output)
         
         try:
-            # 创建视频片段
-            success = media_service.create_video_segment(
-                media_file.file_path, temp_output, start_time, end_time
+            segment = ArtifactStore(db, minio_service).get_or_compute(
+                media_file, "segment", segment_params(start_time, end_time), cut
             )
-            
-            if success:
-                # 上传到MinIO
-                segment_name = f"segments/{media_file_id}/{start_time}_{end_time}.mp4"
-                
-                with open(temp_output, 'rb') as f:
-                    minio_service.upload_file(f, segment_name, "video/mp4")
+        except ArtifactBusy:
+            raise _retry_later(self)
+        if segment is None:
+            return {"error": "创建视频片段失败"}
+        
+        return {
+            "success": True,
+            "media_file_id": media_file_id,
+            **segment
+        }
                 
-                return {
-                    "success": True,
-                    "media_file_id": media_file_id,
-                    "segment_path": segment_name,
-                    "start_time": start_time,
-                    "end_time": end_time
-                }
+    finally:
+        db.close()
+
+@shared_task(bind=True)
+def create_video_segments(self, media_file_id: int, ranges: List[List[float]], created_by: Optional[int] = None,
+                          annotation_ids: Optional[List[Optional[int]]] = None):
+    """从同一源文件批量创建视频片段
+
+    ranges 为 [[start_time, end_time], ...]；annotation_ids 与 ranges 一一对应（可选）。
+    已剪切过的区间直接复用，其余区间只获取一次源文件，片段完成后立即并发上传，VideoSegment 记录批量写入。
+    正由其他 worker 剪切的区间不在此等待，写入其余记录后只带这些区间重试。
+    """
+    db = SessionLocal()
+    try:
+        media_file = db.query(MediaFile).filter(MediaFile.id == media_file_id).first()
+        if not media_file:
+            return {"error": "媒体文件不存在"}
+        
+        if media_file.media_type != "video":
+            return {"error": "不是视频文件"}
+        
+        annotation_ids = annotation_ids or [None] * len(ranges)
+        valid = [
+            (index, float(start), float(end)) for index, (start, end) in enumerate(ranges)
+            if 0 <= start < end and (media_file.duration is None or start < media_file.duration)
+        ]
+        if not valid:
+            return {"error": "没有有效的片段区间"}
+        
+        media_service = MediaService()
+        minio_service = MinioService()
+        store = ArtifactStore(db, minio_service)
+        params = [segment_params(start, end) for _, start, end in valid]
+        segments = {}
+        
+        # 未剪切过的区间：拿到锁的由本任务剪切，其余正由其他 worker 剪切
+        locks = {}
+        waiting = []
+        for position in range(len(valid)):
+            segment = store.find(media_file, "segment", params[position])
+            if segment is not None:
+                segments[position] = segment
+                continue
+            lock = store.lock(media_file, "segment", params[position])
+            if lock.acquire(blocking=False):
+                locks[position] = lock
             else:
-                return {"error": "创建视频片段失败"}
+                waiting.append(position)
+        
+        try:
+            owned = sorted(locks)
+            if owned:
+                etag = store.source_etag(media_file.file_path)
+                segment_names = [f"{store.prefix(etag, 'segment', params[position])}/segment.mp4" for position in owned]
+                with tempfile.TemporaryDirectory(prefix=f"segments_{media_file_id}_") as work_dir:
+                    with UploadPool(minio_service, settings.MEDIA_UPLOAD_WORKERS) as pool:
+                        output_paths = media_service.create_video_segments(
+                            media_file.file_path,
+                            [(valid[position][1], valid[position][2]) for position in owned],
+                            work_dir,
+                            on_segment=lambda index, path: pool.submit_file(path, segment_names[index], "video/mp4"),
+                            keyframes=media_file.keyframes,
+                            metadata=media_file.media_metadata
+                        )
                 
+                for index, position in enumerate(owned):
+                    if output_paths[index] is not None:
+                        _, start, end = valid[position]
+                        segments[position] = store.register(media_file, "segment", params[position], {
+                            "segment_path": segment_names[index], "start_time": start, "end_time": end
+                        })
+            store.commit()
         finally:
-            # 清理临时文件
-            if os.path.exists(temp_output):
-                os.unlink(temp_output)
-                
+            for lock in locks.values():
+                try:
+                    lock.release()
+                except Exception as e:
+                    print(f"释放派生结果锁失败: {e}")
+        
+        rows = [
+            {
+                "media_file_id": media_file_id,
+                "annotation_id": annotation_ids[index],
+                "start_time": start,
+                "end_time": end,
+                "file_path": segments[position]["segment_path"],
+                "created_by": created_by
+            }
+            for position, (index, start, end) in enumerate(valid)
+            if position in segments
+        ]
+        db.bulk_insert_mappings(VideoSegment, rows)
+        db.commit()
+        
+        if waiting and _can_retry(self):
+            raise _retry_later(self, args=(
+                media_file_id,
+                [[valid[position][1], valid[position][2]] for position in waiting],
+                created_by,
+                [annotation_ids[valid[position][0]] for position in waiting]
+            ))
+        
+        return {
+            "success": True,
+            "media_file_id": media_file_id,
+            "segment_count": len(rows),
+            "reused_count": len(valid) - len(locks) - len(waiting),
+            "failed_count": len(ranges) - len(rows)
+        }
+        
     finally:
         db.close()
 
 @shared_task
-def extract_audio_waveform(media_file_id: int):
+def export_approved_segments(project_id: int, created_by: Optional[int] = None):
+    """为项目中所有已审核通过的时间区间标注导出视频片段（每个媒体文件一个批量任务）"""
+    db = SessionLocal()
+    try:
+        annotations = db.query(
+            Annotation.id, Annotation.media_file_id, Annotation.start_time, Annotation.end_time
+        ).join(MediaFile).filter(
+            MediaFile.project_id == project_id,
+            MediaFile.media_type == "video",
+            Annotation.status == "approved",
+            Annotation.start_time.isnot(None),
+            Annotation.end_time.isnot(None)
+        ).order_by(Annotation.media_file_id, Annotation.start_time).all()
+        
+        by_media = {}
+        for annotation_id, media_file_id, start_time, end_time in annotations:
+            by_media.setdefault(media_file_id, []).append((annotation_id, start_time, end_time))
+        
+        if by_media:
+            media_files = {
+                media_file.id: media_file
+                for media_file in db.query(MediaFile).filter(MediaFile.id.in_(list(by_media))).all()
+            }
+            group(
+                job_scheduler.signature(
+                    create_video_segments,
+                    media_files[media_file_id],
+                    ["segment"],
+                    args=(
+                        media_file_id,
+                        [[start, end] for _, start, end in items],
+                        created_by,
+                        [annotation_id for annotation_id, _, _ in items]
+                    ),
+                    seconds=sum(end - start for _, start, end in items)
+                )
+                for media_file_id, items in by_media.items()
+            ).apply_async()
+        
+        return {
+            "success": True,
+            "project_id": project_id,
+            "media_file_count": len(by_media),
+            "segment_count": len(annotations)
+        }
+        
+    finally:
+        db.close()
+
+@shared_task(bind=True)
+def extract_audio_waveform(self, media_file_id: int):
     """提取音频波形数据"""
     db = SessionLocal()
     try:
@@ -152,7 +334,11 @@ def extract_audio_waveform(media_file_id: int):
         media_service = MediaService()
         
         try:
-            waveform_data = media_service.extract_audio_waveform(media_file.file_path)
+            # 相同内容已提取过时直接复用
+            waveform_data = ArtifactStore(db).get_or_compute(
+                media_file, "waveform", waveform_params(),
+                lambda prefix: media_service.extract_audio_waveform(media_file.file_path, f"{prefix}/peaks.bin")
+            )
             
             if waveform_data:
                 return {
@@ -163,8 +349,36 @@ def extract_audio_waveform(media_file_id: int):
             else:
                 return {"error": "提取音频波形失败"}
                 
+        except ArtifactBusy:
+            raise _retry_later(self)
         except Exception as e:
             return {"error": f"提取音频波形失败: {str(e)}"}
             
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@shared_task
+def gc_derived_artifacts(source_path: str):
+    """源对象删除后作废其派生结果并回收存储对象"""
+    db = SessionLocal()
+    try:
+        store = ArtifactStore(db)
+        prefixes = store.invalidate(source_path)
+        db.commit()
+        
+        return {
+            "success": True,
+            "source_path": source_path,
+            "artifact_count": len(prefixes),
+            "deleted_objects": store.collect(prefixes)
+        }
+        
+    finally:
+        db.close()
+
+def ingest_signature(db, media_file: MediaFile):
+    """按项目启用的阶段估算成本，返回发送到对应子队列的入库任务签名"""
+    project = db.query(Project).filter(Project.id == media_file.project_id).first()
+    return job_scheduler.signature(
+        ingest_media_file, media_file, resolve_stages(project), args=(media_file.id,)
+    )
@@ -2,20 +2,31 @@ from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from contextlib import asynccontextmanager
+import threading
 import uvicorn
 from typing import List
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import init_schema, ensure_indexes
 from app.api.v1.api import api_router
 from app.core.security import verify_token
 from app.core.celery_app import celery_app
+from app.services.minio_service import ensure_bucket_exists
+
+def _ensure_indexes():
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print(f"创建索引失败: {e}")
 
 # 创建数据库表
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 启动时创建数据库表
-    Base.metadata.create_all(bind=engine)
+    # 启动时创建数据库表；新增索引在后台线程中并发创建，大表建索引期间不阻塞启动和写入
+    init_schema()
+    threading.Thread(target=_ensure_indexes, name="ensure-indexes", daemon=True).start()
+    # 启动时检查一次存储桶，请求处理中不再访问
+    ensure_bucket_exists()
     yield
     # 关闭时清理资源
     pass
@@ -34,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # 安全认证
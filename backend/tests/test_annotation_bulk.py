@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
+from app.core.database import Annotation, Label, MediaFile, VideoSegment
+from app.schemas.annotation import AnnotationBulkRequest
+from app.api.v1.endpoints.annotations import _apply_bulk
+
+def make_session():
+    engine = create_engine("sqlite://")
+    # 只建表：时间区间 GiST 索引是 PostgreSQL 专用表达式
+    with engine.begin() as connection:
+        for table in (MediaFile.__table__, Label.__table__, Annotation.__table__, VideoSegment.__table__):
+            connection.execute(CreateTable(table))
+    return sessionmaker(bind=engine)()
+
+def test_inverted_time_range_fails_only_that_item():
+    db = make_session()
+    db.add(MediaFile(id=1, filename="a.mp4", original_filename="a.mp4", file_path="projects/1/a.mp4",
+                     media_type="video", project_id=1))
+    db.add(Annotation(id=10, media_file_id=1, annotator_id=7, annotation_type="text", data={},
+                      start_time=2.0, end_time=4.0))
+    db.commit()
+    access = SimpleNamespace(user=SimpleNamespace(id=7, role="annotator"), can_access=lambda project_id: True)
+    request = AnnotationBulkRequest(operations=[
+        {"op": "create", "media_file_id": 1, "annotation_type": "text", "data": {}, "start_time": 5, "end_time": 1},
+        {"op": "create", "media_file_id": 1, "annotation_type": "text", "data": {}, "start_time": 1, "end_time": 5},
+        {"op": "update", "id": 10, "end_time": 1.0},
+    ])
+    results = _apply_bulk(db, access, request.operations)
+    assert [result["success"] for result in results] == [False, True, False]
+    assert results[0]["error"] == results[2]["error"] == "结束时间不能早于开始时间"
+    assert db.query(Annotation).count() == 2
@@ -0,0 +1,45 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, MediaBlob, MediaFile, UploadSession
+from app.services.blob_service import BlobService
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[MediaBlob.__table__, MediaFile.__table__, UploadSession.__table__])
+    return sessionmaker(bind=engine)()
+
+def media_file(path, blob=None):
+    return MediaFile(filename="a.mp4", original_filename="a.mp4", file_path=path, media_type="video", blob=blob)
+
+def test_referenced_paths():
+    db = make_session()
+    db.add_all([
+        media_file("projects/1/a.mp4"),
+        MediaBlob(content_hash="h", file_path="projects/1/b.mp4", ref_count=1),
+        UploadSession(original_filename="c.mp4", file_path="projects/1/c.mp4", media_type="video", status="uploading"),
+        UploadSession(original_filename="d.mp4", file_path="projects/1/d.mp4", media_type="video", status="aborted"),
+    ])
+    db.commit()
+    paths = [f"projects/1/{name}.mp4" for name in "abcde"]
+    assert BlobService(db).referenced_paths(paths) == {"projects/1/a.mp4", "projects/1/b.mp4", "projects/1/c.mp4"}
+
+def test_release_keeps_object_owned_by_blob():
+    db = make_session()
+    blob = MediaBlob(content_hash="h", file_path="projects/1/a.mp4", ref_count=1)
+    shared = media_file("projects/1/a.mp4", blob)
+    registered = media_file("projects/1/a.mp4")
+    db.add_all([shared, registered])
+    db.commit()
+    assert BlobService(db).release(registered) is None
+
+def test_release_last_reference():
+    db = make_session()
+    blob = MediaBlob(content_hash="h", file_path="projects/1/a.mp4", ref_count=2)
+    first, second = media_file("projects/1/a.mp4", blob), media_file("projects/1/a.mp4", blob)
+    db.add_all([first, second])
+    db.commit()
+    service = BlobService(db)
+    assert service.release(first) is None
+    db.query(MediaFile).filter(MediaFile.id == first.id).delete()
+    db.commit()
+    assert service.release(second) == "projects/1/a.mp4"
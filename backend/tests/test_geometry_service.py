@@ -0,0 +1,26 @@
+from app.services.geometry_service import BBOX_FIELDS, bbox_columns, bounding_box
+
+def test_rectangle_from_width_and_height():
+    assert bounding_box("rectangle", {"x": 10, "y": 20, "width": 30, "height": 40}) == (10.0, 20.0, 40.0, 60.0)
+
+def test_rectangle_from_corners():
+    assert bounding_box("rectangle", {"x1": 50, "y1": 5, "x2": 10, "y2": 25}) == (10.0, 5.0, 50.0, 25.0)
+
+def test_polygon_points_as_pairs_and_dicts():
+    assert bounding_box("polygon", {"points": [[0, 5], [10, 0], [4, 8]]}) == (0.0, 0.0, 10.0, 8.0)
+    assert bounding_box("line", {"points": [{"x": 3, "y": 4}, {"x": 1, "y": 9}]}) == (1.0, 4.0, 3.0, 9.0)
+
+def test_point_is_degenerate_box():
+    assert bounding_box("point", {"x": 7, "y": 8}) == (7.0, 8.0, 7.0, 8.0)
+
+def test_non_spatial_or_malformed_data():
+    assert bounding_box("text", {"x": 1, "y": 2}) is None
+    assert bounding_box("polygon", {"points": []}) is None
+    assert bounding_box("polygon", {"points": [["a", 1]]}) is None
+    assert bounding_box("rectangle", None) is None
+
+def test_bbox_columns():
+    assert bbox_columns("rectangle", {"x": 0, "y": 0, "width": 4, "height": 5}) == {
+        "x_min": 0.0, "y_min": 0.0, "x_max": 4.0, "y_max": 5.0, "area": 20.0,
+    }
+    assert bbox_columns("audio_segment", {}) == dict.fromkeys(BBOX_FIELDS)
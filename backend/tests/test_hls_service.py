@@ -0,0 +1,44 @@
+from app.services.hls_service import keyframes_on_grid, plan_renditions
+
+LADDER = [
+    {"name": "360p", "height": 360, "video_bitrate": "800k"},
+    {"name": "720p", "height": 720, "video_bitrate": "2800k"},
+]
+
+METADATA = {
+    "duration": 20.0,
+    "bit_rate": "5000000",
+    "video_stream": {"codec_name": "h264", "pix_fmt": "yuv420p", "width": 1920, "height": 1080},
+    "audio_stream": {"codec_name": "aac"},
+}
+
+def test_keyframes_on_grid():
+    assert keyframes_on_grid([0.0, 6.0, 12.0, 18.0], 6, 20.0)
+    assert keyframes_on_grid([0.0, 3.0, 6.01, 9.0, 12.0, 15.0, 18.0], 6, 20.0)
+    assert not keyframes_on_grid([0.0, 5.0, 10.0, 15.0], 6, 20.0)
+    assert not keyframes_on_grid([0.0, 6.0], 6, 20.0)
+    assert not keyframes_on_grid(None, 6, 20.0)
+
+def test_keyframes_on_grid_ignores_boundary_at_end():
+    assert keyframes_on_grid([0.0, 6.0], 6, 12.0)
+
+def test_original_is_copied_when_keyframes_are_aligned():
+    renditions = plan_renditions(METADATA, LADDER, "128k", 1080, keyframes=[0.0, 6.0, 12.0, 18.0], segment_seconds=6)
+    assert [rendition["name"] for rendition in renditions] == ["360p", "720p", "original"]
+    assert renditions[-1]["copy_video"]
+    assert renditions[-1]["bandwidth"] == 5000000 + 128000
+
+def test_original_is_encoded_when_keyframes_are_misaligned():
+    renditions = plan_renditions(METADATA, LADDER, "128k", 1080, keyframes=[0.0, 5.0, 10.0, 15.0], segment_seconds=6)
+    assert not renditions[-1]["copy_video"]
+    assert renditions[-1]["video_bitrate"] == "2800k"
+
+def test_original_is_dropped_above_max_encode_height_without_copy():
+    renditions = plan_renditions(METADATA, LADDER, "128k", 720)
+    assert [rendition["name"] for rendition in renditions] == ["360p", "720p"]
+
+def test_audio_only():
+    metadata = {"duration": 10.0, "audio_stream": {"codec_name": "mp3"}}
+    assert plan_renditions(metadata, LADDER, "128k", 1080) == [
+        {"name": "audio", "audio_only": True, "audio_bitrate": "128k", "bandwidth": 128000}
+    ]
@@ -0,0 +1,88 @@
+from contextlib import contextmanager
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, MediaBlob, MediaFile
+from app.services.blob_service import BlobService
+from app.services.ingest_service import IngestPipeline
+
+METADATA = {"duration": 5.0, "video_stream": None, "audio_stream": {"codec_name": "aac"}}
+
+class FakeMinio:
+    def iter_file(self, file_path):
+        yield b"content"
+
+class FakeMediaService:
+    def __init__(self):
+        self.local_path = None
+        self.minio_service = FakeMinio()
+        self.ffmpeg_threads = 1
+        self.pinned = []
+
+    @contextmanager
+    def pin(self, file_path):
+        self.pinned.append(file_path)
+        yield self.local_path
+
+    def alias_pin(self, file_path, pinned_path):
+        pass
+
+    def get_media_info(self, file_path):
+        return 5.0, METADATA
+
+class FakeArtifactStore:
+    def __init__(self, results):
+        self.results = results
+
+    def find(self, media_file, operation, params):
+        return self.results.get(operation)
+
+    def commit(self):
+        pass
+
+def make_pipeline(stages, content_hash=None, artifacts=None):
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[MediaBlob.__table__, MediaFile.__table__])
+    db = sessionmaker(bind=engine)()
+    media_file = MediaFile(
+        filename="a.mp3", original_filename="a.mp3", file_path="projects/1/a.mp3",
+        media_type="audio", file_size=7, content_hash=content_hash, processing_status="pending"
+    )
+    db.add(media_file)
+    db.commit()
+    pipeline = IngestPipeline.__new__(IngestPipeline)
+    pipeline.db = db
+    pipeline.media_file = media_file
+    pipeline.media_service = FakeMediaService()
+    pipeline.blob_service = BlobService(db)
+    pipeline.artifact_store = FakeArtifactStore(artifacts or {})
+    pipeline.config = {}
+    pipeline.stages = stages
+    pipeline.stage_threads = {}
+    return pipeline
+
+def test_probe_only_does_not_download_source():
+    pipeline = make_pipeline(["probe"], content_hash="h")
+    result = pipeline.run()
+    assert result["success"]
+    assert result["stages"]["probe"]["status"] == "done"
+    assert pipeline.media_service.pinned == []
+
+def test_probe_only_hashes_by_streaming():
+    pipeline = make_pipeline(["probe"])
+    assert pipeline.run()["success"]
+    assert pipeline.media_file.content_hash is not None
+    assert pipeline.media_service.pinned == []
+
+def test_reusable_stages_do_not_download_source():
+    pipeline = make_pipeline(["probe", "waveform"], content_hash="h", artifacts={"waveform": {"levels": 1}})
+    result = pipeline.run()
+    assert result["stages"]["waveform"]["status"] == "reused"
+    assert pipeline.media_service.pinned == []
+
+def test_unhashed_upload_with_stages_downloads_once(tmp_path):
+    local_path = tmp_path / "source"
+    local_path.write_bytes(b"content")
+    pipeline = make_pipeline(["probe", "waveform"], artifacts={"waveform": {"levels": 1}})
+    pipeline.media_service.local_path = str(local_path)
+    assert pipeline.run()["success"]
+    assert pipeline.media_service.pinned == ["projects/1/a.mp3"]
@@ -0,0 +1,15 @@
+from app.services.job_scheduler import stage_threads
+
+def test_light_stages_get_one_thread_and_hls_the_budget():
+    assert stage_threads(["keyframes", "waveform", "spectrogram", "hls"], 4) == {
+        "keyframes": 1, "waveform": 1, "spectrogram": 1, "hls": 4,
+    }
+
+def test_heavy_stages_share_by_cost():
+    assert stage_threads(["frames", "hls"], 4) == {"frames": 1, "hls": 3}
+
+def test_single_thread_budget():
+    assert stage_threads(["waveform", "frames", "hls"], 1) == {"waveform": 1, "frames": 1, "hls": 1}
+
+def test_only_light_stages():
+    assert stage_threads(["keyframes", "waveform"], 4) == {"keyframes": 1, "waveform": 1}
@@ -0,0 +1,22 @@
+import pytest
+from fastapi import HTTPException
+from app.core.pagination import decode_cursor, encode_cursor
+
+def test_cursor_round_trip():
+    for last_id in (1, 42, 2 ** 40):
+        assert decode_cursor(encode_cursor(last_id)) == last_id
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(123456)
+    assert "=" not in cursor
+    assert "+" not in cursor and "/" not in cursor
+
+def test_missing_cursor():
+    assert decode_cursor(None) is None
+    assert decode_cursor("") is None
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor(1)[:-2] + "!!", "e30"])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor)
+    assert exc_info.value.status_code == 400
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from app.core import permissions
+from app.core.permissions import ProjectAccess, invalidate_project_access
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def incr(self, key):
+        self.commands.append(lambda: self.redis.incr(key))
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute(self):
+        for command in self.commands:
+            command()
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+class FakeAccess(ProjectAccess):
+    def __init__(self, results, during_load=None):
+        super().__init__(SimpleNamespace(id=1, role=None), None)
+        self.results = results
+        self.during_load = during_load
+
+    def _load(self):
+        if self.during_load:
+            self.during_load()
+        return self.results
+
+def test_cached_memberships_are_reused(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(permissions, "get_redis", lambda: redis)
+    assert FakeAccess({7: (True, None)}).memberships() == {7: (True, None)}
+    assert FakeAccess({}).memberships() == {7: (True, None)}
+
+def test_invalidation_during_load_discards_stale_result(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(permissions, "get_redis", lambda: redis)
+    # 加载期间成员关系变化并失效：加载到的旧结果仍返回给本次请求，但之后的请求不会读到
+    stale = FakeAccess({7: (False, "annotator")}, during_load=lambda: invalidate_project_access([1]))
+    assert stale.memberships() == {7: (False, "annotator")}
+    assert FakeAccess({}).memberships() == {}
@@ -0,0 +1,91 @@
+from app.services.segment_service import group_ranges, plan_smart_cut, smart_cut_options, stream_matches, track_timescale
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+
+H264_STREAM = {
+    "codec_name": "h264",
+    "profile": "High",
+    "level": 40,
+    "pix_fmt": "yuv420p",
+    "refs": 1,
+    "width": 1920,
+    "height": 1080,
+    "time_base": "1/12800",
+}
+
+def test_plan_encodes_partial_gops_and_copies_the_rest():
+    assert plan_smart_cut(KEYFRAMES, 1.0, 9.0) == [
+        ("encode", 1.0, 2.0),
+        ("copy", 2.0, 8.0),
+        ("encode", 8.0, 9.0),
+    ]
+
+def test_plan_on_keyframe_boundaries_is_copy_only():
+    assert plan_smart_cut(KEYFRAMES, 2.0, 6.0) == [("copy", 2.0, 6.0)]
+
+def test_plan_tolerates_rounding_at_keyframes():
+    assert plan_smart_cut(KEYFRAMES, 1.9995, 6.0005) == [("copy", 2.0, 6.0)]
+
+def test_plan_needs_two_keyframes_in_range():
+    assert plan_smart_cut(KEYFRAMES, 2.5, 3.5) is None
+    assert plan_smart_cut(KEYFRAMES, 2.5, 4.5) is None
+
+def test_plan_beyond_last_keyframe():
+    assert plan_smart_cut(KEYFRAMES, 10.5, 12.0) is None
+    assert plan_smart_cut([], 0.0, 5.0) is None
+
+def test_h264_options_follow_source_stream():
+    assert smart_cut_options(H264_STREAM) == {
+        "vcodec": "libx264",
+        "pix_fmt": "yuv420p",
+        "profile:v": "high",
+        "level": "4.0",
+        "refs": 1,
+    }
+
+def test_hevc_options_use_x265_params():
+    stream = dict(H264_STREAM, codec_name="hevc", profile="Main 10", level=123, pix_fmt="yuv420p10le", refs=None)
+    assert smart_cut_options(stream) == {
+        "vcodec": "libx265",
+        "pix_fmt": "yuv420p10le",
+        "profile:v": "main10",
+        "x265-params": "level-idc=4.1",
+    }
+
+def test_options_require_known_parameters():
+    assert smart_cut_options(None) is None
+    assert smart_cut_options(dict(H264_STREAM, codec_name="vp9")) is None
+    assert smart_cut_options(dict(H264_STREAM, profile="Extended")) is None
+    assert smart_cut_options(dict(H264_STREAM, level=-99)) is None
+    assert smart_cut_options(dict(H264_STREAM, pix_fmt=None)) is None
+    assert smart_cut_options(dict(H264_STREAM, time_base="0/0")) is None
+
+def test_track_timescale():
+    assert track_timescale(H264_STREAM) == 12800
+    assert track_timescale({"time_base": "1001/30000"}) is None
+    assert track_timescale({}) is None
+
+def test_stream_matches():
+    assert stream_matches(H264_STREAM, dict(H264_STREAM, time_base="1/90000"))
+    assert not stream_matches(H264_STREAM, dict(H264_STREAM, profile="Main"))
+    assert not stream_matches(H264_STREAM, None)
+
+def test_group_ranges_splits_on_gap():
+    items = [("a", 0.0, 3.0), ("b", 5.0, 8.0), ("c", 3600.0, 3603.0), ("d", 3604.0, 3607.0)]
+    assert group_ranges(items, max_gap=10.0, max_span=120.0, max_size=16) == [
+        [("a", 0.0, 3.0), ("b", 5.0, 8.0)],
+        [("c", 3600.0, 3603.0), ("d", 3604.0, 3607.0)],
+    ]
+
+def test_group_ranges_isolated_ranges_stay_alone():
+    items = [(index, index * 600.0, index * 600.0 + 3.0) for index in range(16)]
+    assert [len(group) for group in group_ranges(items, 10.0, 120.0, 16)] == [1] * 16
+
+def test_group_ranges_limits_span_and_size():
+    items = [(index, index * 5.0, index * 5.0 + 3.0) for index in range(10)]
+    assert [len(group) for group in group_ranges(items, 10.0, 20.0, 16)] == [4, 4, 2]
+    assert [len(group) for group in group_ranges(items, 10.0, 120.0, 3)] == [3, 3, 3, 1]
+
+def test_group_ranges_sorts_by_start():
+    items = [("late", 10.0, 12.0), ("early", 0.0, 11.0)]
+    assert group_ranges(items, 1.0, 60.0, 16) == [[("early", 0.0, 11.0), ("late", 10.0, 12.0)]]
@@ -0,0 +1,39 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base, MediaFile, UploadPart, UploadSession
+from app.api.v1.endpoints.uploads import complete_upload_session
+
+class RemovedMemberAccess:
+    """创建会话后已被移出项目的用户"""
+
+    def require_upload(self, project_id: int):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="无权上传文件到该项目")
+
+def make_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine, tables=[MediaFile.__table__, UploadSession.__table__, UploadPart.__table__])
+    return sessionmaker(bind=engine)()
+
+def complete_as_removed_member(upload_mode: str) -> int:
+    db = make_session()
+    upload_session = UploadSession(
+        project_id=1, uploaded_by=7, original_filename="a.mp4", file_path="projects/1/a.mp4",
+        media_type="video", total_size=1024, chunk_size=1024, upload_mode=upload_mode, status="uploading"
+    )
+    db.add(upload_session)
+    db.commit()
+    user = SimpleNamespace(id=7, role="annotator")
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(complete_upload_session(upload_session.id, user, RemovedMemberAccess(), db))
+    assert db.query(MediaFile).count() == 0
+    return error.value.status_code
+
+def test_complete_multipart_rechecks_project_access():
+    assert complete_as_removed_member("multipart") == status.HTTP_403_FORBIDDEN
+
+def test_complete_presigned_rechecks_project_access():
+    assert complete_as_removed_member("presigned") == status.HTTP_403_FORBIDDEN
@@ -50,6 +50,7 @@ export const projectsAPI = {
   deleteProject: (id) => api.delete(`/projects/${id}`),
   addUserToProject: (projectId, userId, role) => 
     api.post(`/projects/${projectId}/users/${userId}`, { role }),
+  exportSegments: (projectId) => api.post(`/projects/${projectId}/export-segments`),
 };
 
 // 媒体文件API
@@ -64,9 +65,40 @@ export const mediaAPI = {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
   },
+  batchUploadMediaFiles: (files, projectId) => {
+    const formData = new FormData();
+    files.forEach((file) => formData.append('files', file));
+    return api.post('/media/batch-upload', formData, {
+      params: { project_id: projectId },
+      headers: { 'Content-Type': 'multipart/form-data' },
+      timeout: 0,
+    });
+  },
+  batchRegisterMediaFiles: (projectId, items) =>
+    api.post('/media/batch-register', { project_id: projectId, items }),
+  getWaveform: (id, params) => api.get(`/media/${id}/waveform`, { params }),
+  getSpectrogram: (id) => api.get(`/media/${id}/spectrogram`),
+  getFrameUrl: (id, index, fps = 1) => `${api.defaults.baseURL}/media/${id}/frames/${index}?fps=${fps}`,
+  createSegments: (id, ranges) => api.post(`/media/${id}/segments`, { ranges }),
+  getHlsUrl: (id) => `${api.defaults.baseURL}/media/${id}/hls/master.m3u8`,
+  getSpectrogramTileUrl: (id, level, x) => `${api.defaults.baseURL}/media/${id}/spectrogram/${level}/${x}`,
   deleteMediaFile: (id) => api.delete(`/media/${id}`),
 };
 
+// 分片上传API
+export const uploadsAPI = {
+  createSession: (data) => api.post('/uploads', data),
+  getSession: (id) => api.get(`/uploads/${id}`),
+  uploadChunk: (id, index, blob) =>
+    api.put(`/uploads/${id}/chunks/${index}`, blob, {
+      headers: { 'Content-Type': 'application/octet-stream' },
+      timeout: 0,
+    }),
+  completeSession: (id) => api.post(`/uploads/${id}/complete`),
+  abortSession: (id) => api.delete(`/uploads/${id}`),
+  createPresignedUpload: (data) => api.post('/uploads/presigned', data),
+};
+
 // 标注API
 export const annotationsAPI = {
   getAnnotations: (params) => api.get('/annotations', { params }),
@@ -74,6 +106,7 @@ export const annotationsAPI = {
   createAnnotation: (data) => api.post('/annotations', data),
   updateAnnotation: (id, data) => api.put(`/annotations/${id}`, data),
   deleteAnnotation: (id) => api.delete(`/annotations/${id}`),
+  bulkAnnotations: (operations) => api.post('/annotations/bulk', { operations }),
   reviewAnnotation: (id, status, comment) => 
     api.post(`/annotations/review/${id}`, { status, comment }),
 };